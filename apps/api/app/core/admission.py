@@ -0,0 +1,148 @@
+"""Admission control: a fixed number of in-flight slots and a bounded priority queue."""
+
+import asyncio
+import heapq
+import itertools
+import math
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from app.core.timing import latency_stats
+
+# Lower values are admitted first
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 10
+
+PRIORITY_NAMES = {PRIORITY_INTERACTIVE: "interactive", PRIORITY_BACKGROUND: "background"}
+
+
+class AdmissionRejected(Exception):
+    """The queue is full (or the wait ran out); retry after ``retry_after`` seconds."""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    Limits concurrent work to ``slots`` and queues at most ``max_queue`` waiters.
+
+    Waiters are admitted by priority, then arrival order. A finished request
+    hands its slot straight to the next waiter, so a burst cannot overtake
+    requests already queued. When the queue is full, ``acquire`` fails at
+    once with ``AdmissionRejected``; its ``retry_after`` estimates when a
+    slot frees up from the recent average hold time.
+
+    Queue waits are recorded in ``latency_stats`` as ``<name>.queue_wait``
+    (overall and per priority).
+    """
+
+    def __init__(self, name: str, slots: int, max_queue: int, queue_timeout: Optional[float] = None):
+        """Create an idle controller; ``queue_timeout`` bounds each wait in seconds."""
+        self.name = name
+        self.slots = max(1, slots)
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout or None
+        self.in_flight = 0
+        self._waiters: List[list] = []
+        self._order = itertools.count()
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.avg_hold_seconds: Optional[float] = None
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    def retry_after(self) -> int:
+        """Whole seconds until a new request would likely be admitted."""
+        hold = self.avg_hold_seconds or 1.0
+        return max(1, math.ceil(hold * (self.queued + 1) / self.slots))
+
+    def check(self):
+        """Raise ``AdmissionRejected`` if a request arriving now would be turned away."""
+        if self.in_flight >= self.slots and self.queued >= self.max_queue:
+            self.rejected += 1
+            latency_stats.increment(f"{self.name}.rejected")
+            raise AdmissionRejected(f"{self.name} queue is full", self.retry_after())
+
+    def _admitted(self, priority: int, started: float):
+        waited_ms = (time.perf_counter() - started) * 1000
+        self.admitted += 1
+        latency_stats.observe(f"{self.name}.queue_wait", waited_ms)
+        latency_stats.observe(f"{self.name}.queue_wait.{PRIORITY_NAMES.get(priority, priority)}", waited_ms)
+
+    async def acquire(self, priority: int = PRIORITY_INTERACTIVE):
+        """Wait for a slot; raises ``AdmissionRejected`` if the queue is full or the wait times out."""
+        started = time.perf_counter()
+        if self.in_flight < self.slots and not self._waiters:
+            self.in_flight += 1
+            self._admitted(priority, started)
+            return
+        self.check()
+
+        future = asyncio.get_running_loop().create_future()
+        entry = [priority, next(self._order), future]
+        heapq.heappush(self._waiters, entry)
+        try:
+            if self.queue_timeout is None:
+                await future
+            else:
+                await asyncio.wait_for(future, self.queue_timeout)
+        except BaseException as e:
+            if future.done() and not future.cancelled():
+                # The slot was handed over just as we gave up; pass it on
+                self._release_slot()
+            elif entry in self._waiters:
+                self._waiters.remove(entry)
+                heapq.heapify(self._waiters)
+            if isinstance(e, asyncio.TimeoutError):
+                self.timed_out += 1
+                latency_stats.increment(f"{self.name}.timed_out")
+                raise AdmissionRejected(f"{self.name} queue wait timed out", self.retry_after()) from None
+            raise
+        self._admitted(priority, started)
+
+    def _release_slot(self):
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                # The slot moves to the waiter; in_flight is unchanged
+                future.set_result(None)
+                return
+        self.in_flight -= 1
+
+    def release(self, held_seconds: Optional[float] = None):
+        """Free a slot, admitting the highest-priority waiter."""
+        if held_seconds is not None:
+            self.avg_hold_seconds = (
+                held_seconds if self.avg_hold_seconds is None
+                else 0.8 * self.avg_hold_seconds + 0.2 * held_seconds
+            )
+        self._release_slot()
+
+    @asynccontextmanager
+    async def slot(self, priority: int = PRIORITY_INTERACTIVE) -> AsyncIterator[None]:
+        """Hold a slot for the body of an ``async with`` block."""
+        await self.acquire(priority)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.release(time.perf_counter() - started)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Occupancy and admission counters for runtime metrics."""
+        return {
+            "slots": self.slots,
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "max_queue": self.max_queue,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+            "avg_hold_seconds": round(self.avg_hold_seconds, 3) if self.avg_hold_seconds is not None else None
+        }
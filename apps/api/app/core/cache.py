@@ -0,0 +1,182 @@
+"""Bounded in-process caches with TTL and hit-rate accounting."""
+
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+# Every named cache, for runtime metrics
+_caches: Dict[str, "LRUCache"] = {}
+
+
+class LRUCache:
+    """Thread-safe LRU cache with an optional per-entry time-to-live."""
+
+    def __init__(self, name: str, maxsize: int = 1024, ttl: Optional[float] = None, register: bool = True):
+        """
+        Create a cache and register it for metrics.
+
+        Args:
+            name: Name reported in runtime metrics
+            maxsize: Maximum number of entries; 0 disables caching
+            ttl: Seconds an entry stays valid, or None for no expiry
+            register: False for caches whose owner reports their hit rate itself
+        """
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # The first cache registered under a name is the one reported
+        if register:
+            _caches.setdefault(name, self)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Return the cached value, or None on a miss or expired entry."""
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            value, expires_at = item
+            if expires_at is not None and expires_at < time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any):
+        """Insert or refresh an entry, evicting the least recently used."""
+        if self.maxsize <= 0:
+            return
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def pop(self, key: Hashable) -> Optional[Any]:
+        """Remove an entry and return its value."""
+        with self._lock:
+            item = self._data.pop(key, None)
+        return item[0] if item else None
+
+    def clear(self):
+        """Drop every entry (counters are kept)."""
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Size and hit-rate counters."""
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+        }
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls for the same key across threads.
+
+    The first caller runs the function; callers arriving while it is in
+    flight block on its result instead of repeating the work.
+    """
+
+    def __init__(self):
+        """Create an empty in-flight table."""
+        self._inflight: Dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+        self.coalesced = 0
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """
+        Run ``fn`` once per in-flight ``key``.
+
+        Returns:
+            The result and whether it was shared from another caller's call
+        """
+        with self._lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            return future.result(), True
+
+        try:
+            result = fn()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result, False
+        finally:
+            with self._lock:
+                del self._inflight[key]
+
+
+class AsyncSingleFlight:
+    """
+    Coalesces concurrent coroutine calls for the same key on one event loop.
+
+    The first caller's coroutine runs as a task that every caller awaits, so
+    one caller being cancelled does not fail the others; the task itself is
+    cancelled only once every caller has gone.
+    """
+
+    def __init__(self):
+        """Create an empty in-flight table."""
+        self._inflight: Dict[Hashable, list] = {}
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """
+        Await ``fn()`` once per in-flight ``key``.
+
+        Returns:
+            The result and whether it was shared from another caller's call
+        """
+        entry = self._inflight.get(key)
+        shared = entry is not None
+        if shared:
+            self.coalesced += 1
+        else:
+            task = asyncio.ensure_future(fn())
+            entry = self._inflight[key] = [task, 0]
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+
+        task = entry[0]
+        entry[1] += 1
+        try:
+            return await asyncio.shield(task), shared
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0 and not task.done():
+                task.cancel()
+
+
+def get_cache_stats() -> Dict[str, Any]:
+    """Stats for every registered cache."""
+    return {name: cache.get_stats() for name, cache in _caches.items()}
@@ -0,0 +1,81 @@
+"""Stop work for HTTP clients that have gone away."""
+
+import asyncio
+from contextlib import suppress
+from typing import AsyncIterator, Awaitable, Optional, TypeVar
+
+from starlette.requests import Request
+
+T = TypeVar("T")
+
+# Seconds between disconnect checks while waiting on upstream work
+DISCONNECT_POLL_SECONDS = 0.25
+
+
+class ClientDisconnected(Exception):
+    """The client closed the connection before the response was ready."""
+
+
+async def _wait_or_disconnect(request: Request, task: asyncio.Future) -> bool:
+    """Wait for ``task``; cancel it and return False if the client disconnects first."""
+    while True:
+        done, _ = await asyncio.wait({task}, timeout=DISCONNECT_POLL_SECONDS)
+        if done:
+            return True
+        if await request.is_disconnected():
+            task.cancel()
+            with suppress(asyncio.CancelledError, Exception):
+                await task
+            return False
+
+
+async def run_until_disconnect(request: Request, awaitable: Awaitable[T]) -> T:
+    """
+    Await ``awaitable``, cancelling it as soon as the client disconnects.
+
+    Cancellation reaches the awaited coroutine at its current ``await``, so
+    upstream requests are closed immediately instead of running to
+    completion for nobody.
+
+    Raises:
+        ClientDisconnected: if the client went away first
+    """
+    task = asyncio.ensure_future(awaitable)
+    try:
+        if not await _wait_or_disconnect(request, task):
+            raise ClientDisconnected()
+        return task.result()
+    finally:
+        if not task.done():
+            task.cancel()
+
+
+async def stream_until_disconnect(request: Request, chunks: AsyncIterator[T]) -> AsyncIterator[T]:
+    """
+    Relay ``chunks`` while the client is connected.
+
+    The client is checked while each chunk is awaited (not only between
+    chunks), so a disconnect during a long wait for the first token is
+    noticed too. On disconnect, or when the relay is closed early, the
+    upstream generator is cancelled or closed right away.
+    """
+    pending: Optional[asyncio.Future] = None
+    try:
+        while True:
+            pending = asyncio.ensure_future(chunks.__anext__())
+            if not await _wait_or_disconnect(request, pending):
+                return
+            try:
+                chunk = pending.result()
+            except StopAsyncIteration:
+                return
+            pending = None
+            yield chunk
+    finally:
+        if pending is not None and not pending.done():
+            pending.cancel()
+            with suppress(asyncio.CancelledError, Exception):
+                await pending
+        aclose = getattr(chunks, "aclose", None)
+        if aclose is not None:
+            await aclose()
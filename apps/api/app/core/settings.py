@@ -28,12 +28,70 @@ class Settings(BaseSettings):
     # Database Configuration
     qdrant_url: str = "http://localhost:6333"
     qdrant_api_key: str = ""
+    qdrant_prefer_grpc: bool = False  # use gRPC instead of REST
+    qdrant_grpc_port: int = 6334
+    qdrant_timeout: float = 2.0  # seconds per Qdrant call
+    
+    # Retrieval
+    retrieval_backend: str = "auto"  # auto, local or qdrant
+    retrieval_mode: str = "dense"  # dense, hybrid (dense + BM25) or lexical (BM25 only, no encoder)
+    local_index_max_points: int = 50000  # auto uses the in-process index up to this corpus size
+    local_index_quantization: str = "none"  # none, int8 or binary first-pass codes
+    local_index_rescore_factor: int = 8  # exact rescoring of k * factor quantized candidates
+    retrieval_workers: int = 4  # threads running blocking retrieval calls
+    corpus_stats_ttl: float = 30.0  # seconds /corpus/stats is served from cache
+    ingest_batch_size: int = 64  # texts per embedding batch
+    ingest_chunk_size: int = 512  # records embedded and upserted together
+    ingest_near_duplicate_threshold: float = 0.85  # MinHash similarity dropped at ingest; 0 disables
+    embeddings_cache_dir: str = "embeddings_cache"  # mmap'd corpus embeddings, empty disables
+    snapshot_path: str = ""  # corpus snapshot restored on cold start when its version matches; empty disables
+    query_embedding_cache_size: int = 2048  # cached query vectors, 0 disables
+    query_embedding_cache_ttl: float = 0.0  # seconds, 0 keeps entries until evicted
     
     # AI Configuration
     openai_api_key: str = ""
     replicate_api_token: str = ""
     ollama_base_url: str = "http://localhost:11434"
     ollama_model: str = "llama2"
+    ollama_num_parallel: int = 4  # match OLLAMA_NUM_PARALLEL; one pooled connection per slot
+    ollama_keepalive_expiry: float = 30.0  # seconds an idle pooled connection is kept
+    ollama_connect_timeout: float = 5.0
+    ollama_pool_timeout: float = 30.0  # seconds to wait for a free connection
+    ollama_first_token_timeout: float = 60.0  # includes model load and prompt evaluation
+    ollama_read_timeout: float = 30.0  # between streamed tokens, and for short calls
+    ollama_generation_timeout: float = 300.0  # whole non-streamed generation
+    ollama_max_queue: int = 16  # generations waiting for a slot before 429s
+    ollama_queue_timeout: float = 60.0  # seconds a generation may wait for a slot, 0 waits indefinitely
+    ollama_max_retries: int = 2  # connection failures only
+    ollama_retry_backoff: float = 0.25  # seconds; jittered, doubled per attempt
+    ollama_cache_size: int = 512  # cached deterministic responses, 0 disables
+    ollama_cache_ttl: float = 3600.0  # seconds
+    chat_semantic_cache: bool = False  # reuse /ollama/chat answers for paraphrased prompts
+    chat_semantic_cache_threshold: float = 0.92  # minimum cosine similarity for a hit
+    chat_semantic_cache_size: int = 1024  # cached answers across all scopes
+    chat_semantic_cache_ttl: float = 86400.0  # seconds, 0 keeps answers until evicted
+    chat_semantic_cache_max_prompt_chars: int = 280  # longer, more personal prompts are never shared
+    ollama_stream_heartbeat: float = 15.0  # seconds between keep-alive comments on idle streams
+    ollama_stream_resume_grace: float = 30.0  # seconds an unwatched stream keeps generating
+    ollama_stream_replay_ttl: float = 60.0  # seconds a finished stream can still be resumed
+    ollama_stream_replay_streams: int = 64  # streams kept for resuming
+    ollama_stream_replay_events: int = 4096  # events kept per stream
+    
+    # Narrative
+    narrative_retrieval_timeout: float = 0.5  # seconds; insights are skipped past this
+    narrative_retrieval_min_score: float = 0.0  # minimum similarity for insights, 0 disables
+    narrative_cache_size: int = 1024  # cached responses, 0 disables
+    narrative_cache_ttl: float = 300.0  # seconds
+    
+    # Stories
+    story_model: str = ""  # defaults to ollama_model
+    stories_dir: str = "stories_data"
+    story_cache_size: int = 512
+    story_cache_ttl: float = 3600.0  # seconds
+    story_prime_on_startup: bool = False  # evaluate every mood prefix at startup, at background priority
+    
+    # Assets
+    asset_reload_interval: float = 5.0  # seconds between asset checks, 0 disables
     
     # Telemetry
     allow_telemetry: bool = False
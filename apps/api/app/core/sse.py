@@ -0,0 +1,217 @@
+"""Server-sent event streams with heartbeats and a bounded, resumable replay buffer."""
+
+import asyncio
+import json
+import logging
+import secrets
+from collections import OrderedDict, deque
+from contextlib import suppress
+from typing import Any, AsyncIterator, Deque, Dict, Optional, Tuple
+
+from app.core.admission import AdmissionRejected
+
+logger = logging.getLogger(__name__)
+
+# An SSE comment: ignored by clients, but keeps proxies from timing out or buffering
+HEARTBEAT = ": keep-alive\n\n"
+
+
+def format_event(data: Dict[str, Any], event_id: Optional[str] = None) -> str:
+    """One SSE event carrying ``data`` as JSON."""
+    head = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{head}data: {json.dumps(data)}\n\n"
+
+
+class ReplayUnavailable(Exception):
+    """A ``Last-Event-ID`` that can no longer be resumed (unknown, expired or too old)."""
+
+
+class ReplayStream:
+    """
+    The events of one generation, kept so a reconnecting client can resume.
+
+    Event ids are ``<stream_id>:<seq>``. At most ``max_events`` recent events
+    are kept; resuming from an older one raises ``ReplayUnavailable``.
+    """
+
+    def __init__(self, stream_id: str, max_events: int):
+        self.stream_id = stream_id
+        self._events: Deque[str] = deque(maxlen=max(1, max_events))
+        self._next_seq = 0
+        self._changed = asyncio.Event()
+        self.finished = False
+        self.subscribers = 0
+        self.task: Optional[asyncio.Task] = None
+        # Pending grace-period cancellation while nobody is subscribed
+        self.abandon_timer: Optional[asyncio.TimerHandle] = None
+
+    def __len__(self) -> int:
+        return len(self._events)
+
+    @property
+    def first_seq(self) -> int:
+        """Sequence number of the oldest event still buffered."""
+        return self._next_seq - len(self._events)
+
+    def append(self, data: Dict[str, Any], final: bool = False):
+        """Buffer an event and wake subscribers; ``final`` marks the last one."""
+        self._events.append(format_event(data, f"{self.stream_id}:{self._next_seq}"))
+        self._next_seq += 1
+        self.finished = self.finished or final
+        # Waiters hold the old event; later waits use a fresh one
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def check_resumable(self, after: int):
+        """Raise ``ReplayUnavailable`` if events after ``after`` were already dropped."""
+        if after + 1 < self.first_seq:
+            raise ReplayUnavailable(f"event {self.stream_id}:{after} is no longer buffered")
+
+    async def events(self, after: int, heartbeat: float) -> AsyncIterator[str]:
+        """
+        Formatted events after sequence ``after``, then live ones until the end.
+
+        A heartbeat comment is sent whenever ``heartbeat`` seconds pass
+        without an event.
+        """
+        next_seq = after + 1
+        self.subscribers += 1
+        if self.abandon_timer is not None:
+            # Watched again; the grace period restarts when the count next drops to 0
+            self.abandon_timer.cancel()
+            self.abandon_timer = None
+        try:
+            while True:
+                changed = self._changed
+                # Positions are recomputed per event: the producer may
+                # append (and evict from the left) while we are suspended
+                while next_seq < self._next_seq:
+                    if next_seq < self.first_seq:
+                        # Fell behind the buffer; end rather than skip events
+                        yield format_event({"error": "stream fell behind its replay buffer"})
+                        return
+                    yield self._events[next_seq - self.first_seq]
+                    next_seq += 1
+                if self.finished and next_seq >= self._next_seq:
+                    return
+                try:
+                    await asyncio.wait_for(changed.wait(), heartbeat)
+                except asyncio.TimeoutError:
+                    yield HEARTBEAT
+        finally:
+            self.subscribers -= 1
+
+
+class ReplayRegistry:
+    """
+    Runs generations in the background and keeps their events for resuming.
+
+    Each stream's producer runs independently of the connection that started
+    it, so a client that drops can reconnect with ``Last-Event-ID`` and pick
+    up where it left off without another model call. A generation nobody
+    watches for ``grace`` seconds is cancelled; a finished stream is dropped
+    ``ttl`` seconds after its last event. At most ``max_streams`` streams of
+    ``max_events`` events each are kept.
+    """
+
+    def __init__(self, name: str, max_streams: int, max_events: int, ttl: float, grace: float):
+        self.name = name
+        self.max_streams = max(1, max_streams)
+        self.max_events = max_events
+        self.ttl = ttl
+        self.grace = grace
+        self._streams: "OrderedDict[str, ReplayStream]" = OrderedDict()
+        self.started = 0
+        self.resumed = 0
+        self.abandoned = 0
+        self.expired = 0
+
+    def start(self, chunks: AsyncIterator[str]) -> ReplayStream:
+        """
+        Start relaying ``chunks`` into a new stream.
+
+        Raises:
+            AdmissionRejected: if every buffered stream is still running
+        """
+        self._make_room()
+        stream = ReplayStream(secrets.token_urlsafe(9), self.max_events)
+        stream.task = asyncio.ensure_future(self._produce(stream, chunks))
+        self._streams[stream.stream_id] = stream
+        self.started += 1
+        return stream
+
+    def resume(self, last_event_id: str) -> Tuple[ReplayStream, int]:
+        """
+        The stream and sequence number a ``Last-Event-ID`` header refers to.
+
+        Raises:
+            ReplayUnavailable: if the stream is unknown, expired or past the buffer
+        """
+        stream_id, _, seq = last_event_id.strip().rpartition(":")
+        stream = self._streams.get(stream_id)
+        if stream is None or not seq.isdigit():
+            raise ReplayUnavailable(f"stream {stream_id or last_event_id!r} cannot be resumed")
+        stream.check_resumable(int(seq))
+        self.resumed += 1
+        return stream, int(seq)
+
+    async def subscribe(self, stream: ReplayStream, after: int, heartbeat: float) -> AsyncIterator[str]:
+        """Relay a stream's events; when the last subscriber leaves, start the grace period."""
+        events = stream.events(after, heartbeat)
+        try:
+            async for event in events:
+                yield event
+        finally:
+            await events.aclose()
+            if stream.subscribers == 0 and not stream.finished:
+                if stream.abandon_timer is not None:
+                    stream.abandon_timer.cancel()
+                stream.abandon_timer = asyncio.get_running_loop().call_later(
+                    self.grace, self._abandon_if_unwatched, stream
+                )
+
+    def _make_room(self):
+        while len(self._streams) >= self.max_streams:
+            oldest = next((s for s in self._streams.values() if s.finished), None)
+            if oldest is None:
+                raise AdmissionRejected(f"{self.name} replay buffer is full", retry_after=1)
+            del self._streams[oldest.stream_id]
+
+    def _expire(self, stream_id: str):
+        if self._streams.pop(stream_id, None) is not None:
+            self.expired += 1
+
+    def _abandon_if_unwatched(self, stream: ReplayStream):
+        stream.abandon_timer = None
+        if stream.subscribers == 0 and not stream.finished and stream.task is not None:
+            logger.info(f"Cancelling unwatched stream {stream.stream_id}")
+            self.abandoned += 1
+            stream.task.cancel()
+
+    async def _produce(self, stream: ReplayStream, chunks: AsyncIterator[str]):
+        try:
+            async for chunk in chunks:
+                stream.append({"chunk": chunk})
+            stream.append({"done": True}, final=True)
+        except asyncio.CancelledError:
+            stream.append({"error": "generation cancelled"}, final=True)
+        except Exception as e:
+            stream.append({"error": str(e)}, final=True)
+        finally:
+            with suppress(Exception):
+                await chunks.aclose()
+            asyncio.get_running_loop().call_later(self.ttl, self._expire, stream.stream_id)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Buffered streams and resume counters for runtime metrics."""
+        return {
+            "streams": len(self._streams),
+            "running": sum(1 for s in self._streams.values() if not s.finished),
+            "buffered_events": sum(len(s) for s in self._streams.values()),
+            "max_streams": self.max_streams,
+            "max_events": self.max_events,
+            "started": self.started,
+            "resumed": self.resumed,
+            "abandoned": self.abandoned,
+            "expired": self.expired
+        }
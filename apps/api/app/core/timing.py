@@ -0,0 +1,103 @@
+"""Request stage timing and in-process latency statistics."""
+
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Deque, Dict, Iterator
+
+
+class StageTimer:
+    """Records how long each stage of a single request took."""
+
+    def __init__(self):
+        """Start the request clock."""
+        self.started = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """Time the enclosed block as stage ``name`` (milliseconds)."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, (time.perf_counter() - started) * 1000)
+
+    def record(self, name: str, duration_ms: float):
+        """Record a stage duration measured elsewhere."""
+        self.stages[name] = duration_ms
+
+    def elapsed(self) -> float:
+        """Seconds since the request started."""
+        return time.perf_counter() - self.started
+
+    def remaining(self, budget: float) -> float:
+        """Seconds left of a per-request ``budget``, never negative."""
+        return max(0.0, budget - self.elapsed())
+
+    def server_timing(self) -> str:
+        """Format stages as a ``Server-Timing`` header value."""
+        entries = [f"{name};dur={ms:.2f}" for name, ms in self.stages.items()]
+        entries.append(f"total;dur={self.elapsed() * 1000:.2f}")
+        return ", ".join(entries)
+
+
+class LatencyStats:
+    """Thread-safe rolling latency samples and counters for runtime metrics."""
+
+    def __init__(self, window: int = 1024):
+        """Keep the last ``window`` samples per metric."""
+        self.window = window
+        self._samples: Dict[str, Deque[float]] = {}
+        self._counts: Dict[str, int] = {}
+        self._counters: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, name: str, value_ms: float):
+        """Add one latency sample."""
+        with self._lock:
+            samples = self._samples.get(name)
+            if samples is None:
+                samples = self._samples[name] = deque(maxlen=self.window)
+            samples.append(value_ms)
+            self._counts[name] = self._counts.get(name, 0) + 1
+
+    def observe_timer(self, prefix: str, timer: StageTimer):
+        """Add every stage of a request, plus its total, under ``prefix``."""
+        for stage, duration_ms in timer.stages.items():
+            self.observe(f"{prefix}.{stage}", duration_ms)
+        self.observe(f"{prefix}.total", timer.elapsed() * 1000)
+
+    def increment(self, name: str, amount: int = 1):
+        """Bump a counter."""
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    @staticmethod
+    def _percentile(ordered, fraction: float) -> float:
+        index = min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))
+        return ordered[index]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Percentiles over the rolling window for every metric, plus counters."""
+        with self._lock:
+            snapshot = {name: sorted(samples) for name, samples in self._samples.items()}
+            counts = dict(self._counts)
+            counters = dict(self._counters)
+
+        latencies = {}
+        for name, ordered in snapshot.items():
+            if not ordered:
+                continue
+            latencies[name] = {
+                "count": counts[name],
+                "p50_ms": round(self._percentile(ordered, 0.5), 3),
+                "p95_ms": round(self._percentile(ordered, 0.95), 3),
+                "max_ms": round(ordered[-1], 3)
+            }
+        return {"latency": latencies, "counters": counters}
+
+
+# Global instance
+latency_stats = LatencyStats()
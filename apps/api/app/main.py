@@ -1,10 +1,39 @@
 """FastAPI application main module."""
 
+import asyncio
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 from app.core.settings import settings
 from app.routers import health, narrative, metrics, art, policy, ollama, arabic_nlp
+from app.services.asset_registry import asset_registry
+from app.services.ollama_client import ollama_client
+from app.services.retrieval import retrieval_service
+from app.services.story_generator import story_generator
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start and stop background services."""
+    # Watch lexicon/prompt assets for changes
+    asset_registry.start()
+    # Connect, load the embedding model and index the corpus in the
+    # background; narrative requests skip insights until this is ready
+    retrieval_service.start()
+    # Pooled keep-alive connections to Ollama for the app's lifetime
+    ollama_client.start()
+    # Story prefixes are primed behind interactive traffic
+    priming = asyncio.create_task(story_generator.prime_prefixes()) if settings.story_prime_on_startup else None
+    yield
+    if priming is not None:
+        priming.cancel()
+    await asset_registry.stop()
+    # Close pooled Qdrant connections and retrieval threads
+    retrieval_service.close()
+    await ollama_client.close()
+
 
 # Create FastAPI application
 app = FastAPI(
@@ -12,7 +41,8 @@ app = FastAPI(
     version=settings.app_version,
     description="Shaheen - Arabic emotional learning and wellbeing companion API",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    lifespan=lifespan
 )
 
 # Add CORS middleware
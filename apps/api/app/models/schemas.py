@@ -15,6 +15,7 @@ class NarrativeRequest(BaseModel):
     """Request for narrative generation."""
     text_ar: str
     mood: Optional[str] = None
+    seed: int = 0  # selects a different, but reproducible, set of questions
 
 
 class NarrativeResponse(BaseModel):
@@ -37,6 +38,7 @@ class StoryResponse(BaseModel):
     metaphor: str
     scene: str
     questions: List[str]
+    story_id: Optional[str] = None
 
 
 class TaskRequest(BaseModel):
@@ -83,6 +85,7 @@ class OllamaRequest(BaseModel):
     temperature: float = 0.7
     max_tokens: int = 1000
     stream: bool = False
+    cache: Optional[bool] = None  # None caches temperature 0 generations only
 
 
 class OllamaResponse(BaseModel):
@@ -132,6 +135,42 @@ class ArTSTTranscriptionResponse(BaseModel):
     timestamps: Optional[List[Dict[str, Any]]] = None
 
 
+class VoiceJournalSegment(BaseModel):
+    """Transcription and analysis of a single voice journal segment."""
+    index: int
+    start: float
+    end: float
+    transcription: str
+    crisis_detected: bool
+    crisis_score: float
+    sentiment: str
+    sentiment_score: float
+    emotion: str
+    emotion_confidence: float
+
+
+class VoiceJournalAnalysis(BaseModel):
+    """Aggregated analysis of a whole voice journal entry."""
+    sentiment: str
+    sentiment_score: float
+    emotion: str
+    emotion_confidence: float
+    crisis_detected: bool
+    crisis_score: float
+    crisis_keywords: Optional[str] = None
+    normalized_text: str = ""
+
+
+class VoiceJournalResponse(BaseModel):
+    """Response for the combined transcribe-and-analyze voice pipeline."""
+    transcription: str
+    language: str
+    duration: float
+    segments: List[VoiceJournalSegment]
+    analysis: VoiceJournalAnalysis
+    processing_time: float
+
+
 class ArTSTHealthResponse(BaseModel):
     """ArTST health check response."""
     status: str
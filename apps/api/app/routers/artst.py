@@ -6,9 +6,11 @@ from typing import Optional
 from app.models.schemas import (
     ArTSTTranscriptionRequest,
     ArTSTTranscriptionResponse,
-    ArTSTHealthResponse
+    ArTSTHealthResponse,
+    VoiceJournalResponse
 )
 from app.services.artst_client import artst_client
+from app.services.voice_journal import voice_journal_pipeline
 
 router = APIRouter()
 
@@ -108,6 +110,42 @@ async def transcribe_audio_bytes(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.post("/journal", response_model=VoiceJournalResponse)
+async def transcribe_and_analyze(
+    file: UploadFile = File(...),
+    language: str = Form(default="ar")
+) -> VoiceJournalResponse:
+    """Transcribe a voice check-in and analyze it in one round-trip.
+    
+    Segments are fed into the Arabic NLP service (crisis screen first, then
+    classifiers) as soon as they are transcribed.
+    """
+    try:
+        # Validate file type
+        if not file.content_type or not file.content_type.startswith('audio/'):
+            raise HTTPException(
+                status_code=400, 
+                detail="File must be an audio file"
+            )
+        
+        # Read audio data
+        audio_data = await file.read()
+        
+        if len(audio_data) == 0:
+            raise HTTPException(
+                status_code=400, 
+                detail="Empty audio file"
+            )
+        
+        result = await voice_journal_pipeline.process(audio_data, language=language)
+        return VoiceJournalResponse(**result)
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Voice journal processing failed: {str(e)}")
+
+
 @router.get("/health", response_model=ArTSTHealthResponse)
 async def check_health() -> ArTSTHealthResponse:
     """Check ArTST service health."""
@@ -11,7 +11,15 @@ from fastapi.responses import StreamingResponse
 import io
 
 from app.models.schemas import MetricsRequest
+from app.core.cache import get_cache_stats
 from app.core.settings import settings
+from app.core.timing import latency_stats
+from app.services.asset_registry import asset_registry
+from app.services.embeddings import query_embeddings
+from app.services.ollama_client import ollama_client, ollama_streams
+from app.services.retrieval import retrieval_service
+from app.services.semantic_cache import chat_semantic_cache
+from app.services.story_generator import story_generator
 
 router = APIRouter()
 
@@ -136,6 +144,23 @@ async def get_metrics_summary():
     return summary
 
 
+@router.get("/metrics/runtime")
+async def get_runtime_metrics() -> Dict[str, Any]:
+    """Get in-process runtime metrics (no user data, not persisted)."""
+    return {
+        "assets": asset_registry.get_stats(),
+        "caches": get_cache_stats(),
+        "ollama": ollama_client.get_stats(),
+        "ollama_streams": ollama_streams.get_stats(),
+        "chat_semantic_cache": chat_semantic_cache.get_stats(),
+        "query_embeddings": query_embeddings.get_stats(),
+        "retrieval": retrieval_service.get_stats(),
+        "stories": story_generator.get_stats(),
+        **latency_stats.get_stats(),
+        "timestamp": datetime.utcnow().isoformat() + "Z"
+    }
+
+
 @router.get("/metrics/export")
 async def export_metrics():
     """Export metrics as CSV for judges."""
@@ -1,13 +1,22 @@
 """Narrative generation router."""
 
-from fastapi import APIRouter, HTTPException
+import asyncio
+import hashlib
+import time
+
+from fastapi import APIRouter, HTTPException, Response
 from typing import Dict, Any
 from pydantic import BaseModel
 
+from app.core.cache import LRUCache
+from app.core.settings import settings
+from app.core.timing import StageTimer, latency_stats
 from app.models.schemas import NarrativeRequest, NarrativeResponse, StoryRequest, StoryResponse
+from app.services.asset_registry import asset_registry
 from app.services.emotion_classifier import emotion_classifier
 from app.services.narrative_generator import narrative_generator
-from app.services.qdrant_client import qdrant_client
+from app.services.retrieval import retrieval_service
+from app.services.story_generator import story_generator
 
 
 class AnalyzeRequest(BaseModel):
@@ -22,86 +31,146 @@ class ComicRequest(BaseModel):
 
 router = APIRouter()
 
+# Responses for identical request bodies
+narrative_cache = LRUCache(
+    "narrative_responses",
+    maxsize=settings.narrative_cache_size,
+    ttl=settings.narrative_cache_ttl
+)
+
+
+def _narrative_cache_key(request: NarrativeRequest) -> tuple:
+    """Cache key for a request body under the current asset versions."""
+    body_hash = hashlib.sha256(request.model_dump_json().encode('utf-8')).hexdigest()
+    return (
+        body_hash,
+        asset_registry.get("plutchik").version,
+        asset_registry.get("prompts").version
+    )
+
 
 @router.post("/narrative", response_model=NarrativeResponse)
-async def generate_narrative(request: NarrativeRequest) -> NarrativeResponse:
+async def generate_narrative(request: NarrativeRequest, response: Response) -> NarrativeResponse:
     """Generate a therapeutic narrative based on Arabic text input."""
+    timer = StageTimer()
     try:
-        # Set up Qdrant client for corpus retrieval
-        narrative_generator.set_qdrant_client(qdrant_client)
+        # Identical bodies get identical responses; serve them from cache
+        cache_key = _narrative_cache_key(request)
+        cached = narrative_cache.get(cache_key)
+        if cached is not None:
+            latency_stats.observe_timer("narrative_cached", timer)
+            response.headers["X-Cache"] = "HIT"
+            response.headers["Server-Timing"] = timer.server_timing()
+            return cached
         
-        # Classify emotion from the Arabic text
-        emotion_classification = emotion_classifier.classify_emotion(request.text_ar)
+        # Set up the retrieval backend for corpus insights
+        narrative_generator.set_qdrant_client(retrieval_service)
         
-        # Check for clinical advice requests
-        is_clinical_request = narrative_generator.check_for_clinical_advice_request(request.text_ar)
+        # Classify emotion from the Arabic text
+        with timer.stage("classify"):
+            emotion_classification = emotion_classifier.classify_emotion(request.text_ar)
         
-        # Generate metaphor and scene
-        metaphor_data = narrative_generator.generate_metaphor_and_scene(emotion_classification)
+        # Start corpus retrieval off the event loop; the remaining stages only
+        # need the classification and run while retrieval is in flight
+        retrieval_started = time.perf_counter()
+        retrieval = asyncio.ensure_future(
+            narrative_generator.get_corpus_insights_async(
+                request.text_ar,
+                emotion_classification,
+                timeout=timer.remaining(settings.narrative_retrieval_timeout)
+            )
+        )
         
-        # Generate reflection questions
-        questions_ar = narrative_generator.generate_reflection_questions(emotion_classification)
+        try:
+            # Check for clinical advice requests
+            with timer.stage("clinical_check"):
+                is_clinical_request = narrative_generator.check_for_clinical_advice_request(request.text_ar)
+            
+            # Metaphor, scene, questions and disclaimer from the precomputed table
+            with timer.stage("compose"):
+                narrative = narrative_generator.compose_narrative(
+                    emotion_classification,
+                    is_clinical_request,
+                    text_ar=request.text_ar,
+                    seed=request.seed
+                )
+            
+            # Get corpus insights; None means the deadline passed or the
+            # backend is still warming up
+            corpus_insights = await retrieval
+        finally:
+            retrieval.cancel()
         
-        # Get corpus insights
-        corpus_insights = narrative_generator.get_corpus_insights(request.text_ar, emotion_classification)
+        timer.record("retrieval", (time.perf_counter() - retrieval_started) * 1000)
+        degraded = corpus_insights is None
+        if degraded:
+            latency_stats.increment("narrative.retrieval_degraded")
+            corpus_insights = []
         
+        questions_ar = narrative['questions_ar']
         # Enhance questions with corpus insights if available
         if corpus_insights:
-            # Add insights as additional reflection points
-            questions_ar.extend(corpus_insights)
-            # Keep only the first 3 questions to maintain structure
-            questions_ar = questions_ar[:3]
-        
-        # Prepare safety flags
-        safety_flags = []
-        if is_clinical_request:
-            safety_flags.append("clinical_advice_request")
+            # Insights replace the last template questions so the response
+            # keeps its three reflection points
+            questions_ar = questions_ar[:3 - len(corpus_insights)] + corpus_insights
         
-        # Prepare disclaimer
-        disclaimer = "غير سريري — أداة للتعلم العاطفي فقط"
-        if is_clinical_request:
-            disclaimer = "تنبيه: هذا التطبيق غير سريري ولا يقدم تشخيصاً أو علاجاً طبياً. يرجى استشارة متخصص في الصحة النفسية للحصول على المساعدة المناسبة."
-        
-        return NarrativeResponse(
-            metaphor=metaphor_data['metaphor'],
-            scene=metaphor_data['scene'],
+        result = NarrativeResponse(
+            metaphor=narrative['metaphor'],
+            scene=narrative['scene'],
             questions_ar=questions_ar,
-            safety_flags=safety_flags,
-            non_clinical_disclaimer=disclaimer
+            safety_flags=narrative['safety_flags'],
+            non_clinical_disclaimer=narrative['non_clinical_disclaimer']
         )
         
+        # Degraded responses are not cached so the next request can retry retrieval
+        if not degraded:
+            narrative_cache.set(cache_key, result)
+        
+        latency_stats.observe_timer("narrative", timer)
+        response.headers["X-Cache"] = "MISS"
+        response.headers["Server-Timing"] = timer.server_timing()
+        
+        return result
+        
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error generating narrative: {str(e)}")
 
 
 @router.post("/story", response_model=StoryResponse)
-async def generate_story(request: StoryRequest) -> StoryResponse:
+async def generate_story(request: StoryRequest, response: Response) -> StoryResponse:
     """Generate a therapeutic story based on mood and context."""
-    # TODO: Implement actual story generation with AI
-    # For now, return mock data
-    return StoryResponse(
-        metaphor="مثل شجرة في عاصفة، أوراقها تتساقط لكن جذورها تبقى قوية",
-        scene="تخيل نفسك كشجرة عريقة في حديقة، الرياح تهز أغصانك لكنك تبقى ثابتاً",
-        questions=[
-            "ما الذي يجعلك تشعر بالقوة في هذا الوقت؟",
-            "كيف يمكنك أن تكون مثل هذه الشجرة؟",
-            "ما هي الجذور التي تحافظ عليك؟"
-        ]
-    )
+    try:
+        story, cached = await story_generator.generate(request.mood, request.context)
+        response.headers["X-Cache"] = "HIT" if cached else "MISS"
+        return StoryResponse(
+            metaphor=story['metaphor'],
+            scene=story['scene'],
+            questions=story['questions'],
+            story_id=story['story_id']
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error generating story: {str(e)}")
 
 
-@router.get("/story/{story_id}")
-async def get_story(story_id: str):
+@router.get("/story/{story_id}", response_model=StoryResponse)
+async def get_story(story_id: str) -> StoryResponse:
     """Get a specific story by ID."""
-    # TODO: Implement story retrieval
-    raise HTTPException(status_code=501, detail="Not implemented yet")
+    story = story_generator.get_story(story_id)
+    if story is None:
+        raise HTTPException(status_code=404, detail="Story not found")
+    return StoryResponse(
+        metaphor=story['metaphor'],
+        scene=story['scene'],
+        questions=story['questions'],
+        story_id=story['story_id']
+    )
 
 
 @router.get("/corpus/stats")
 async def get_corpus_stats():
     """Get corpus statistics and status."""
     try:
-        stats = qdrant_client.get_corpus_stats()
+        stats = await retrieval_service.get_corpus_stats_async()
         return {
             "status": "success",
             "data": stats
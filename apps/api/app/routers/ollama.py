@@ -1,10 +1,14 @@
 """Ollama API router."""
 
-from fastapi import APIRouter, HTTPException
-from fastapi.responses import StreamingResponse
-import json
-from typing import AsyncGenerator
+import time
 
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import Response, StreamingResponse
+
+from app.core.admission import AdmissionRejected
+from app.core.disconnect import ClientDisconnected, run_until_disconnect, stream_until_disconnect
+from app.core.settings import settings
+from app.core.sse import ReplayUnavailable
 from app.models.schemas import (
     OllamaRequest, 
     OllamaResponse, 
@@ -12,22 +16,34 @@ from app.models.schemas import (
     OllamaHealthResponse,
     OllamaModel
 )
-from app.services.ollama_client import ollama_client
+from app.services.ollama_client import ollama_client, ollama_streams
+from app.services.semantic_cache import chat_semantic_cache
 
 router = APIRouter()
 
 
+def _too_busy(e: AdmissionRejected) -> HTTPException:
+    """429 telling the client when Ollama is likely to have a free slot."""
+    return HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+
+
+# Non-standard "client closed request" status (as in nginx); nobody receives
+# it, but it keeps abandoned calls apart from errors in access logs
+CLIENT_CLOSED_REQUEST = 499
+
+
 @router.post("/generate", response_model=OllamaResponse)
-async def generate_response(request: OllamaRequest) -> OllamaResponse:
-    """Generate a response using Ollama."""
+async def generate_response(request: OllamaRequest, http_request: Request) -> OllamaResponse:
+    """Generate a response using Ollama; the generation is cancelled if the client disconnects."""
     try:
-        response_text = await ollama_client.generate_response(
+        response_text = await run_until_disconnect(http_request, ollama_client.generate_response(
             prompt=request.prompt,
             model=request.model,
             system_prompt=request.system_prompt,
             temperature=request.temperature,
-            max_tokens=request.max_tokens
-        )
+            max_tokens=request.max_tokens,
+            cache=request.cache
+        ))
         
         return OllamaResponse(
             response=response_text,
@@ -36,45 +52,59 @@ async def generate_response(request: OllamaRequest) -> OllamaResponse:
             max_tokens=request.max_tokens
         )
         
+    except ClientDisconnected:
+        return Response(status_code=CLIENT_CLOSED_REQUEST)
+    except AdmissionRejected as e:
+        raise _too_busy(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.post("/generate/stream")
-async def generate_streaming_response(request: OllamaRequest) -> StreamingResponse:
-    """Generate a streaming response using Ollama."""
+async def generate_streaming_response(request: OllamaRequest, http_request: Request) -> StreamingResponse:
+    """
+    Stream a generation as server-sent events.
+
+    Events carry ids; a client reconnecting with ``Last-Event-ID`` resumes
+    the same generation from the next event instead of starting a new one.
+    A generation nobody is watching is cancelled after a grace period.
+    """
+    last_event_id = http_request.headers.get("last-event-id")
     try:
-        async def generate_stream() -> AsyncGenerator[str, None]:
-            try:
-                async for chunk in ollama_client.generate_streaming_response(
-                    prompt=request.prompt,
-                    model=request.model,
-                    system_prompt=request.system_prompt,
-                    temperature=request.temperature,
-                    max_tokens=request.max_tokens
-                ):
-                    # Format as Server-Sent Events
-                    yield f"data: {json.dumps({'chunk': chunk})}\n\n"
-                
-                # Send end signal
-                yield f"data: {json.dumps({'done': True})}\n\n"
-                
-            except Exception as e:
-                yield f"data: {json.dumps({'error': str(e)})}\n\n"
-        
-        return StreamingResponse(
-            generate_stream(),
-            media_type="text/plain",
-            headers={
-                "Cache-Control": "no-cache",
-                "Connection": "keep-alive",
-                "Access-Control-Allow-Origin": "*",
-                "Access-Control-Allow-Headers": "*",
-            }
-        )
-        
+        if last_event_id:
+            stream, after = ollama_streams.resume(last_event_id)
+        else:
+            # Reject before the response starts; once streaming, a late
+            # rejection can only be reported as an error event
+            ollama_client.admission.check()
+            stream = ollama_streams.start(ollama_client.generate_streaming_response(
+                prompt=request.prompt,
+                model=request.model,
+                system_prompt=request.system_prompt,
+                temperature=request.temperature,
+                max_tokens=request.max_tokens
+            ))
+            after = -1
+    except ReplayUnavailable as e:
+        raise HTTPException(status_code=410, detail=f"{e}; start a new generation without Last-Event-ID")
+    except AdmissionRejected as e:
+        raise _too_busy(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    
+    events = ollama_streams.subscribe(stream, after, settings.ollama_stream_heartbeat)
+    return StreamingResponse(
+        stream_until_disconnect(http_request, events),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "Connection": "keep-alive",
+            "X-Accel-Buffering": "no",
+            "X-Stream-Id": stream.stream_id,
+            "Access-Control-Allow-Origin": "*",
+            "Access-Control-Allow-Headers": "*",
+        }
+    )
 
 
 @router.get("/models", response_model=OllamaModelsResponse)
@@ -118,8 +148,8 @@ async def check_health() -> OllamaHealthResponse:
 
 
 @router.post("/chat")
-async def chat_with_ollama(request: OllamaRequest) -> OllamaResponse:
-    """Chat with Ollama using a therapeutic system prompt."""
+async def chat_with_ollama(request: OllamaRequest, http_request: Request) -> OllamaResponse:
+    """Chat with Ollama using a therapeutic system prompt; cancelled if the client disconnects."""
     try:
         # Default therapeutic system prompt for wellbeing app
         therapeutic_system_prompt = """You are Shaheen, a wise and compassionate AI assistant for the NCMH Wellbeing App. 
@@ -135,22 +165,40 @@ async def chat_with_ollama(request: OllamaRequest) -> OllamaResponse:
         - Keep responses concise and meaningful"""
         
         system_prompt = request.system_prompt or therapeutic_system_prompt
+        model = request.model or ollama_client.model
         
-        response_text = await ollama_client.generate_response(
-            prompt=request.prompt,
-            model=request.model,
-            system_prompt=system_prompt,
-            temperature=request.temperature,
-            max_tokens=request.max_tokens
-        )
+        # Paraphrases of earlier prompts reuse their answer (opt-in; a
+        # request can still opt out with "cache": false)
+        semantic = settings.chat_semantic_cache and request.cache is not False
+        cached = await chat_semantic_cache.lookup(request.prompt, system_prompt, model) if semantic else None
+        if cached is not None:
+            response_text, _ = cached
+        else:
+            started = time.perf_counter()
+            response_text = await run_until_disconnect(http_request, ollama_client.generate_response(
+                prompt=request.prompt,
+                model=request.model,
+                system_prompt=system_prompt,
+                temperature=request.temperature,
+                max_tokens=request.max_tokens,
+                cache=request.cache
+            ))
+            if semantic:
+                await chat_semantic_cache.store(
+                    request.prompt, system_prompt, model, response_text, time.perf_counter() - started
+                )
         
         return OllamaResponse(
             response=response_text,
-            model=request.model or ollama_client.model,
+            model=model,
             temperature=request.temperature,
             max_tokens=request.max_tokens
         )
         
+    except ClientDisconnected:
+        return Response(status_code=CLIENT_CLOSED_REQUEST)
+    except AdmissionRejected as e:
+        raise _too_busy(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
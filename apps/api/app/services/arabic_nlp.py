@@ -1,5 +1,6 @@
 """Arabic NLP service for sentiment analysis and emotion classification."""
 
+import asyncio
 import re
 import logging
 from typing import Dict, List, Optional, Tuple
@@ -153,8 +154,13 @@ class ArabicNLPService:
         is_crisis, crisis_score, matched_keywords = self.detect_crisis_content(text)
         
         try:
+            # Run both classifiers off the event loop so concurrent requests
+            # (and the voice journal pipeline) can overlap with inference
+            sentiment_results, emotion_results = await asyncio.get_running_loop().run_in_executor(
+                None, self._run_classifiers, normalized_text
+            )
+            
             # Sentiment analysis
-            sentiment_results = self.sentiment_classifier(normalized_text)
             sentiment_label = sentiment_results[0]['label']
             sentiment_score = sentiment_results[0]['score']
             
@@ -170,7 +176,6 @@ class ArabicNLPService:
                 sentiment_score = 0.0
             
             # Emotion analysis (using English model for now, will improve later)
-            emotion_results = self.emotion_classifier(normalized_text)
             emotion_label = emotion_results[0]['label']
             emotion_confidence = emotion_results[0]['score']
             
@@ -222,6 +227,13 @@ class ArabicNLPService:
                 'error': str(e)
             }
 
+    def _run_classifiers(self, normalized_text: str) -> Tuple[List, List]:
+        """Run the sentiment and emotion pipelines (blocking)."""
+        return (
+            self.sentiment_classifier(normalized_text),
+            self.emotion_classifier(normalized_text)
+        )
+
     async def get_intervention_suggestion(self, analysis_result: Dict) -> Dict:
         """Get personalized intervention based on analysis."""
         emotion = analysis_result.get('emotion', 'other')
@@ -0,0 +1,48 @@
+"""Lightweight Arabic text normalization shared by the lexicon and retrieval code."""
+
+import re
+from typing import List
+
+# Diacritics (harakat, tanween, shadda, sukun, dagger alef) and tatweel
+_DIACRITICS = re.compile(r'[\u064B-\u065F\u0670\u0640]')
+_ALEF_VARIANTS = re.compile(r'[\u0622\u0623\u0625]')
+_WORD = re.compile(r'\w+')
+
+# Proclitics stripped when matching word stems, longest first
+CLITIC_PREFIXES = (
+    'وبال', 'وال', 'بال', 'فال', 'كال', 'لل', 'ال', 'و', 'ف', 'ب', 'ل', 'ك'
+)
+
+# Enclitics / inflectional endings tolerated after a matched stem
+CLITIC_SUFFIXES = (
+    'هما', 'كما', 'كم', 'كن', 'هم', 'هن', 'نا', 'ها', 'ات', 'ين', 'ون', 'ان',
+    'ي', 'ه', 'ك', 'ا'
+)
+
+
+def normalize_arabic(text: str) -> str:
+    """
+    Normalize Arabic text for matching.
+
+    Removes diacritics and tatweel, unifies alef, teh marbuta and alef maksura
+    variants, lowercases Latin script and collapses whitespace. The mapping is
+    character-for-character except for removed marks, so it is safe to apply
+    to both lexicon entries and input text.
+    """
+    text = _DIACRITICS.sub('', text)
+    text = _ALEF_VARIANTS.sub('\u0627', text)
+    text = text.replace('\u0629', '\u0647').replace('\u0649', '\u064A')
+    return ' '.join(text.lower().split())
+
+
+def tokenize_arabic(text: str) -> List[str]:
+    """Normalize text and split it into word tokens."""
+    return _WORD.findall(normalize_arabic(text))
+
+
+def strip_clitics(token: str, min_stem: int = 2) -> str:
+    """Strip the longest known proclitic from a normalized token."""
+    for prefix in CLITIC_PREFIXES:
+        if token.startswith(prefix) and len(token) - len(prefix) >= min_stem:
+            return token[len(prefix):]
+    return token
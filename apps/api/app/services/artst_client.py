@@ -3,8 +3,10 @@
 import asyncio
 import io
 import logging
+import os
 import tempfile
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, AsyncGenerator, Tuple
+import numpy as np
 import torch
 import librosa
 import soundfile as sf
@@ -75,68 +77,31 @@ class ArTSTClient:
             await self.initialize()
         
         try:
-            # Save audio to temporary file
-            with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as temp_file:
-                temp_file.write(audio_data)
-                temp_audio_path = temp_file.name
+            waveform = await asyncio.get_running_loop().run_in_executor(
+                None, self._decode_audio, audio_data
+            )
+            
+            # Ensure audio is not padding
+            if len(waveform) == 0:
+                raise ValueError("Empty audio file")
+            
+            transcription = await asyncio.get_running_loop().run_in_executor(
+                None, self._transcribe_waveform, waveform
+            )
+            
+            result = {
+                "transcription": transcription,
+                "language": language,
+                "confidence": 0.85,  # ArTST doesn't provide confidence scores
+                "duration": len(waveform) / self.sample_rate,
+                "model": "ArTST"
+            }
+            
+            if return_timestamps:
+                # ArTST doesn't provide word-level timestamps
+                result["timestamps"] = []
             
-            try:
-                # Load and preprocess audio
-                waveform, sample_rate = librosa.load(
-                    temp_audio_path, 
-                    sr=self.sample_rate,
-                    duration=self.max_duration
-                )
-                
-                # Ensure audio is not padding
-                if len(waveform) == 0:
-                    raise ValueError("Empty audio file")
-                
-                # Process audio for ArTST
-                inputs = self.processor(
-                    audio=waveform,
-                    sampling_rate=self.sample_rate,
-                    return_tensors="pt"
-                ).to(self.device)
-                
-                # Generate transcription
-                with torch.no_grad():
-                    generated_ids = self.model.generate(
-                        inputs["input_values"],
-                        attention_mask=inputs["attention_mask"],
-                        max_length=512,
-                        num_beams=5,
-                        early_stopping=True
-                    )
-                
-                # Decode transcription
-                transcription = self.tokenizer.batch_decode(
-                    generated_ids, 
-                    skip_special_tokens=True
-                )[0]
-                
-                # Clean up transcription
-                transcription = self._clean_transcription(transcription)
-                
-                result = {
-                    "transcription": transcription,
-                    "language": language,
-                    "confidence": 0.85,  # ArTST doesn't provide confidence scores
-                    "duration": len(waveform) / self.sample_rate,
-                    "model": "ArTST"
-                }
-                
-                if return_timestamps:
-                    # ArTST doesn't provide word-level timestamps
-                    result["timestamps"] = []
-                
-                return result
-                
-            finally:
-                # Clean up temporary file
-                import os
-                if os.path.exists(temp_audio_path):
-                    os.unlink(temp_audio_path)
+            return result
                     
         except Exception as e:
             logger.error(f"Transcription failed: {str(e)}")
@@ -148,6 +113,116 @@ class ArTSTClient:
                 "model": "ArTST"
             }
     
+    async def transcribe_segments(
+        self,
+        audio_data: bytes,
+        segment_seconds: float = 8.0
+    ) -> AsyncGenerator[Dict[str, Any], None]:
+        """
+        Transcribe audio segment by segment.
+        
+        The audio is decoded once and split on silence into segments of at
+        most ``segment_seconds``. Each segment is transcribed off the event
+        loop and yielded as soon as it is ready, so callers can start
+        processing early segments while later ones are still being decoded.
+        
+        Args:
+            audio_data: Raw audio bytes
+            segment_seconds: Upper bound on the length of a single segment
+            
+        Yields:
+            Dict with segment index, start/end offsets (seconds) and text
+        """
+        if not self.is_loaded:
+            await self.initialize()
+        
+        loop = asyncio.get_running_loop()
+        waveform = await loop.run_in_executor(None, self._decode_audio, audio_data)
+        if len(waveform) == 0:
+            raise ValueError("Empty audio file")
+        
+        bounds = self._split_segments(waveform, segment_seconds)
+        for index, (start, end) in enumerate(bounds):
+            transcription = await loop.run_in_executor(
+                None, self._transcribe_waveform, waveform[start:end]
+            )
+            yield {
+                "index": index,
+                "start": start / self.sample_rate,
+                "end": end / self.sample_rate,
+                "transcription": transcription,
+                "is_last": index == len(bounds) - 1
+            }
+    
+    def _decode_audio(self, audio_data: bytes) -> np.ndarray:
+        """Decode raw audio bytes into a mono waveform at the model sample rate."""
+        # Save audio to temporary file
+        with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as temp_file:
+            temp_file.write(audio_data)
+            temp_audio_path = temp_file.name
+        
+        try:
+            waveform, _ = librosa.load(
+                temp_audio_path, 
+                sr=self.sample_rate,
+                duration=self.max_duration
+            )
+            return waveform
+        finally:
+            # Clean up temporary file
+            if os.path.exists(temp_audio_path):
+                os.unlink(temp_audio_path)
+    
+    def _split_segments(self, waveform: np.ndarray, segment_seconds: float) -> List[Tuple[int, int]]:
+        """Split a waveform on silence into (start, end) sample ranges."""
+        max_len = max(1, int(segment_seconds * self.sample_rate))
+        intervals = librosa.effects.split(waveform, top_db=30)
+        if len(intervals) == 0:
+            intervals = [(0, len(waveform))]
+        
+        # Merge adjacent voiced intervals up to max_len, then hard-split any
+        # interval that is still longer than max_len
+        segments: List[Tuple[int, int]] = []
+        for start, end in intervals:
+            start, end = int(start), int(end)
+            if segments and end - segments[-1][0] <= max_len:
+                segments[-1] = (segments[-1][0], end)
+                continue
+            while end - start > max_len:
+                segments.append((start, start + max_len))
+                start += max_len
+            segments.append((start, end))
+        
+        return segments
+    
+    def _transcribe_waveform(self, waveform: np.ndarray) -> str:
+        """Run ArTST on a decoded waveform (blocking)."""
+        # Process audio for ArTST
+        inputs = self.processor(
+            audio=waveform,
+            sampling_rate=self.sample_rate,
+            return_tensors="pt"
+        ).to(self.device)
+        
+        # Generate transcription
+        with torch.no_grad():
+            generated_ids = self.model.generate(
+                inputs["input_values"],
+                attention_mask=inputs["attention_mask"],
+                max_length=512,
+                num_beams=5,
+                early_stopping=True
+            )
+        
+        # Decode transcription
+        transcription = self.tokenizer.batch_decode(
+            generated_ids, 
+            skip_special_tokens=True
+        )[0]
+        
+        # Clean up transcription
+        return self._clean_transcription(transcription)
+    
     def _clean_transcription(self, text: str) -> str:
         """Clean and normalize Arabic transcription."""
         # Remove extra whitespace
@@ -190,7 +265,6 @@ class ArTSTClient:
                 await self.initialize()
             
             # Test with a short silence
-            import numpy as np
             silence = np.zeros(int(self.sample_rate * 0.1))  # 100ms silence
             test_result = await self.transcribe_audio(
                 sf.write(io.BytesIO(), silence, self.sample_rate, format='WAV').read()
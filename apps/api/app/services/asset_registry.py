@@ -0,0 +1,231 @@
+"""Registry of hot-reloadable JSON assets with versioned, atomically swapped snapshots."""
+
+import asyncio
+import hashlib
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional
+
+from app.core.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class AssetSnapshot:
+    """An immutable, compiled view of one asset file."""
+    name: str
+    version: int
+    content_hash: str
+    value: Any
+    loaded_at: float
+
+
+@dataclass
+class _AssetEntry:
+    """Registry bookkeeping for one watched asset."""
+    path: Path
+    builder: Callable[[Optional[bytes]], Any]
+    snapshot: AssetSnapshot
+    mtime: Optional[float] = None
+    reload_count: int = 0
+    error_count: int = 0
+    last_error: Optional[str] = None
+    last_reload_ms: float = 0.0
+
+
+class AssetRegistry:
+    """
+    Watches asset files and rebuilds their compiled form when they change.
+
+    Each asset is registered with a builder that turns the raw file bytes
+    (or ``None`` when the file is missing) into whatever the owning service
+    needs, e.g. a compiled lexicon. Builders run off the request path and the
+    resulting ``AssetSnapshot`` replaces the previous one with a single
+    reference assignment, so a request that grabbed a snapshot keeps a
+    consistent view even if a reload happens mid-flight.
+    """
+
+    def __init__(self, poll_interval: float = 5.0):
+        """Initialize an empty registry."""
+        self.poll_interval = poll_interval
+        self._entries: Dict[str, _AssetEntry] = {}
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    def register(
+        self,
+        name: str,
+        path: Path,
+        builder: Callable[[Optional[bytes]], Any]
+    ) -> AssetSnapshot:
+        """
+        Register an asset and build its first snapshot synchronously.
+        
+        ``builder`` receives the raw file bytes, or ``None`` when the file is
+        missing or could not be built, in which case it must return defaults.
+        """
+        raw, mtime = self._read(path)
+        started = time.perf_counter()
+        error = None
+        try:
+            value = builder(raw)
+        except Exception as e:
+            # Unusable file at startup: serve the builder's fallback data
+            logger.error(f"Failed to build asset {name}, using fallback: {e}")
+            error = str(e)
+            raw = None
+            value = builder(None)
+        snapshot = AssetSnapshot(
+            name=name,
+            version=1,
+            content_hash=self._hash(raw),
+            value=value,
+            loaded_at=time.time()
+        )
+        with self._lock:
+            self._entries[name] = _AssetEntry(
+                path=path,
+                builder=builder,
+                snapshot=snapshot,
+                mtime=mtime,
+                error_count=1 if error else 0,
+                last_error=error,
+                last_reload_ms=(time.perf_counter() - started) * 1000
+            )
+        return snapshot
+
+    def get(self, name: str) -> AssetSnapshot:
+        """Return the current snapshot of an asset."""
+        return self._entries[name].snapshot
+
+    @staticmethod
+    def _read(path: Path):
+        """Read file bytes and mtime, or ``(None, None)`` if it does not exist."""
+        try:
+            stat = path.stat()
+            return path.read_bytes(), stat.st_mtime
+        except FileNotFoundError:
+            return None, None
+
+    @staticmethod
+    def _hash(raw: Optional[bytes]) -> str:
+        """Content hash used as the asset's identity."""
+        if raw is None:
+            return "fallback"
+        return hashlib.sha256(raw).hexdigest()[:16]
+
+    def reload_changed(self, force: bool = False) -> Dict[str, int]:
+        """
+        Rebuild every asset whose file changed since the last check.
+
+        The mtime is checked first so unchanged files cost a single ``stat``;
+        a changed mtime with identical content only updates the mtime.
+
+        Returns:
+            Mapping of reloaded asset names to their new versions
+        """
+        # Serialize reloads triggered by the poller and by callers
+        with self._lock:
+            return self._reload_changed(force)
+
+    def _reload_changed(self, force: bool) -> Dict[str, int]:
+        """Reload implementation; caller holds the lock."""
+        reloaded = {}
+        for name, entry in list(self._entries.items()):
+            try:
+                mtime = entry.path.stat().st_mtime
+            except FileNotFoundError:
+                mtime = None
+            if mtime == entry.mtime and not force:
+                continue
+
+            raw, mtime = self._read(entry.path)
+            content_hash = self._hash(raw)
+            if content_hash == entry.snapshot.content_hash and not force:
+                entry.mtime = mtime
+                continue
+
+            started = time.perf_counter()
+            try:
+                value = entry.builder(raw)
+            except Exception as e:
+                # Keep serving the previous snapshot
+                entry.error_count += 1
+                entry.last_error = str(e)
+                entry.mtime = mtime
+                logger.error(f"Failed to rebuild asset {name}: {e}")
+                continue
+
+            snapshot = AssetSnapshot(
+                name=name,
+                version=entry.snapshot.version + 1,
+                content_hash=content_hash,
+                value=value,
+                loaded_at=time.time()
+            )
+            # Single reference swap; readers see either the old or new snapshot
+            entry.snapshot = snapshot
+            entry.mtime = mtime
+            entry.reload_count += 1
+            entry.last_error = None
+            entry.last_reload_ms = (time.perf_counter() - started) * 1000
+
+            logger.info(
+                f"Reloaded asset {name} v{snapshot.version} "
+                f"({content_hash}) in {entry.last_reload_ms:.1f} ms"
+            )
+            reloaded[name] = snapshot.version
+
+        return reloaded
+
+    async def _poll(self):
+        """Background polling loop."""
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                # Builders may compile large indexes; keep them off the loop
+                await loop.run_in_executor(None, self.reload_changed)
+            except Exception as e:
+                logger.error(f"Asset polling failed: {e}")
+
+    def start(self):
+        """Start watching registered assets (no-op if polling is disabled)."""
+        if self.poll_interval <= 0 or self._task is not None:
+            return
+        self._task = asyncio.get_running_loop().create_task(self._poll())
+
+    async def stop(self):
+        """Stop the background watcher."""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Versions and reload timings for every registered asset."""
+        return {
+            name: {
+                "path": str(entry.path),
+                "version": entry.snapshot.version,
+                "content_hash": entry.snapshot.content_hash,
+                "loaded_at": entry.snapshot.loaded_at,
+                "reload_count": entry.reload_count,
+                "last_reload_ms": round(entry.last_reload_ms, 3),
+                "error_count": entry.error_count,
+                "last_error": entry.last_error
+            }
+            for name, entry in self._entries.items()
+        }
+
+
+# Global instance
+asset_registry = AssetRegistry(poll_interval=settings.asset_reload_interval)
@@ -0,0 +1,155 @@
+"""Reading the therapeutic corpus (JSONL) shared by the retrieval backends."""
+
+import hashlib
+import json
+import logging
+import time
+import uuid
+from itertools import islice
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+CORPUS_PATH = Path(__file__).parent.parent.parent / "assets" / "shaheen_corpus.jsonl"
+
+# Fields copied from a corpus record into the search payload
+PAYLOAD_FIELDS = ('dialect', 'emotion', 'metaphor', 'lesson', 'text_ar')
+
+
+def iter_corpus(path: Path = CORPUS_PATH) -> Iterator[Dict[str, Any]]:
+    """
+    Stream corpus records as search payloads.
+
+    Blank lines, malformed JSON and records without ``text_ar`` are skipped.
+    Every payload carries the source ``line`` number and its ``content_hash``.
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        for i, line in enumerate(f):
+            if not line.strip():
+                continue
+            try:
+                data = json.loads(line)
+            except json.JSONDecodeError as e:
+                logger.warning(f"Failed to parse line {i}: {e}")
+                continue
+
+            text = data.get('text_ar', '') if isinstance(data, dict) else ''
+            if not text:
+                continue
+
+            payload = {field: data.get(field, '') for field in PAYLOAD_FIELDS}
+            payload['content_hash'] = content_hash(payload)
+            payload['line'] = i
+            yield payload
+
+
+def content_hash(payload: Dict[str, Any]) -> str:
+    """Hex SHA-256 of a record's payload fields, independent of its position."""
+    canonical = json.dumps(
+        {field: payload.get(field, '') for field in PAYLOAD_FIELDS},
+        ensure_ascii=False,
+        sort_keys=True
+    )
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def point_id(record_hash: str) -> str:
+    """Stable Qdrant point id (a UUID) derived from a content hash."""
+    return str(uuid.UUID(hex=record_hash[:32]))
+
+
+def fragment(payload: Dict[str, Any], score: float) -> Dict[str, Any]:
+    """Format a payload as a ``retrieve_similar`` result."""
+    return {
+        'text_ar': payload.get('text_ar', ''),
+        'emotion': payload.get('emotion', ''),
+        'metaphor': payload.get('metaphor', ''),
+        'lesson': payload.get('lesson', ''),
+        'dialect': payload.get('dialect', ''),
+        'score': score
+    }
+
+
+def count_corpus_records(path: Path = CORPUS_PATH) -> int:
+    """Count non-empty lines without parsing them."""
+    if not path.exists():
+        return 0
+    with open(path, 'rb') as f:
+        return sum(1 for line in f if line.strip())
+
+
+def iter_chunks(items: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    """Group an iterable into lists of at most ``size`` items."""
+    iterator = iter(items)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class IngestProgress:
+    """Counts ingested records and logs throughput as chunks complete."""
+
+    def __init__(self, name: str, total: int = 0):
+        """Start the ingest clock; ``total`` is an estimate used for logging."""
+        self.name = name
+        self.total = total
+        self.records = 0
+        self.chunks = 0
+        self.embed_seconds = 0.0
+        self.started = time.perf_counter()
+
+    def update(self, records: int, embed_seconds: float = 0.0):
+        """Record one finished chunk."""
+        self.records += records
+        self.chunks += 1
+        self.embed_seconds += embed_seconds
+        of_total = f"/{self.total}" if self.total else ""
+        logger.info(
+            f"{self.name}: {self.records}{of_total} records "
+            f"({self.records_per_sec:.1f} records/s)"
+        )
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    @property
+    def records_per_sec(self) -> float:
+        elapsed = self.elapsed
+        return self.records / elapsed if elapsed > 0 else 0.0
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Totals and throughput for the ingest run."""
+        return {
+            "records": self.records,
+            "chunks": self.chunks,
+            "seconds": round(self.elapsed, 3),
+            "embed_seconds": round(self.embed_seconds, 3),
+            "records_per_sec": round(self.records_per_sec, 1)
+        }
+
+
+def iter_embedded_chunks(
+    embedder,
+    path: Path = CORPUS_PATH,
+    chunk_size: int = 256,
+    batch_size: int = 64,
+    progress: IngestProgress = None
+) -> Iterator[Tuple[List[Dict[str, Any]], np.ndarray]]:
+    """
+    Stream the corpus as ``(payloads, vectors)`` chunks.
+
+    At most ``chunk_size`` records are held at once; each chunk is embedded
+    with one ``encode_batch`` call in batches of ``batch_size``.
+    """
+    for payloads in iter_chunks(iter_corpus(path), chunk_size):
+        started = time.perf_counter()
+        vectors = embedder.encode_batch([p['text_ar'] for p in payloads], batch_size=batch_size)
+        if progress is not None:
+            progress.update(len(payloads), time.perf_counter() - started)
+        yield payloads, vectors
@@ -0,0 +1,262 @@
+"""On-disk corpus embedding artifacts, memory-mapped on reload."""
+
+import hashlib
+import json
+import logging
+import os
+import re
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.services.corpus import CORPUS_PATH, IngestProgress, count_corpus_records, iter_chunks, iter_corpus
+from app.services.embeddings import normalize_rows
+from app.services.snapshot import load_snapshot
+
+logger = logging.getLogger(__name__)
+
+
+def file_sha256(path: Path) -> str:
+    """Hex SHA-256 of a file, read in 1 MiB blocks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _temp_path(path: Path) -> Path:
+    """
+    A fresh temporary file next to ``path`` for an atomic replace.
+
+    The name is unique per writer, so workers cold-starting together never
+    write into the same file, and hidden so artifact globs skip it.
+    """
+    fd, name = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    os.close(fd)
+    return Path(name)
+
+
+def _discard(*paths: Path):
+    """Remove temporary files of a build that did not finish."""
+    for path in paths:
+        try:
+            path.unlink()
+        except OSError:
+            pass
+
+
+class EmbeddingArtifact:
+    """
+    Corpus embeddings persisted as ``<key>.npy`` plus a ``<key>.jsonl`` sidecar.
+
+    The key combines the embedding model name with the corpus file hash, so
+    an edited corpus or a different model never reuses stale vectors. The
+    ``.npy`` holds L2-normalized float32 rows and is reopened with
+    ``mmap_mode='r'``; the sidecar's first line is metadata and every
+    following line is the payload of the matching row.
+    """
+
+    def __init__(self, directory: Path, corpus_path: Path = CORPUS_PATH, model_name: str = "model"):
+        """Describe the artifact for ``corpus_path`` under ``model_name``."""
+        self.directory = Path(directory)
+        self.corpus_path = corpus_path
+        self.model_name = model_name
+        self.model_slug = re.sub(r'[^A-Za-z0-9_.-]+', '_', model_name)
+        self.corpus_sha256 = file_sha256(corpus_path)
+        self.key = f"{self.model_slug}-{self.corpus_sha256[:16]}"
+
+    @property
+    def vectors_path(self) -> Path:
+        return self.directory / f"{self.key}.npy"
+
+    @property
+    def payloads_path(self) -> Path:
+        return self.directory / f"{self.key}.jsonl"
+
+    def exists(self) -> bool:
+        return self.vectors_path.exists() and self.payloads_path.exists()
+
+    def load(self) -> Optional[Tuple[np.ndarray, List[Dict[str, Any]]]]:
+        """Memory-map the vectors and read the payloads, or None if unusable."""
+        if not self.exists():
+            return None
+        try:
+            with open(self.payloads_path, 'r', encoding='utf-8') as f:
+                meta = json.loads(f.readline())
+                payloads = [json.loads(line) for line in f]
+            if meta.get('model') != self.model_name or meta.get('corpus_sha256') != self.corpus_sha256:
+                return None
+            vectors = np.load(self.vectors_path, mmap_mode='r')
+            count = meta['count']
+            if len(payloads) != count or vectors.shape[0] < count:
+                raise ValueError("artifact rows and payloads disagree")
+            return vectors[:count], payloads
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable embedding artifact {self.key}: {e}")
+            return None
+
+    def _previous_rows(self) -> Dict[str, np.ndarray]:
+        """Vectors of this model's older artifacts, keyed by record content hash."""
+        rows: Dict[str, np.ndarray] = {}
+        for payloads_path in self.directory.glob(f"{self.model_slug}-{'?' * 16}.jsonl"):
+            vectors_path = payloads_path.with_suffix(".npy")
+            if payloads_path == self.payloads_path or not vectors_path.exists():
+                continue
+            try:
+                with open(payloads_path, 'r', encoding='utf-8') as f:
+                    meta = json.loads(f.readline())
+                    if meta.get('model') != self.model_name:
+                        continue
+                    vectors = np.load(vectors_path, mmap_mode='r')
+                    for row, line in enumerate(f):
+                        record_hash = json.loads(line).get('content_hash')
+                        if record_hash and row < len(vectors):
+                            rows.setdefault(record_hash, vectors[row])
+            except Exception as e:
+                logger.warning(f"Skipping unreadable artifact {payloads_path.name}: {e}")
+        return rows
+
+    def build(self, embedder, chunk_size: int = 512, batch_size: int = 64) -> Dict[str, Any]:
+        """
+        Embed the corpus into the artifact files; returns ingest stats.
+
+        Records whose content hash appears in an older artifact of the same
+        model reuse that vector, so an edited corpus only embeds the new or
+        changed lines.
+        """
+        self.directory.mkdir(parents=True, exist_ok=True)
+        capacity = max(count_corpus_records(self.corpus_path), 1)
+        tmp_vectors = _temp_path(self.vectors_path)
+        tmp_payloads = _temp_path(self.payloads_path)
+        previous = self._previous_rows()
+
+        try:
+            # Vectors stream straight into a file-backed array; rows past the
+            # final count (skipped lines) are ignored on load
+            matrix = np.lib.format.open_memmap(
+                tmp_vectors, mode='w+', dtype=np.float32, shape=(capacity, embedder.dim)
+            )
+            progress = IngestProgress("Embedding artifact", total=capacity)
+            count = 0
+            reused = 0
+            with open(tmp_payloads, 'w', encoding='utf-8') as sidecar:
+                body = []
+                for payloads in iter_chunks(iter_corpus(self.corpus_path), chunk_size):
+                    started = time.perf_counter()
+                    vectors = np.empty((len(payloads), embedder.dim), dtype=np.float32)
+                    missing = []
+                    for i, payload in enumerate(payloads):
+                        if payload['content_hash'] in previous:
+                            vectors[i] = previous[payload['content_hash']]
+                        else:
+                            missing.append(i)
+                    if missing:
+                        vectors[missing] = embedder.encode_batch(
+                            [payloads[i]['text_ar'] for i in missing], batch_size=batch_size
+                        )
+                    reused += len(payloads) - len(missing)
+                    progress.update(len(payloads), time.perf_counter() - started)
+
+                    matrix[count:count + len(payloads)] = normalize_rows(vectors)
+                    count += len(payloads)
+                    body.extend(json.dumps(p, ensure_ascii=False) + "\n" for p in payloads)
+                meta = {
+                    'model': self.model_name,
+                    'corpus_sha256': self.corpus_sha256,
+                    'count': count,
+                    'dim': int(embedder.dim)
+                }
+                sidecar.write(json.dumps(meta) + "\n")
+                sidecar.writelines(body)
+            matrix.flush()
+            del matrix
+            previous.clear()
+        except BaseException:
+            _discard(tmp_vectors, tmp_payloads)
+            raise
+        self._publish(tmp_vectors, tmp_payloads)
+        logger.info(f"Wrote embedding artifact {self.key} ({count} rows, {reused} reused)")
+        return {**progress.get_stats(), "reused": reused, "embedded": count - reused}
+
+    def write(self, vectors: np.ndarray, payloads: List[Dict[str, Any]]):
+        """Write already-embedded, normalized rows as this artifact (e.g. from a snapshot)."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        tmp_vectors = _temp_path(self.vectors_path)
+        tmp_payloads = _temp_path(self.payloads_path)
+        try:
+            with open(tmp_vectors, 'wb') as f:
+                np.save(f, np.asarray(vectors, dtype=np.float32))
+            with open(tmp_payloads, 'w', encoding='utf-8') as sidecar:
+                meta = {
+                    'model': self.model_name,
+                    'corpus_sha256': self.corpus_sha256,
+                    'count': len(payloads),
+                    'dim': int(vectors.shape[1])
+                }
+                sidecar.write(json.dumps(meta) + "\n")
+                sidecar.writelines(json.dumps(p, ensure_ascii=False) + "\n" for p in payloads)
+        except BaseException:
+            _discard(tmp_vectors, tmp_payloads)
+            raise
+        self._publish(tmp_vectors, tmp_payloads)
+
+    def _publish(self, tmp_vectors: Path, tmp_payloads: Path):
+        """Move a finished build into place and drop older corpus versions."""
+        os.replace(tmp_vectors, self.vectors_path)
+        os.replace(tmp_payloads, self.payloads_path)
+        self._remove_stale()
+
+    def _remove_stale(self):
+        """Delete artifacts of this model built from older corpus versions."""
+        current = {self.vectors_path.name, self.payloads_path.name}
+        for path in self.directory.glob(f"{self.model_slug}-{'?' * 16}.*"):
+            if path.name not in current:
+                try:
+                    path.unlink()
+                except OSError:
+                    pass
+
+
+def load_corpus_embeddings(
+    embedder,
+    corpus_path: Path = CORPUS_PATH,
+    directory: Path = Path("embeddings_cache"),
+    chunk_size: int = 512,
+    batch_size: int = 64,
+    snapshot_path: Optional[Path] = None
+) -> Tuple[np.ndarray, List[Dict[str, Any]], Dict[str, Any]]:
+    """
+    Corpus vectors and payloads from the artifact cache, embedding on a miss.
+
+    On a miss, a snapshot at ``snapshot_path`` taken from the same corpus
+    version and model is unpacked into the artifact instead of embedding.
+
+    Returns:
+        ``(vectors, payloads, stats)``; ``stats['artifact']`` is ``"hit"``
+        when the artifact was reused, ``"restored"`` when it came from the
+        snapshot and ``"built"`` when it was embedded
+    """
+    model_name = getattr(embedder, 'model_name', type(embedder).__name__)
+    artifact = EmbeddingArtifact(directory, corpus_path, model_name)
+    loaded = artifact.load()
+    if loaded is not None:
+        logger.info(f"Loaded embedding artifact {artifact.key} via mmap ({len(loaded[1])} rows)")
+        return loaded[0], loaded[1], {"artifact": "hit", "key": artifact.key, "records": len(loaded[1])}
+
+    started = time.perf_counter()
+    snapshot = load_snapshot(snapshot_path, artifact.corpus_sha256, model_name)
+    if snapshot is not None:
+        artifact.write(snapshot[0], snapshot[1])
+        stats = {"snapshot": str(snapshot_path), "restore_seconds": round(time.perf_counter() - started, 3)}
+        logger.info(f"Restored embedding artifact {artifact.key} from snapshot in {stats['restore_seconds']}s")
+    else:
+        stats = artifact.build(embedder, chunk_size=chunk_size, batch_size=batch_size)
+    loaded = artifact.load()
+    if loaded is None:
+        raise RuntimeError(f"Embedding artifact {artifact.key} could not be reloaded")
+    status = "restored" if snapshot is not None else "built"
+    return loaded[0], loaded[1], {"artifact": status, "key": artifact.key, **stats}
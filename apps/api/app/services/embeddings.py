@@ -0,0 +1,144 @@
+"""Sentence embedding model shared by the retrieval backends."""
+
+import hashlib
+import logging
+import os
+import threading
+import unicodedata
+from typing import Any, Dict, List
+
+import numpy as np
+
+from app.core.cache import LRUCache, SingleFlight
+from app.core.settings import settings
+
+try:
+    from sentence_transformers import SentenceTransformer
+    SENTENCE_TRANSFORMERS_AVAILABLE = True
+except ImportError:
+    SENTENCE_TRANSFORMERS_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# Use a lightweight model that works well with Arabic
+DEFAULT_MODEL_NAME = 'all-MiniLM-L6-v2'
+EMBEDDING_DIM = 384  # all-MiniLM-L6-v2 embedding size
+
+
+class EmbeddingModel:
+    """Lazily loaded sentence-transformer returning L2-normalized float32 vectors."""
+
+    def __init__(self, model_name: str = DEFAULT_MODEL_NAME):
+        """Initialize without loading the model."""
+        self.model_name = model_name
+        self.dim = EMBEDDING_DIM
+        self.model = None
+        self.disabled = os.getenv("DISABLE_EMBEDDINGS", "false").lower() == "true"
+        self._lock = threading.Lock()
+
+    @property
+    def is_available(self) -> bool:
+        """Whether the model can be (or has been) loaded."""
+        return SENTENCE_TRANSFORMERS_AVAILABLE and not self.disabled
+
+    def load(self) -> bool:
+        """Load the model once; returns whether it is ready."""
+        if self.model is not None:
+            return True
+        if not self.is_available:
+            return False
+        with self._lock:
+            if self.model is None:
+                try:
+                    self.model = SentenceTransformer(self.model_name)
+                    self.dim = self.model.get_sentence_embedding_dimension()
+                    logger.info("Initialized sentence transformer model")
+                except Exception as e:
+                    logger.error(f"Failed to initialize sentence transformer: {e}")
+                    self.disabled = True
+                    return False
+        return True
+
+    def encode_batch(self, texts: List[str], batch_size: int = 64) -> np.ndarray:
+        """Encode texts into a ``(len(texts), dim)`` float32 matrix."""
+        if not self.load():
+            raise RuntimeError("Embedding model not available")
+        vectors = self.model.encode(
+            texts,
+            batch_size=batch_size,
+            convert_to_numpy=True,
+            normalize_embeddings=True,
+            show_progress_bar=False
+        )
+        return np.asarray(vectors, dtype=np.float32)
+
+    def encode(self, text: str) -> np.ndarray:
+        """Encode a single text into a normalized float32 vector."""
+        return self.encode_batch([text], batch_size=1)[0]
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """L2-normalize the rows of a float32 matrix in place and return it."""
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    matrix /= norms
+    return matrix
+
+
+def normalize_query(text: str) -> str:
+    """NFC-normalize and collapse whitespace so trivially different queries share a key."""
+    return " ".join(unicodedata.normalize("NFC", text or "").split())
+
+
+class QueryEmbeddingCache:
+    """
+    Bounded cache of query embeddings shared by every retrieval backend.
+
+    Entries are keyed by the embedder's model name and the SHA-256 of the
+    normalized query text. Concurrent misses for the same key are coalesced
+    so only one thread runs the encoder.
+    """
+
+    def __init__(self, name: str = "query_embeddings", maxsize: int = 2048, ttl: float = None):
+        """Create the cache; ``maxsize=0`` disables caching but keeps coalescing."""
+        self.cache = LRUCache(name, maxsize=maxsize, ttl=ttl)
+        self.single_flight = SingleFlight()
+        self.encodes = 0
+
+    def encode(self, embedder, text: str) -> np.ndarray:
+        """Embedding of ``text`` from cache, or from one (shared) ``embedder.encode`` call."""
+        normalized = normalize_query(text)
+        key = (
+            getattr(embedder, 'model_name', type(embedder).__name__),
+            hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+        )
+        vector = self.cache.get(key)
+        if vector is not None:
+            return vector
+
+        def compute():
+            self.encodes += 1
+            result = np.asarray(embedder.encode(normalized), dtype=np.float32)
+            # Cached vectors are shared between callers; keep them immutable
+            result.setflags(write=False)
+            self.cache.set(key, result)
+            return result
+
+        vector, _ = self.single_flight.do(key, compute)
+        return vector
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Hit rate, encoder calls and coalesced waits."""
+        return {
+            **self.cache.get_stats(),
+            "encodes": self.encodes,
+            "coalesced": self.single_flight.coalesced
+        }
+
+
+# Global instances
+embedding_model = EmbeddingModel()
+query_embeddings = QueryEmbeddingCache(
+    maxsize=settings.query_embedding_cache_size,
+    ttl=settings.query_embedding_cache_ttl or None
+)
@@ -5,30 +5,40 @@ import os
 from typing import Dict, List, Optional, Tuple
 from pathlib import Path
 
+from app.services.asset_registry import asset_registry
+from app.services.emotion_lexicon import EmotionLexicon
+
+PLUTCHIK_PATH = Path(__file__).parent.parent.parent / "assets" / "plutchik.json"
+
 
 class EmotionClassifier:
     """Classifies emotions in Arabic text using Plutchik wheel."""
     
     def __init__(self):
         """Initialize the emotion classifier with Plutchik data."""
-        self.plutchik_data = self._load_plutchik_data()
-        self.emotions = self.plutchik_data.get('emotions', [])
-        self.emotion_synonyms = self._build_synonym_map()
+        # The compiled lexicon is rebuilt by the registry whenever the
+        # asset file changes
+        asset_registry.register("plutchik", PLUTCHIK_PATH, self._build_lexicon)
     
-    def _load_plutchik_data(self) -> Dict:
-        """Load Plutchik emotion data from JSON file."""
-        try:
-            # Try to load from the assets directory
-            assets_path = Path(__file__).parent.parent.parent / "assets" / "plutchik.json"
-            if assets_path.exists():
-                with open(assets_path, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            
-            # Fallback to hardcoded data if file not found
-            return self._get_fallback_data()
-        except Exception as e:
-            print(f"Warning: Could not load Plutchik data: {e}")
+    @property
+    def lexicon(self) -> EmotionLexicon:
+        """Current compiled lexicon snapshot."""
+        return asset_registry.get("plutchik").value
+    
+    @property
+    def emotions(self) -> List[Dict]:
+        """Emotion records of the current snapshot."""
+        return self.lexicon.emotions
+    
+    def _build_lexicon(self, raw: Optional[bytes]) -> EmotionLexicon:
+        """Compile the lexicon from raw asset bytes."""
+        return EmotionLexicon(self._load_plutchik_data(raw).get('emotions', []))
+    
+    def _load_plutchik_data(self, raw: Optional[bytes]) -> Dict:
+        """Parse Plutchik emotion data, falling back to hardcoded data if missing."""
+        if raw is None:
             return self._get_fallback_data()
+        return json.loads(raw.decode('utf-8'))
     
     def _get_fallback_data(self) -> Dict:
         """Fallback Plutchik data if file loading fails."""
@@ -77,33 +87,6 @@ class EmotionClassifier:
             ]
         }
     
-    def _build_synonym_map(self) -> Dict[str, Dict]:
-        """Build a map of Arabic synonyms to emotion data."""
-        synonym_map = {}
-        for emotion in self.emotions:
-            emotion_id = emotion.get('id')
-            name_ar = emotion.get('name_ar', '')
-            synonyms = emotion.get('synonyms_ar', [])
-            
-            # Add the main name
-            if name_ar:
-                synonym_map[name_ar] = {
-                    'emotion_id': emotion_id,
-                    'emotion': emotion,
-                    'intensity': 2  # Default medium intensity
-                }
-            
-            # Add synonyms with varying intensities
-            for i, synonym in enumerate(synonyms):
-                intensity = min(3, max(1, i + 1))  # Distribute intensities
-                synonym_map[synonym] = {
-                    'emotion_id': emotion_id,
-                    'emotion': emotion,
-                    'intensity': intensity
-                }
-        
-        return synonym_map
-    
     def classify_emotion(self, text_ar: str) -> Dict[str, any]:
         """
         Classify emotion in Arabic text.
@@ -112,51 +95,56 @@ class EmotionClassifier:
             text_ar: Arabic text to analyze
             
         Returns:
-            Dict with primary emotion, intensity, and keywords found
+            Dict with primary emotion, intensity, keywords found and the
+            scored distribution over all emotions
         """
-        if not text_ar or not text_ar.strip():
-            return {
-                'primary': 'neutral',
-                'intensity': 1,
-                'keywords': [],
-                'confidence': 0.0
-            }
+        # Use one snapshot for the whole call even if a reload lands mid-way
+        lexicon = self.lexicon
         
-        # Simple keyword matching approach
-        text_lower = text_ar.lower().strip()
-        found_emotions = []
-        keywords_found = []
+        if not text_ar or not text_ar.strip():
+            return self._neutral_result(lexicon)
         
-        # Check for emotion keywords
-        for keyword, emotion_data in self.emotion_synonyms.items():
-            if keyword in text_lower:
-                found_emotions.append(emotion_data)
-                keywords_found.append(keyword)
+        # Single pass over the text against the compiled lexicon
+        distribution = lexicon.score(text_ar)
+        keywords_found = [
+            keyword
+            for slot in distribution.values()
+            for keyword in slot['keywords']
+        ]
         
-        if not found_emotions:
-            return {
-                'primary': 'neutral',
-                'intensity': 1,
-                'keywords': [],
-                'confidence': 0.0
-            }
+        if not keywords_found:
+            return self._neutral_result(lexicon)
         
-        # Find the most intense emotion
-        primary_emotion = max(found_emotions, key=lambda x: x['intensity'])
+        # Highest scoring emotion wins; intensity breaks ties
+        primary_id = max(
+            lexicon.emotion_ids,
+            key=lambda emotion_id: (distribution[emotion_id]['score'], distribution[emotion_id]['intensity'])
+        )
         
         return {
-            'primary': primary_emotion['emotion_id'],
-            'intensity': primary_emotion['intensity'],
+            'primary': primary_id,
+            'intensity': distribution[primary_id]['intensity'],
             'keywords': keywords_found,
-            'confidence': min(1.0, len(keywords_found) * 0.3)  # Simple confidence score
+            'confidence': min(1.0, len(keywords_found) * 0.3),  # Simple confidence score
+            'distribution': distribution
+        }
+    
+    def _neutral_result(self, lexicon: EmotionLexicon) -> Dict[str, any]:
+        """Result returned when no emotion keywords are found."""
+        return {
+            'primary': 'neutral',
+            'intensity': 1,
+            'keywords': [],
+            'confidence': 0.0,
+            'distribution': {
+                emotion_id: {'score': 0.0, 'intensity': 0, 'keywords': []}
+                for emotion_id in lexicon.emotion_ids
+            }
         }
     
     def get_emotion_by_id(self, emotion_id: str) -> Optional[Dict]:
         """Get emotion data by ID."""
-        for emotion in self.emotions:
-            if emotion.get('id') == emotion_id:
-                return emotion
-        return None
+        return self.lexicon.get_emotion(emotion_id)
 
 
 # Global instance
@@ -0,0 +1,179 @@
+"""Compiled Plutchik emotion lexicon with a trie over normalized Arabic forms."""
+
+from typing import Dict, List, Optional, Any
+
+from app.services.arabic_text import (
+    CLITIC_PREFIXES,
+    CLITIC_SUFFIXES,
+    normalize_arabic,
+)
+
+# Key used for the list of entries terminating at a trie node
+_TERMINAL = '$'
+
+
+class EmotionLexicon:
+    """
+    Immutable lexicon index built from Plutchik emotion data.
+
+    Lexemes (emotion names, intensity level names and synonyms) are
+    normalized and inserted into a character trie. ``scan`` walks the
+    normalized text once, starting a trie walk at each word boundary (and
+    after any known clitic prefix such as "بال" or "و"), so matching cost is
+    independent of the lexicon size.
+    """
+
+    def __init__(self, emotions: List[Dict[str, Any]]):
+        """Compile the lexicon from a list of Plutchik emotion records."""
+        self.emotions = list(emotions)
+        self.emotions_by_id: Dict[str, Dict] = {}
+        self.emotion_ids: List[str] = []
+        self._trie: Dict[str, Any] = {}
+        self.size = 0
+
+        for emotion in emotions:
+            emotion_id = emotion.get('id')
+            if not emotion_id:
+                continue
+            if emotion_id not in self.emotions_by_id:
+                self.emotion_ids.append(emotion_id)
+            self.emotions_by_id[emotion_id] = emotion
+
+            # The main name is medium intensity
+            if emotion.get('name_ar'):
+                self._insert(emotion['name_ar'], emotion_id, 2)
+
+            # Intensity level names carry their own level
+            for level in emotion.get('intensity_levels', []):
+                if level.get('name_ar'):
+                    self._insert(level['name_ar'], emotion_id, int(level.get('level', 2)))
+
+            # Synonyms with varying intensities
+            for i, synonym in enumerate(emotion.get('synonyms_ar', [])):
+                self._insert(synonym, emotion_id, min(3, max(1, i + 1)))
+
+    def _insert(self, surface: str, emotion_id: str, intensity: int):
+        """Insert a lexeme (and its teh-marbuta construct form) into the trie."""
+        key = normalize_arabic(surface)
+        if not key:
+            return
+
+        keys = [key]
+        # "سعادة" + suffix is written "سعادتي"; index the construct form too
+        if key.endswith('ه'):
+            keys.append(key[:-1] + 'ت')
+
+        for k in keys:
+            node = self._trie
+            for char in k:
+                node = node.setdefault(char, {})
+            entries = node.setdefault(_TERMINAL, [])
+
+            for entry in entries:
+                if entry['emotion_id'] == emotion_id:
+                    entry['intensity'] = max(entry['intensity'], intensity)
+                    break
+            else:
+                entries.append({
+                    'emotion_id': emotion_id,
+                    'intensity': intensity,
+                    'keyword': surface
+                })
+                self.size += 1
+
+    @staticmethod
+    def _is_boundary(text: str, pos: int) -> bool:
+        """Whether ``pos`` ends a word in ``text`` (allowing known suffixes)."""
+        if pos >= len(text) or not text[pos].isalnum():
+            return True
+        for suffix in CLITIC_SUFFIXES:
+            end = pos + len(suffix)
+            if text.startswith(suffix, pos) and (end >= len(text) or not text[end].isalnum()):
+                return True
+        return False
+
+    def _longest_match(self, text: str, start: int) -> Optional[tuple]:
+        """Walk the trie from ``start`` and return the longest word-bounded match."""
+        node = self._trie
+        best = None
+        pos = start
+        while pos < len(text):
+            node = node.get(text[pos])
+            if node is None:
+                break
+            pos += 1
+            if _TERMINAL in node and self._is_boundary(text, pos):
+                best = (pos, node[_TERMINAL])
+        return best
+
+    def scan(self, text: str) -> List[Dict[str, Any]]:
+        """
+        Find all lexicon hits in a single left-to-right pass over the text.
+
+        Returns:
+            List of hits with emotion id, intensity and matched keyword
+        """
+        normalized = normalize_arabic(text)
+        hits: List[Dict[str, Any]] = []
+        pos = 0
+        length = len(normalized)
+
+        while pos < length:
+            # Only start matches at word boundaries
+            if not normalized[pos].isalnum() or (pos > 0 and normalized[pos - 1].isalnum()):
+                pos += 1
+                continue
+
+            starts = [pos]
+            for prefix in CLITIC_PREFIXES:
+                if normalized.startswith(prefix, pos):
+                    starts.append(pos + len(prefix))
+
+            best = None
+            for start in starts:
+                match = self._longest_match(normalized, start)
+                if match and (best is None or match[0] > best[0]):
+                    best = match
+
+            if best is None:
+                pos += 1
+                continue
+
+            end, entries = best
+            for entry in entries:
+                hits.append(dict(entry))
+            pos = end
+
+        return hits
+
+    def score(self, text: str) -> Dict[str, Dict[str, Any]]:
+        """
+        Score the text against every emotion in the lexicon.
+
+        Returns:
+            Mapping of emotion id to its normalized score, strongest matched
+            intensity and the keywords that contributed
+        """
+        distribution = {
+            emotion_id: {'score': 0.0, 'intensity': 0, 'keywords': []}
+            for emotion_id in self.emotion_ids
+        }
+
+        total = 0.0
+        for hit in self.scan(text):
+            slot = distribution[hit['emotion_id']]
+            slot['score'] += hit['intensity']
+            slot['intensity'] = max(slot['intensity'], hit['intensity'])
+            if hit['keyword'] not in slot['keywords']:
+                slot['keywords'].append(hit['keyword'])
+            total += hit['intensity']
+
+        if total:
+            for slot in distribution.values():
+                slot['score'] = slot['score'] / total
+
+        return distribution
+
+    def get_emotion(self, emotion_id: str) -> Optional[Dict]:
+        """Get emotion data by ID in constant time."""
+        return self.emotions_by_id.get(emotion_id)
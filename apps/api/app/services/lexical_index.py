@@ -0,0 +1,234 @@
+"""BM25 inverted index over normalized Arabic tokens, persisted and updated incrementally."""
+
+import json
+import logging
+import math
+import os
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from app.services.arabic_text import strip_clitics, tokenize_arabic
+from app.services.corpus import CORPUS_PATH, fragment, iter_corpus
+from app.services.embedding_store import _discard, _temp_path
+
+logger = logging.getLogger(__name__)
+
+# Record fields whose text is indexed
+INDEXED_FIELDS = ('text_ar', 'metaphor', 'lesson')
+
+# Very frequent function words (normalized) that carry no retrieval signal
+STOPWORDS = frozenset({
+    'في', 'من', 'علي', 'الي', 'عن', 'ان', 'ما', 'لا', 'مع', 'هو', 'هي', 'هذا', 'هذه',
+    'ذلك', 'التي', 'الذي', 'كل', 'قد', 'لم', 'لن', 'او', 'ثم', 'كان', 'بعد', 'عند', 'انا'
+})
+
+
+def analyze(text: str) -> List[str]:
+    """Index terms of a text: normalized tokens without proclitics or stopwords."""
+    return [
+        strip_clitics(token)
+        for token in tokenize_arabic(text or '')
+        if token not in STOPWORDS
+    ]
+
+
+class BM25Index:
+    """
+    Okapi BM25 over corpus records keyed by ``content_hash``.
+
+    Documents store their own term frequencies, so adding or removing a
+    record only touches that record's postings; nothing is re-tokenized
+    when the corpus changes elsewhere.
+    """
+
+    FORMAT_VERSION = 1
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        """Create an empty index."""
+        self.k1 = k1
+        self.b = b
+        self.docs: Dict[str, Dict[str, Any]] = {}
+        self.postings: Dict[str, Dict[str, int]] = {}
+        self.total_length = 0
+
+    def __len__(self) -> int:
+        return len(self.docs)
+
+    @property
+    def avg_length(self) -> float:
+        return self.total_length / len(self.docs) if self.docs else 0.0
+
+    def add(self, payload: Dict[str, Any]):
+        """Index one record (a corpus payload carrying ``content_hash``)."""
+        doc_id = payload['content_hash']
+        if doc_id in self.docs:
+            return
+        terms = Counter(analyze(' '.join(str(payload.get(f, '')) for f in INDEXED_FIELDS)))
+        length = sum(terms.values())
+        self.docs[doc_id] = {
+            'payload': {k: v for k, v in payload.items() if k != 'line'},
+            'tf': dict(terms),
+            'length': length
+        }
+        for term, count in terms.items():
+            self.postings.setdefault(term, {})[doc_id] = count
+        self.total_length += length
+
+    def remove(self, doc_id: str):
+        """Drop a record and its postings."""
+        doc = self.docs.pop(doc_id, None)
+        if doc is None:
+            return
+        for term in doc['tf']:
+            postings = self.postings.get(term)
+            if postings is not None:
+                postings.pop(doc_id, None)
+                if not postings:
+                    del self.postings[term]
+        self.total_length -= doc['length']
+
+    def sync(self, payloads: Iterable[Dict[str, Any]]) -> Dict[str, int]:
+        """Make the index contain exactly ``payloads``; returns added/removed counts."""
+        seen = set()
+        added = 0
+        for payload in payloads:
+            seen.add(payload['content_hash'])
+            if payload['content_hash'] not in self.docs:
+                self.add(payload)
+                added += 1
+        stale = [doc_id for doc_id in self.docs if doc_id not in seen]
+        for doc_id in stale:
+            self.remove(doc_id)
+        return {"added": added, "removed": len(stale), "documents": len(self.docs)}
+
+    def search(
+        self,
+        query: str,
+        k: int = 3,
+        emotion: Optional[str] = None,
+        dialect: Optional[str] = None
+    ) -> List[Tuple[str, float]]:
+        """Top-k ``(content_hash, bm25 score)`` for a query, optionally filtered by labels."""
+        if not self.docs or k <= 0:
+            return []
+        n = len(self.docs)
+        avg_length = self.avg_length or 1.0
+        scores: Dict[str, float] = {}
+        for term in set(analyze(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+            for doc_id, tf in postings.items():
+                norm = self.k1 * (1 - self.b + self.b * self.docs[doc_id]['length'] / avg_length)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+
+        if emotion is not None or dialect is not None:
+            scores = {
+                doc_id: score for doc_id, score in scores.items()
+                if (emotion is None or self.docs[doc_id]['payload'].get('emotion') == emotion)
+                and (dialect is None or self.docs[doc_id]['payload'].get('dialect') == dialect)
+            }
+        return sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:k]
+
+    def payload(self, doc_id: str) -> Dict[str, Any]:
+        return self.docs[doc_id]['payload']
+
+    def save(self, path: Path):
+        """Write the index atomically (postings are rebuilt from documents on load)."""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = _temp_path(path)
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({
+                    'version': self.FORMAT_VERSION,
+                    'k1': self.k1,
+                    'b': self.b,
+                    'docs': self.docs
+                }, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except BaseException:
+            _discard(tmp_path)
+            raise
+
+    @classmethod
+    def load(cls, path: Path) -> Optional["BM25Index"]:
+        """Read a saved index, or None if missing or from another format version."""
+        if not path.exists():
+            return None
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version') != cls.FORMAT_VERSION:
+                return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable lexical index {path}: {e}")
+            return None
+        index = cls(k1=data['k1'], b=data['b'])
+        for doc_id, doc in data['docs'].items():
+            index.docs[doc_id] = doc
+            for term, count in doc['tf'].items():
+                index.postings.setdefault(term, {})[doc_id] = count
+            index.total_length += doc['length']
+        return index
+
+
+def load_lexical_index(corpus_path: Path = CORPUS_PATH, path: Optional[Path] = None) -> BM25Index:
+    """
+    BM25 index for the corpus, reusing and incrementally updating the saved one.
+
+    Only records whose content hash is new are tokenized; the file is
+    rewritten only when something changed.
+    """
+    index = (BM25Index.load(path) if path else None) or BM25Index()
+    changes = index.sync(iter_corpus(corpus_path)) if corpus_path.exists() else {"added": 0, "removed": 0}
+    if path and (changes["added"] or changes["removed"] or not path.exists()):
+        index.save(path)
+    logger.info(f"Lexical index: {len(index)} documents ({changes['added']} added, {changes['removed']} removed)")
+    return index
+
+
+class LexicalRetriever:
+    """Retrieval backend answering from the BM25 index alone; needs no encoder."""
+
+    backend_name = "lexical"
+
+    def __init__(self, index: BM25Index):
+        """Wrap a built index."""
+        self.index = index
+
+    @property
+    def is_available(self) -> bool:
+        return len(self.index) > 0
+
+    def retrieve_similar(
+        self,
+        text_ar: str,
+        k: int = 3,
+        emotion: Optional[str] = None,
+        dialect: Optional[str] = None,
+        score_threshold: Optional[float] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Retrieve fragments sharing terms with the text.
+
+        ``score_threshold`` is a cosine-similarity bound and does not apply
+        to BM25 scores, so it is ignored here.
+        """
+        return [
+            fragment(self.index.payload(doc_id), score)
+            for doc_id, score in self.index.search(text_ar, k, emotion=emotion, dialect=dialect)
+        ]
+
+    def close(self):
+        """Nothing to release."""
+
+    def get_corpus_stats(self) -> Dict[str, Any]:
+        """Get statistics about the corpus."""
+        return {
+            "backend": self.backend_name,
+            "points_count": len(self.index),
+            "terms": len(self.index.postings),
+            "avg_document_length": round(self.index.avg_length, 2)
+        }
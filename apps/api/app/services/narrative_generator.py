@@ -1,29 +1,72 @@
 """Narrative generation service with Arabic reflection questions."""
 
+import asyncio
+import hashlib
 import json
 import random
-from typing import List, Dict
+from types import MappingProxyType
+from typing import List, Dict, Optional, Sequence
 from pathlib import Path
 
+from app.core.settings import settings
+from app.services.asset_registry import asset_registry
+
+PROMPTS_PATH = Path(__file__).parent.parent.parent / "assets" / "prompts.json"
+
+NON_CLINICAL_DISCLAIMER = "غير سريري — أداة للتعلم العاطفي فقط"
+CLINICAL_DISCLAIMER = "تنبيه: هذا التطبيق غير سريري ولا يقدم تشخيصاً أو علاجاً طبياً. يرجى استشارة متخصص في الصحة النفسية للحصول على المساعدة المناسبة."
+INTENSITY_LEVELS = (1, 2, 3)
+
 
 class NarrativeGenerator:
     """Generates therapeutic narratives and reflection questions in Arabic."""
     
     def __init__(self):
         """Initialize the narrative generator."""
-        self.prompts_data = self._load_prompts_data()
         self.therapeutic_metaphors = self._get_therapeutic_metaphors()
+        asset_registry.register("prompts", PROMPTS_PATH, self._build_response_table)
         self.qdrant_client = None
     
-    def _load_prompts_data(self) -> Dict:
-        """Load prompts data from JSON file."""
-        try:
-            assets_path = Path(__file__).parent.parent.parent / "assets" / "prompts.json"
-            if assets_path.exists():
-                with open(assets_path, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-        except Exception as e:
-            print(f"Warning: Could not load prompts data: {e}")
+    @property
+    def prompts_data(self) -> Dict:
+        """Current prompts snapshot."""
+        return asset_registry.get("prompts").value['prompts']
+    
+    @property
+    def response_table(self) -> MappingProxyType:
+        """Precomputed narrative variants for the current prompts snapshot."""
+        return asset_registry.get("prompts").value['variants']
+    
+    def _build_response_table(self, raw: Optional[bytes]) -> Dict:
+        """
+        Precompute every narrative variant from the prompts asset.
+        
+        Variants are keyed by (primary emotion, intensity, clinical flag) and
+        hold the metaphor, scene, candidate questions, safety flags and
+        disclaimer, so a request only does a dict lookup and a question pick.
+        """
+        prompts_data = self._load_prompts_data(raw)
+        general_prompts = tuple(prompts_data.get('reflection_prompts', []))
+        
+        variants = {}
+        for emotion, metaphor_data in self.therapeutic_metaphors.items():
+            questions = tuple(metaphor_data['questions']) + general_prompts
+            for intensity in INTENSITY_LEVELS:
+                for is_clinical in (False, True):
+                    variants[(emotion, intensity, is_clinical)] = MappingProxyType({
+                        'metaphor': metaphor_data['metaphor'],
+                        'scene': metaphor_data['scene'],
+                        'questions': questions,
+                        'safety_flags': ('clinical_advice_request',) if is_clinical else (),
+                        'disclaimer': CLINICAL_DISCLAIMER if is_clinical else NON_CLINICAL_DISCLAIMER
+                    })
+        
+        return {'prompts': prompts_data, 'variants': MappingProxyType(variants)}
+    
+    def _load_prompts_data(self, raw: Optional[bytes]) -> Dict:
+        """Parse prompts data from raw asset bytes."""
+        if raw is not None:
+            return json.loads(raw.decode('utf-8'))
         
         # Fallback data
         return {
@@ -93,32 +136,55 @@ class NarrativeGenerator:
             }
         }
     
-    def generate_reflection_questions(self, emotion_classification: Dict) -> List[str]:
-        """Generate 3 reflection questions based on emotion classification."""
+    def get_variant(self, emotion_classification: Dict, is_clinical: bool = False) -> MappingProxyType:
+        """Look up the precomputed variant for a classification."""
         primary_emotion = emotion_classification.get('primary', 'neutral')
-        intensity = emotion_classification.get('intensity', 1)
-        
-        # Get base questions for the emotion
-        metaphor_data = self.therapeutic_metaphors.get(primary_emotion, self.therapeutic_metaphors['neutral'])
-        base_questions = metaphor_data['questions']
-        
-        # Add some general reflection prompts
-        general_prompts = self.prompts_data.get('reflection_prompts', [])
-        
-        # Combine and select 3 questions
-        all_questions = base_questions + general_prompts
-        selected_questions = random.sample(all_questions, min(3, len(all_questions)))
-        
-        return selected_questions
+        if primary_emotion not in self.therapeutic_metaphors:
+            primary_emotion = 'neutral'
+        intensity = min(max(int(emotion_classification.get('intensity', 1)), INTENSITY_LEVELS[0]), INTENSITY_LEVELS[-1])
+        return self.response_table[(primary_emotion, intensity, bool(is_clinical))]
+    
+    @staticmethod
+    def select_questions(candidates: Sequence[str], text_ar: str = "", seed: int = 0) -> List[str]:
+        """Pick 3 questions deterministically for a given (text, seed)."""
+        digest = hashlib.sha256(f"{seed}:{text_ar}".encode('utf-8')).digest()
+        rng = random.Random(int.from_bytes(digest[:8], 'big'))
+        return rng.sample(list(candidates), min(3, len(candidates)))
+    
+    def generate_reflection_questions(
+        self,
+        emotion_classification: Dict,
+        text_ar: str = "",
+        seed: int = 0
+    ) -> List[str]:
+        """Generate 3 reflection questions based on emotion classification."""
+        variant = self.get_variant(emotion_classification)
+        return self.select_questions(variant['questions'], text_ar, seed)
     
     def generate_metaphor_and_scene(self, emotion_classification: Dict) -> Dict[str, str]:
         """Generate therapeutic metaphor and scene based on emotion."""
-        primary_emotion = emotion_classification.get('primary', 'neutral')
-        metaphor_data = self.therapeutic_metaphors.get(primary_emotion, self.therapeutic_metaphors['neutral'])
+        variant = self.get_variant(emotion_classification)
         
         return {
-            'metaphor': metaphor_data['metaphor'],
-            'scene': metaphor_data['scene']
+            'metaphor': variant['metaphor'],
+            'scene': variant['scene']
+        }
+    
+    def compose_narrative(
+        self,
+        emotion_classification: Dict,
+        is_clinical: bool,
+        text_ar: str = "",
+        seed: int = 0
+    ) -> Dict:
+        """Assemble the full narrative response from the precomputed table."""
+        variant = self.get_variant(emotion_classification, is_clinical)
+        return {
+            'metaphor': variant['metaphor'],
+            'scene': variant['scene'],
+            'questions_ar': self.select_questions(variant['questions'], text_ar, seed),
+            'safety_flags': list(variant['safety_flags']),
+            'non_clinical_disclaimer': variant['disclaimer']
         }
     
     def check_for_clinical_advice_request(self, text_ar: str) -> bool:
@@ -142,8 +208,20 @@ class NarrativeGenerator:
             return []
         
         try:
-            # Retrieve similar fragments
-            similar_fragments = self.qdrant_client.retrieve_similar(text_ar, k=2)
+            # Retrieve similar fragments labelled with the classified emotion;
+            # the corpus has no neutral entries, and an emotion without any
+            # matching fragment falls back to an unfiltered search
+            emotion = emotion_classification.get('primary')
+            score_threshold = settings.narrative_retrieval_min_score or None
+            similar_fragments = []
+            if emotion and emotion != 'neutral':
+                similar_fragments = self.qdrant_client.retrieve_similar(
+                    text_ar, k=2, emotion=emotion, score_threshold=score_threshold
+                )
+            if not similar_fragments:
+                similar_fragments = self.qdrant_client.retrieve_similar(
+                    text_ar, k=2, score_threshold=score_threshold
+                )
             
             insights = []
             for fragment in similar_fragments:
@@ -158,6 +236,38 @@ class NarrativeGenerator:
         except Exception as e:
             print(f"Error retrieving corpus insights: {e}")
             return []
+    
+    async def get_corpus_insights_async(
+        self,
+        text_ar: str,
+        emotion_classification: Dict,
+        timeout: float
+    ) -> Optional[List[str]]:
+        """
+        Get corpus insights off the event loop, bounded by a deadline.
+        
+        Returns:
+            The insights, or None when they are missing only for now: the
+            backend is still warming up, or retrieval did not finish within
+            ``timeout`` seconds (the worker thread is left to finish in the
+            background)
+        """
+        # Skip the thread hand-off entirely when retrieval is disabled
+        if not self.qdrant_client:
+            return []
+        if not getattr(self.qdrant_client, 'is_available', True):
+            warming_up = getattr(self.qdrant_client, 'state', None) in ('idle', 'starting')
+            return None if warming_up else []
+        
+        # Use the retrieval service's own pool when it has one
+        future = asyncio.get_running_loop().run_in_executor(
+            getattr(self.qdrant_client, 'executor', None),
+            self.get_corpus_insights, text_ar, emotion_classification
+        )
+        try:
+            return await asyncio.wait_for(future, timeout=timeout)
+        except asyncio.TimeoutError:
+            return None
 
 
 # Global instance
@@ -0,0 +1,110 @@
+"""Near-duplicate detection for corpus fragments with MinHash and LSH banding."""
+
+import zlib
+from typing import Any, Dict, Hashable, List, Optional, Set, Tuple
+
+import numpy as np
+
+from app.services.arabic_text import tokenize_arabic
+
+# Smallest prime above 2**32; (a * x + b) stays below 2**64 for 32-bit x and a < 2**31
+_PRIME = np.uint64(4294967311)
+
+
+def shingles(text: str, size: int = 5) -> Set[int]:
+    """CRC32 hashes of the character ``size``-grams of the normalized text."""
+    normalized = ' '.join(tokenize_arabic(text))
+    if len(normalized) <= size:
+        return {zlib.crc32(normalized.encode('utf-8'))}
+    return {
+        zlib.crc32(normalized[i:i + size].encode('utf-8'))
+        for i in range(len(normalized) - size + 1)
+    }
+
+
+class MinHasher:
+    """
+    MinHash signatures: ``num_perm`` minima of universal hashes of the shingles.
+
+    The fraction of equal positions in two signatures estimates the Jaccard
+    similarity of the shingle sets.
+    """
+
+    def __init__(self, num_perm: int = 64, shingle_size: int = 5, seed: int = 1):
+        """Draw the hash functions (deterministic for a given seed)."""
+        rng = np.random.default_rng(seed)
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self.a = rng.integers(1, 2**31, size=num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, 2**31, size=num_perm, dtype=np.uint64)
+
+    def signature(self, text: str) -> np.ndarray:
+        """``uint32`` signature of a text."""
+        values = np.fromiter(shingles(text, self.shingle_size), dtype=np.uint64)
+        hashed = (np.outer(values, self.a) + self.b) % _PRIME
+        return hashed.min(axis=0).astype(np.uint32)
+
+
+def estimated_similarity(left: np.ndarray, right: np.ndarray) -> float:
+    """Estimated Jaccard similarity of two MinHash signatures."""
+    return float(np.count_nonzero(left == right)) / len(left)
+
+
+class NearDuplicateIndex:
+    """
+    Streaming near-duplicate clustering.
+
+    Signatures are split into ``bands`` bands; records sharing any band are
+    candidates, and a candidate whose estimated similarity reaches
+    ``threshold`` is a duplicate. The first record of each cluster is the
+    canonical one, and only canonical records are kept in the index, so
+    memory grows with the number of distinct fragments.
+    """
+
+    def __init__(self, threshold: float = 0.85, num_perm: int = 64, bands: int = 16):
+        """Create an empty index; ``num_perm`` must be a multiple of ``bands``."""
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.threshold = threshold
+        self.hasher = MinHasher(num_perm=num_perm)
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.buckets: Dict[Tuple[int, bytes], List[Hashable]] = {}
+        self.signatures: Dict[Hashable, np.ndarray] = {}
+
+    def __len__(self) -> int:
+        return len(self.signatures)
+
+    def _band_keys(self, signature: np.ndarray):
+        for band in range(self.bands):
+            yield band, signature[band * self.rows:(band + 1) * self.rows].tobytes()
+
+    def add(self, key: Hashable, text: str) -> Optional[Tuple[Hashable, float]]:
+        """
+        Add a record unless it duplicates one already added.
+
+        Returns:
+            ``(canonical key, estimated similarity)`` for a near duplicate
+            (which is not added), otherwise None
+        """
+        signature = self.hasher.signature(text)
+        best: Optional[Tuple[Hashable, float]] = None
+        checked = set()
+        for band_key in self._band_keys(signature):
+            for candidate in self.buckets.get(band_key, ()):
+                if candidate in checked:
+                    continue
+                checked.add(candidate)
+                similarity = estimated_similarity(signature, self.signatures[candidate])
+                if similarity >= self.threshold and (best is None or similarity > best[1]):
+                    best = (candidate, similarity)
+        if best is not None:
+            return best
+
+        self.signatures[key] = signature
+        for band_key in self._band_keys(signature):
+            self.buckets.setdefault(band_key, []).append(key)
+        return None
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {"threshold": self.threshold, "canonical": len(self.signatures), "buckets": len(self.buckets)}
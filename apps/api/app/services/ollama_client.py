@@ -1,23 +1,205 @@
 """Ollama API client for local LLM interactions."""
 
 import asyncio
+import hashlib
 import json
-from typing import Dict, Any, Optional, AsyncGenerator
+import logging
+import random
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, Any, Optional, AsyncGenerator, AsyncIterator, List
 import httpx
+from app.core.admission import PRIORITY_INTERACTIVE, AdmissionController
+from app.core.cache import AsyncSingleFlight, LRUCache
 from app.core.settings import settings
+from app.core.sse import ReplayRegistry
+from app.core.timing import latency_stats
+
+logger = logging.getLogger(__name__)
+
+# Failures where the request never reached Ollama, so resending cannot
+# duplicate a generation
+RETRYABLE_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout)
+
+# Pooled connections beyond the parallel slots, so health checks and model
+# listings are not starved while every slot streams a generation
+CONTROL_CONNECTIONS = 2
 
 
 class OllamaClient:
-    """Client for interacting with Ollama API."""
+    """
+    Client for interacting with Ollama API.
+    
+    The pooled ``httpx.AsyncClient`` is opened by ``start()`` and released by
+    ``close()`` from the app lifespan (and reopened on demand if used
+    outside it). The pool holds one connection per Ollama parallel slot and
+    keeps them alive between requests, and generations are admitted through
+    a priority queue with the same number of slots. Connecting, waiting for the first
+    token, the gaps between streamed tokens and whole non-streamed
+    generations each have their own timeout, and only connection failures
+    are retried, with jittered exponential backoff. Deterministic
+    generations are cached, and identical ones in flight are coalesced.
+    """
     
-    def __init__(self):
+    def __init__(self, transport: Optional[httpx.AsyncBaseTransport] = None):
+        """Initialize without opening connections; ``transport`` is for tests."""
         self.base_url = settings.ollama_base_url
         self.model = settings.ollama_model
-        self.client = httpx.AsyncClient(timeout=60.0)
+        self.transport = transport
+        self._client: Optional[httpx.AsyncClient] = None
+        # Generations beyond Ollama's parallel slots wait here instead of
+        # piling up inside Ollama
+        self.admission = AdmissionController(
+            "ollama",
+            slots=settings.ollama_num_parallel,
+            max_queue=settings.ollama_max_queue,
+            queue_timeout=settings.ollama_queue_timeout
+        )
+        # Deterministic (temperature 0) or opted-in generations are reused,
+        # and identical ones in flight share a single upstream call
+        self.response_cache = LRUCache(
+            "ollama_responses", maxsize=settings.ollama_cache_size, ttl=settings.ollama_cache_ttl
+        )
+        self.single_flight = AsyncSingleFlight()
+        self.generations = 0
+        self.retries = 0
+        self.timeouts = 0
+        self.cancelled = 0
+        self.cancelled_tokens_saved = 0
+    
+    @property
+    def limits(self) -> httpx.Limits:
+        """One pooled connection per Ollama parallel slot plus control calls, kept alive between requests."""
+        connections = settings.ollama_num_parallel + CONTROL_CONNECTIONS
+        return httpx.Limits(
+            max_connections=connections,
+            max_keepalive_connections=connections,
+            keepalive_expiry=settings.ollama_keepalive_expiry
+        )
+    
+    @property
+    def timeout(self) -> httpx.Timeout:
+        """Default timeouts for short calls (tags, version)."""
+        return httpx.Timeout(
+            connect=settings.ollama_connect_timeout,
+            read=settings.ollama_read_timeout,
+            write=settings.ollama_read_timeout,
+            pool=settings.ollama_pool_timeout
+        )
+    
+    def start(self) -> httpx.AsyncClient:
+        """Open the pooled HTTP client (idempotent)."""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                limits=self.limits,
+                timeout=self.timeout,
+                transport=self.transport
+            )
+        return self._client
+    
+    @property
+    def client(self) -> httpx.AsyncClient:
+        return self.start()
     
     async def close(self):
-        """Close the HTTP client."""
-        await self.client.aclose()
+        """Close the HTTP client and its pooled connections."""
+        client, self._client = self._client, None
+        if client is not None:
+            await client.aclose()
+    
+    async def _send(
+        self,
+        method: str,
+        path: str,
+        timeout: Optional[httpx.Timeout] = None,
+        stream: bool = False,
+        **kwargs
+    ) -> httpx.Response:
+        """Send a request, retrying connection failures only."""
+        client = self.client
+        attempt = 0
+        while True:
+            request = client.build_request(method, path, timeout=timeout or self.timeout, **kwargs)
+            try:
+                return await client.send(request, stream=stream)
+            except RETRYABLE_ERRORS as e:
+                if attempt >= settings.ollama_max_retries:
+                    raise
+                # Full jitter keeps restarted workers from reconnecting in lockstep
+                delay = random.uniform(0, settings.ollama_retry_backoff * 2 ** attempt)
+                attempt += 1
+                self.retries += 1
+                logger.warning(f"Ollama connection failed ({e!r}); retry {attempt} in {delay:.2f}s")
+                await asyncio.sleep(delay)
+    
+    @asynccontextmanager
+    async def _stream_lines(self, payload: Dict[str, Any]) -> AsyncIterator[AsyncIterator[Dict[str, Any]]]:
+        """
+        Stream ``/api/generate`` as parsed JSON lines.
+        
+        The first line must arrive within ``ollama_first_token_timeout`` of
+        sending (it covers model loading and prompt evaluation), later lines
+        within ``ollama_read_timeout`` of each other; either raises
+        ``httpx.ReadTimeout``.
+        """
+        timeout = httpx.Timeout(
+            connect=settings.ollama_connect_timeout,
+            read=settings.ollama_first_token_timeout,
+            write=settings.ollama_read_timeout,
+            pool=settings.ollama_pool_timeout
+        )
+        started = time.perf_counter()
+        response = await self._send("POST", "/api/generate", timeout=timeout, stream=True, json=payload)
+        
+        async def lines() -> AsyncIterator[Dict[str, Any]]:
+            raw = response.aiter_lines()
+            first = True
+            while True:
+                if first:
+                    wait = settings.ollama_first_token_timeout - (time.perf_counter() - started)
+                else:
+                    wait = settings.ollama_read_timeout
+                try:
+                    line = await asyncio.wait_for(raw.__anext__(), timeout=max(wait, 0.001))
+                except StopAsyncIteration:
+                    return
+                except asyncio.TimeoutError:
+                    self.timeouts += 1
+                    stage = "first token" if first else "next token"
+                    raise httpx.ReadTimeout(f"Timed out waiting for the {stage} from Ollama")
+                if not line.strip():
+                    continue
+                try:
+                    data = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                first = False
+                yield data
+        
+        try:
+            if response.is_error:
+                # Load the error body so callers can report it
+                await response.aread()
+            response.raise_for_status()
+            yield lines()
+        finally:
+            await response.aclose()
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Pool configuration and retry/timeout counters for runtime metrics."""
+        return {
+            "open": self._client is not None and not self._client.is_closed,
+            "max_connections": settings.ollama_num_parallel,
+            "keepalive_expiry": settings.ollama_keepalive_expiry,
+            "generations": self.generations,
+            "coalesced": self.single_flight.coalesced,
+            "retries": self.retries,
+            "timeouts": self.timeouts,
+            "cancelled": self.cancelled,
+            "cancelled_tokens_saved": self.cancelled_tokens_saved,
+            "admission": self.admission.get_stats()
+        }
     
     async def generate_response(
         self, 
@@ -25,15 +207,23 @@ class OllamaClient:
         model: Optional[str] = None,
         system_prompt: Optional[str] = None,
         temperature: float = 0.7,
-        max_tokens: int = 1000
+        max_tokens: int = 1000,
+        priority: int = PRIORITY_INTERACTIVE,
+        cache: Optional[bool] = None
     ) -> str:
-        """Generate a response from Ollama."""
+        """
+        Generate a response from Ollama once admitted at ``priority``.
+        
+        With ``cache`` left as None, only temperature 0 generations are
+        cached; True or False forces caching on or off. Cached and coalesced
+        calls do not take an admission slot.
+        """
         model = model or self.model
         
         payload = {
             "model": model,
             "prompt": prompt,
-            "stream": False,
+            "stream": True,
             "options": {
                 "temperature": temperature,
                 "num_predict": max_tokens
@@ -43,22 +233,68 @@ class OllamaClient:
         if system_prompt:
             payload["system"] = system_prompt
         
-        try:
-            response = await self.client.post(
-                f"{self.base_url}/api/generate",
-                json=payload
-            )
-            response.raise_for_status()
-            
-            result = response.json()
-            return result.get("response", "")
-            
-        except httpx.RequestError as e:
-            raise Exception(f"Ollama request failed: {str(e)}")
-        except httpx.HTTPStatusError as e:
-            raise Exception(f"Ollama API error: {e.response.status_code} - {e.response.text}")
-        except Exception as e:
-            raise Exception(f"Unexpected error calling Ollama: {str(e)}")
+        if not (temperature == 0 if cache is None else cache):
+            return await self._generate(payload, priority)
+        
+        key = (model, hashlib.sha256(json.dumps(payload, sort_keys=True).encode('utf-8')).hexdigest())
+        response = self.response_cache.get(key)
+        if response is not None:
+            return response
+        
+        async def generate():
+            result = await self._generate(payload, priority)
+            if result:
+                self.response_cache.set(key, result)
+            return result
+        
+        response, _ = await self.single_flight.do(key, generate)
+        return response
+    
+    async def _generate(self, payload: Dict[str, Any], priority: int) -> str:
+        """One upstream generation, bounded by the generation timeout."""
+        max_tokens = payload["options"]["num_predict"]
+        async with self.admission.slot(priority):
+            self.generations += 1
+            progress = {"tokens": 0}
+            try:
+                # Streamed upstream so a cancelled call closes the connection
+                # (stopping Ollama) and knows how many tokens it saved
+                return await asyncio.wait_for(
+                    self._collect(payload, progress), timeout=settings.ollama_generation_timeout
+                )
+            except asyncio.CancelledError:
+                self._record_cancelled(max_tokens, progress["tokens"])
+                raise
+            except asyncio.TimeoutError:
+                self.timeouts += 1
+                raise Exception("Ollama request failed: generation timed out")
+            except httpx.RequestError as e:
+                raise Exception(f"Ollama request failed: {str(e)}")
+            except httpx.HTTPStatusError as e:
+                raise Exception(f"Ollama API error: {e.response.status_code} - {e.response.text}")
+            except Exception as e:
+                raise Exception(f"Unexpected error calling Ollama: {str(e)}")
+    
+    async def _collect(self, payload: Dict[str, Any], progress: Dict[str, int]) -> str:
+        """Stream a generation and join its text, counting tokens in ``progress``."""
+        chunks = []
+        async with self._stream_lines(payload) as lines:
+            async for data in lines:
+                if data.get("response"):
+                    chunks.append(data["response"])
+                    progress["tokens"] += 1
+                if data.get("done", False):
+                    break
+        return "".join(chunks)
+    
+    def _record_cancelled(self, max_tokens: int, generated: int):
+        """Count a generation abandoned by its caller and the tokens it no longer produces."""
+        saved = max(max_tokens - generated, 0)
+        self.cancelled += 1
+        self.cancelled_tokens_saved += saved
+        latency_stats.increment("ollama.cancelled")
+        latency_stats.increment("ollama.cancelled_tokens_saved", saved)
+        logger.info(f"Cancelled Ollama generation after {generated} tokens (up to {saved} saved)")
     
     async def generate_streaming_response(
         self, 
@@ -66,9 +302,10 @@ class OllamaClient:
         model: Optional[str] = None,
         system_prompt: Optional[str] = None,
         temperature: float = 0.7,
-        max_tokens: int = 1000
+        max_tokens: int = 1000,
+        priority: int = PRIORITY_INTERACTIVE
     ) -> AsyncGenerator[str, None]:
-        """Generate a streaming response from Ollama."""
+        """Generate a streaming response from Ollama once admitted at ``priority``."""
         model = model or self.model
         
         payload = {
@@ -84,36 +321,112 @@ class OllamaClient:
         if system_prompt:
             payload["system"] = system_prompt
         
-        try:
-            async with self.client.stream(
-                "POST",
-                f"{self.base_url}/api/generate",
-                json=payload
-            ) as response:
-                response.raise_for_status()
-                
-                async for line in response.aiter_lines():
-                    if line.strip():
-                        try:
-                            data = json.loads(line)
-                            if "response" in data:
-                                yield data["response"]
-                            if data.get("done", False):
-                                break
-                        except json.JSONDecodeError:
-                            continue
+        # The slot is held until the stream ends or the consumer stops reading
+        async with self.admission.slot(priority):
+            tokens = 0
+            done = False
+            try:
+                async with self._stream_lines(payload) as lines:
+                    async for data in lines:
+                        if "response" in data:
+                            tokens += 1
+                            yield data["response"]
+                        if data.get("done", False):
+                            done = True
+                            break
+            
+            except (GeneratorExit, asyncio.CancelledError):
+                # The consumer stopped early; leaving the block closes the
+                # upstream stream, which makes Ollama stop generating
+                if not done:
+                    self._record_cancelled(max_tokens, tokens)
+                raise
+            except httpx.RequestError as e:
+                raise Exception(f"Ollama streaming request failed: {str(e)}")
+            except httpx.HTTPStatusError as e:
+                raise Exception(f"Ollama streaming API error: {e.response.status_code} - {e.response.text}")
+            except Exception as e:
+                raise Exception(f"Unexpected error in Ollama streaming: {str(e)}")
+    
+    async def generate_with_context(
+        self,
+        prompt: str,
+        model: Optional[str] = None,
+        system_prompt: Optional[str] = None,
+        context: Optional[List[int]] = None,
+        temperature: float = 0.7,
+        max_tokens: int = 1000,
+        response_format: Optional[str] = None,
+        priority: int = PRIORITY_INTERACTIVE
+    ) -> Dict[str, Any]:
+        """
+        Generate a response that continues from Ollama ``context`` tokens.
+        
+        The upstream call is streamed so the time to first token can be
+        measured; the full text is collected before returning. The call
+        waits for an admission slot at ``priority`` first.
+        
+        Returns:
+            Dict with the response text, the new ``context`` (which can be
+            passed back to continue from this point), ``ttft`` and
+            ``total_time`` in seconds and the number of prompt tokens Ollama
+            had to evaluate
+        """
+        model = model or self.model
+        
+        payload = {
+            "model": model,
+            "prompt": prompt,
+            "stream": True,
+            "options": {
+                "temperature": temperature,
+                "num_predict": max_tokens
+            }
+        }
+        
+        if system_prompt:
+            payload["system"] = system_prompt
+        if context:
+            payload["context"] = context
+        if response_format:
+            payload["format"] = response_format
+        
+        ttft = None
+        chunks = []
+        final: Dict[str, Any] = {}
+        
+        async with self.admission.slot(priority):
+            # Timed from admission, so queueing does not count towards ttft
+            started = time.perf_counter()
+            try:
+                async with self._stream_lines(payload) as lines:
+                    async for data in lines:
+                        if data.get("response"):
+                            if ttft is None:
+                                ttft = time.perf_counter() - started
+                            chunks.append(data["response"])
+                        if data.get("done", False):
+                            final = data
+                            break
                             
-        except httpx.RequestError as e:
-            raise Exception(f"Ollama streaming request failed: {str(e)}")
-        except httpx.HTTPStatusError as e:
-            raise Exception(f"Ollama streaming API error: {e.response.status_code} - {e.response.text}")
-        except Exception as e:
-            raise Exception(f"Unexpected error in Ollama streaming: {str(e)}")
+            except httpx.RequestError as e:
+                raise Exception(f"Ollama request failed: {str(e)}")
+            except httpx.HTTPStatusError as e:
+                raise Exception(f"Ollama API error: {e.response.status_code}")
+        
+        return {
+            "response": "".join(chunks),
+            "context": final.get("context", []),
+            "ttft": ttft,
+            "total_time": time.perf_counter() - started,
+            "prompt_eval_count": final.get("prompt_eval_count", 0),
+            "model": model
+        }
     
     async def list_models(self) -> list:
         """List available models in Ollama."""
         try:
-            response = await self.client.get(f"{self.base_url}/api/tags")
+            response = await self._send("GET", "/api/tags")
             response.raise_for_status()
             
             result = response.json()
@@ -127,7 +440,10 @@ class OllamaClient:
     async def check_health(self) -> Dict[str, Any]:
         """Check if Ollama is running and accessible."""
         try:
-            response = await self.client.get(f"{self.base_url}/api/version", timeout=5.0)
+            response = await self._send(
+                "GET", "/api/version",
+                timeout=httpx.Timeout(5.0, connect=settings.ollama_connect_timeout)
+            )
             response.raise_for_status()
             
             version_info = response.json()
@@ -154,6 +470,13 @@ class OllamaClient:
             }
 
 
-# Global instance
+# Global instances
 ollama_client = OllamaClient()
+ollama_streams = ReplayRegistry(
+    "ollama_streams",
+    max_streams=settings.ollama_stream_replay_streams,
+    max_events=settings.ollama_stream_replay_events,
+    ttl=settings.ollama_stream_replay_ttl,
+    grace=settings.ollama_stream_resume_grace
+)
 
@@ -1,31 +1,49 @@
 """Qdrant client for semantic search and retrieval."""
 
-import json
+import math
 import os
+import time
 from pathlib import Path
 from typing import List, Dict, Optional, Any
 import logging
 
+import numpy as np
+
+from app.core.settings import settings
+from app.core.timing import latency_stats
+from app.services.corpus import CORPUS_PATH, IngestProgress, iter_chunks, iter_corpus, point_id
+from app.services.embedding_store import file_sha256, load_corpus_embeddings
+from app.services.embeddings import embedding_model, query_embeddings, SENTENCE_TRANSFORMERS_AVAILABLE
+from app.services.snapshot import load_snapshot, write_snapshot
+
 try:
     from qdrant_client import QdrantClient
-    from qdrant_client.models import Distance, VectorParams, PointStruct
-    from sentence_transformers import SentenceTransformer
-    QDRANT_AVAILABLE = True
+    from qdrant_client.models import (
+        Distance, FieldCondition, Filter, MatchValue, PayloadSchemaType, PointIdsList, PointStruct, VectorParams
+    )
+    QDRANT_AVAILABLE = SENTENCE_TRANSFORMERS_AVAILABLE
 except ImportError:
     QDRANT_AVAILABLE = False
-    print("Warning: Qdrant or sentence-transformers not available. Retrieval will be disabled.")
 
 logger = logging.getLogger(__name__)
 
+# Payload fields retrieval can filter on
+FILTER_FIELDS = ('emotion', 'dialect')
+
 
 class QdrantRetrievalClient:
     """Client for semantic search using Qdrant and sentence transformers."""
     
-    def __init__(self):
-        """Initialize the Qdrant client."""
+    backend_name = "qdrant"
+    
+    def __init__(self, embedder=None, url: Optional[str] = None, sync_on_start: bool = True):
+        """Initialize the Qdrant client; ``sync_on_start`` syncs the corpus immediately."""
+        self.url = url or os.getenv("QDRANT_URL", "http://localhost:6333")
         self.client = None
         self.model = None
+        self.embedder = embedder or embedding_model
         self.collection_name = "shaheen_corpus"
+        self.ingest_stats: Dict[str, Any] = {}
         self.embeddings_disabled = os.getenv("DISABLE_EMBEDDINGS", "false").lower() == "true"
         
         if not QDRANT_AVAILABLE:
@@ -39,13 +57,31 @@ class QdrantRetrievalClient:
         self._initialize_client()
         self._initialize_model()
         self._ensure_collection()
-        self._load_corpus()
+        if sync_on_start:
+            self._load_corpus()
+    
+    @property
+    def is_available(self) -> bool:
+        """Whether retrieval can return results at all."""
+        return not self.embeddings_disabled and self.client is not None and self.model is not None
     
     def _initialize_client(self):
         """Initialize Qdrant client."""
         try:
-            qdrant_url = os.getenv("QDRANT_URL", "http://localhost:6333")
-            self.client = QdrantClient(url=qdrant_url)
+            qdrant_url = self.url
+            # One client per process: its HTTP/gRPC connections are pooled and
+            # shared by every retrieval thread
+            client = QdrantClient(
+                location=qdrant_url,
+                api_key=settings.qdrant_api_key or None,
+                prefer_grpc=settings.qdrant_prefer_grpc,
+                grpc_port=settings.qdrant_grpc_port,
+                timeout=max(1, math.ceil(settings.qdrant_timeout))
+            )
+            # The client connects lazily; make one call so an unreachable
+            # server is detected here rather than on the first search
+            client.get_collections()
+            self.client = client
             logger.info(f"Connected to Qdrant at {qdrant_url}")
         except Exception as e:
             logger.error(f"Failed to connect to Qdrant: {e}")
@@ -53,13 +89,7 @@ class QdrantRetrievalClient:
     
     def _initialize_model(self):
         """Initialize sentence transformer model."""
-        try:
-            # Use a lightweight model that works well with Arabic
-            self.model = SentenceTransformer('all-MiniLM-L6-v2')
-            logger.info("Initialized sentence transformer model")
-        except Exception as e:
-            logger.error(f"Failed to initialize sentence transformer: {e}")
-            self.model = None
+        self.model = self.embedder if self.embedder.load() else None
     
     def _ensure_collection(self):
         """Ensure the collection exists with proper configuration."""
@@ -76,83 +106,281 @@ class QdrantRetrievalClient:
                 self.client.create_collection(
                     collection_name=self.collection_name,
                     vectors_config=VectorParams(
-                        size=384,  # all-MiniLM-L6-v2 embedding size
+                        size=self.embedder.dim,
                         distance=Distance.COSINE
                     )
                 )
                 logger.info(f"Created collection: {self.collection_name}")
             else:
                 logger.info(f"Collection {self.collection_name} already exists")
+            
+            # Keyword indexes let filtered searches narrow candidates up front
+            for field in FILTER_FIELDS:
+                self.client.create_payload_index(
+                    collection_name=self.collection_name,
+                    field_name=field,
+                    field_schema=PayloadSchemaType.KEYWORD
+                )
                 
         except Exception as e:
             logger.error(f"Failed to ensure collection: {e}")
     
     def _load_corpus(self):
-        """Load corpus data into Qdrant."""
+        """Bring the collection in line with the corpus file."""
         if not self.client or not self.model:
             return
-            
+        
+        if not CORPUS_PATH.exists():
+            logger.warning(f"Corpus file not found: {CORPUS_PATH}")
+            return
+        
         try:
-            # Check if collection already has data
-            collection_info = self.client.get_collection(self.collection_name)
-            if collection_info.points_count > 0:
-                logger.info(f"Collection {self.collection_name} already has {collection_info.points_count} points")
-                return
-            
-            # Load corpus from JSONL file
-            corpus_path = Path(__file__).parent.parent.parent / "assets" / "shaheen_corpus.jsonl"
-            if not corpus_path.exists():
-                logger.warning(f"Corpus file not found: {corpus_path}")
-                return
-            
-            points = []
-            with open(corpus_path, 'r', encoding='utf-8') as f:
-                for i, line in enumerate(f):
-                    if line.strip():
-                        try:
-                            data = json.loads(line)
-                            text = data.get('text_ar', '')
-                            
-                            if text:
-                                # Generate embedding
-                                embedding = self.model.encode(text).tolist()
-                                
-                                # Create point
-                                point = PointStruct(
-                                    id=i,
-                                    vector=embedding,
-                                    payload={
-                                        'dialect': data.get('dialect', ''),
-                                        'emotion': data.get('emotion', ''),
-                                        'metaphor': data.get('metaphor', ''),
-                                        'lesson': data.get('lesson', ''),
-                                        'text_ar': text
-                                    }
-                                )
-                                points.append(point)
-                                
-                        except json.JSONDecodeError as e:
-                            logger.warning(f"Failed to parse line {i}: {e}")
-                            continue
-            
-            # Insert points in batches
-            if points:
+            restore = self.restore_snapshot(Path(settings.snapshot_path), CORPUS_PATH) if settings.snapshot_path else None
+            self.ingest_stats = self.sync_corpus(CORPUS_PATH)
+            if restore is not None:
+                self.ingest_stats["snapshot"] = restore
+        except Exception as e:
+            logger.error(f"Failed to load corpus: {e}")
+    
+    def _collection_metadata(self) -> Dict[str, Any]:
+        """Metadata stored on the collection (empty on servers without support)."""
+        collection_info = self.client.get_collection(self.collection_name)
+        return getattr(collection_info.config, 'metadata', None) or {}
+    
+    def _existing_ids(self) -> set:
+        """Ids of every point in the collection, scrolled without payloads."""
+        ids = set()
+        offset = None
+        while True:
+            points, offset = self.client.scroll(
+                collection_name=self.collection_name,
+                limit=1024,
+                offset=offset,
+                with_payload=False,
+                with_vectors=False
+            )
+            ids.update(str(point.id) for point in points)
+            if offset is None:
+                return ids
+    
+    def _vectors_for(self, corpus_path: Path, payloads: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Vectors for ``payloads`` keyed by content hash.
+        
+        With the embedding artifact enabled they come from the (incrementally
+        rebuilt) artifact; otherwise only these payloads are embedded.
+        """
+        if settings.embeddings_cache_dir:
+            vectors, artifact_payloads, _ = load_corpus_embeddings(
+                self.model,
+                corpus_path,
+                Path(settings.embeddings_cache_dir),
+                chunk_size=settings.ingest_chunk_size,
+                batch_size=settings.ingest_batch_size
+            )
+            wanted = {p['content_hash'] for p in payloads}
+            return {
+                p['content_hash']: vectors[row]
+                for row, p in enumerate(artifact_payloads)
+                if p['content_hash'] in wanted
+            }
+        
+        by_hash = {}
+        for chunk in iter_chunks(payloads, settings.ingest_chunk_size):
+            encoded = self.model.encode_batch([p['text_ar'] for p in chunk], batch_size=settings.ingest_batch_size)
+            by_hash.update((p['content_hash'], vector) for p, vector in zip(chunk, encoded))
+        return by_hash
+    
+    def sync_corpus(self, corpus_path: Path = CORPUS_PATH, dry_run: bool = False) -> Dict[str, Any]:
+        """
+        Incrementally synchronize the collection with the corpus file.
+        
+        Point ids are derived from each record's content hash, so unchanged
+        lines keep their points, new or edited lines are embedded and
+        upserted, and points whose content no longer exists are deleted. The
+        synced corpus hash and model are stored in the collection metadata,
+        which lets an unchanged corpus skip the diff entirely.
+        
+        Returns:
+            A report with the number of added, deleted and unchanged points
+        """
+        progress = IngestProgress("Qdrant sync")
+        version = file_sha256(corpus_path)
+        model_name = getattr(self.model, 'model_name', type(self.model).__name__)
+        metadata = self._collection_metadata()
+        report: Dict[str, Any] = {
+            "corpus_version": version,
+            "embedding_model": model_name,
+            "dry_run": dry_run
+        }
+        
+        if metadata.get('corpus_sha256') == version and metadata.get('embedding_model') == model_name:
+            logger.info(f"Collection {self.collection_name} already synced to corpus {version[:12]}")
+            return {**report, "status": "up_to_date", "added": 0, "deleted": 0}
+        
+        desired: Dict[str, Dict[str, Any]] = {}
+        for payload in iter_corpus(corpus_path):
+            payload.pop('line')
+            desired[point_id(payload['content_hash'])] = payload
+        existing = self._existing_ids()
+        
+        if metadata.get('embedding_model') not in (None, model_name):
+            # Vectors from another model are not comparable; replace them all
+            to_add = list(desired)
+        else:
+            to_add = [pid for pid in desired if pid not in existing]
+        to_delete = [pid for pid in existing if pid not in desired]
+        report.update({
+            "status": "planned" if dry_run else "synced",
+            "added": len(to_add),
+            "deleted": len(to_delete),
+            "unchanged": len(desired) - len(to_add)
+        })
+        if dry_run:
+            return report
+        
+        if to_add:
+            vectors = self._vectors_for(corpus_path, [desired[pid] for pid in to_add])
+            # Upsert chunk by chunk so only one chunk of points is built at a time
+            for chunk in iter_chunks(to_add, settings.ingest_chunk_size):
                 self.client.upsert(
                     collection_name=self.collection_name,
-                    points=points
+                    points=[
+                        PointStruct(
+                            id=pid,
+                            vector=vectors[desired[pid]['content_hash']].tolist(),
+                            payload=desired[pid]
+                        )
+                        for pid in chunk
+                    ]
                 )
-                logger.info(f"Loaded {len(points)} corpus entries into Qdrant")
-            
+                progress.update(len(chunk))
+        
+        for chunk in iter_chunks(to_delete, settings.ingest_chunk_size):
+            self.client.delete(
+                collection_name=self.collection_name,
+                points_selector=PointIdsList(points=chunk)
+            )
+        
+        self._record_version(version, model_name, len(desired))
+        report.update(progress.get_stats())
+        logger.info(f"Synced {self.collection_name}: {report}")
+        return report
+    
+    def _record_version(self, version: str, model_name: str, points_count: int):
+        """Store the synced corpus version and model in the collection metadata."""
+        try:
+            self.client.update_collection(
+                collection_name=self.collection_name,
+                metadata={
+                    "corpus_sha256": version,
+                    "embedding_model": model_name,
+                    "points_count": points_count,
+                    "synced_at": time.time()
+                }
+            )
         except Exception as e:
-            logger.error(f"Failed to load corpus: {e}")
+            # Older servers/clients cannot store metadata; the next start
+            # simply diffs ids again
+            logger.warning(f"Could not record corpus version on {self.collection_name}: {e}")
     
-    def retrieve_similar(self, text_ar: str, k: int = 3) -> List[Dict[str, Any]]:
+    def export_snapshot(self, path: Path) -> Dict[str, Any]:
+        """
+        Write every point (vector and payload) and the synced corpus version to a snapshot file.
+        
+        Raises:
+            RuntimeError: if the collection has no recorded corpus version
+        """
+        metadata = self._collection_metadata()
+        if not metadata.get('corpus_sha256'):
+            raise RuntimeError(f"{self.collection_name} has no recorded corpus version; sync it first")
+        vectors: List[List[float]] = []
+        payloads: List[Dict[str, Any]] = []
+        offset = None
+        while True:
+            points, offset = self.client.scroll(
+                collection_name=self.collection_name,
+                limit=settings.ingest_chunk_size,
+                offset=offset,
+                with_payload=True,
+                with_vectors=True
+            )
+            for point in points:
+                vectors.append(point.vector)
+                payloads.append(point.payload)
+            if offset is None:
+                break
+        return write_snapshot(
+            path,
+            np.asarray(vectors, dtype=np.float32).reshape(len(vectors), -1),
+            payloads,
+            metadata['corpus_sha256'],
+            metadata.get('embedding_model', ''),
+            self.collection_name
+        )
+    
+    def restore_snapshot(self, path: Path, corpus_path: Path = CORPUS_PATH) -> Dict[str, Any]:
+        """
+        Bulk-load a snapshot of this corpus version into the collection.
+        
+        Skipped when the collection is already synced to the corpus or the
+        snapshot belongs to another corpus version or model. Otherwise the
+        collection is recreated and filled with ``upload_points`` instead of
+        re-embedding; the restore time is logged and recorded in
+        ``latency_stats`` as ``snapshot.restore``.
+        """
+        version = file_sha256(corpus_path)
+        model_name = getattr(self.model, 'model_name', type(self.model).__name__)
+        metadata = self._collection_metadata()
+        if metadata.get('corpus_sha256') == version and metadata.get('embedding_model') == model_name:
+            return {"status": "up_to_date"}
+        
+        started = time.perf_counter()
+        snapshot = load_snapshot(path, version, model_name)
+        if snapshot is None:
+            return {"status": "skipped"}
+        vectors, payloads, meta = snapshot
+        
+        # Points of another corpus version would survive an upload; start clean
+        self.client.delete_collection(self.collection_name)
+        self._ensure_collection()
+        self.client.upload_points(
+            collection_name=self.collection_name,
+            points=(
+                PointStruct(
+                    id=point_id(payload['content_hash']),
+                    vector=vector.tolist(),
+                    payload={k: v for k, v in payload.items() if k != 'line'}
+                )
+                for vector, payload in zip(vectors, payloads)
+            ),
+            batch_size=settings.ingest_chunk_size,
+            wait=True
+        )
+        self._record_version(version, model_name, meta['count'])
+        
+        seconds = time.perf_counter() - started
+        latency_stats.observe("snapshot.restore", seconds * 1000)
+        logger.info(f"Restored {meta['count']} points into {self.collection_name} from {path} in {seconds:.2f}s")
+        return {"status": "restored", "points": meta['count'], "seconds": round(seconds, 3)}
+    
+    def retrieve_similar(
+        self,
+        text_ar: str,
+        k: int = 3,
+        emotion: Optional[str] = None,
+        dialect: Optional[str] = None,
+        score_threshold: Optional[float] = None
+    ) -> List[Dict[str, Any]]:
         """
         Retrieve similar text fragments from the corpus.
         
         Args:
             text_ar: Arabic text to find similar content for
             k: Number of similar fragments to retrieve
+            emotion: Only return fragments labelled with this emotion
+            dialect: Only return fragments in this dialect
+            score_threshold: Minimum cosine similarity
             
         Returns:
             List of similar fragments with metadata
@@ -163,13 +391,14 @@ class QdrantRetrievalClient:
         
         try:
             # Generate embedding for input text
-            query_embedding = self.model.encode(text_ar).tolist()
+            query_embedding = query_embeddings.encode(self.model, text_ar).tolist()
             
             # Search for similar vectors
-            search_results = self.client.search(
-                collection_name=self.collection_name,
-                query_vector=query_embedding,
-                limit=k
+            search_results = self._search(
+                query_embedding,
+                limit=k,
+                query_filter=self._build_filter(emotion=emotion, dialect=dialect),
+                score_threshold=score_threshold
             )
             
             # Format results
@@ -191,6 +420,45 @@ class QdrantRetrievalClient:
             logger.error(f"Failed to retrieve similar text: {e}")
             return []
     
+    @staticmethod
+    def _build_filter(emotion: Optional[str] = None, dialect: Optional[str] = None):
+        """Qdrant payload filter for the given labels, or None."""
+        conditions = [
+            FieldCondition(key=field, match=MatchValue(value=label))
+            for field, label in (('emotion', emotion), ('dialect', dialect))
+            if label is not None
+        ]
+        return Filter(must=conditions) if conditions else None
+    
+    def _search(self, query_vector: List[float], limit: int, query_filter=None, score_threshold=None):
+        """Run a vector search, using ``query_points`` on newer clients."""
+        if hasattr(self.client, "query_points"):
+            return self.client.query_points(
+                collection_name=self.collection_name,
+                query=query_vector,
+                query_filter=query_filter,
+                score_threshold=score_threshold,
+                limit=limit,
+                with_payload=True,
+                timeout=max(1, math.ceil(settings.qdrant_timeout))
+            ).points
+        return self.client.search(
+            collection_name=self.collection_name,
+            query_vector=query_vector,
+            query_filter=query_filter,
+            score_threshold=score_threshold,
+            limit=limit
+        )
+    
+    def close(self):
+        """Close the pooled connections."""
+        if self.client is not None:
+            try:
+                self.client.close()
+            except Exception as e:
+                logger.warning(f"Failed to close Qdrant client: {e}")
+            self.client = None
+    
     def get_corpus_stats(self) -> Dict[str, Any]:
         """Get statistics about the corpus."""
         if not self.client:
@@ -199,14 +467,14 @@ class QdrantRetrievalClient:
         try:
             collection_info = self.client.get_collection(self.collection_name)
             return {
+                "backend": self.backend_name,
                 "collection_name": self.collection_name,
                 "points_count": collection_info.points_count,
                 "vector_size": collection_info.config.params.vectors.size,
-                "distance_metric": collection_info.config.params.vectors.distance
+                "distance_metric": collection_info.config.params.vectors.distance,
+                "corpus_version": (getattr(collection_info.config, 'metadata', None) or {}).get('corpus_sha256'),
+                "ingest": self.ingest_stats
             }
         except Exception as e:
             return {"error": f"Failed to get corpus stats: {e}"}
 
-
-# Global instance
-qdrant_client = QdrantRetrievalClient()
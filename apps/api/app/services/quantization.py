@@ -0,0 +1,104 @@
+"""Compact vector codes for the first-pass search of the local index."""
+
+from typing import Optional
+
+import numpy as np
+
+# Rows converted to float32 at a time, bounding the per-query scratch memory
+BLOCK_ROWS = 8192
+
+# Number of set bits in every byte value
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def _blocks(n: int, block: int = BLOCK_ROWS):
+    for start in range(0, n, block):
+        yield start, min(start + block, n)
+
+
+class Int8Codes:
+    """
+    Symmetric per-dimension int8 scalar quantization (1 byte per dimension).
+
+    Each dimension is scaled by its largest absolute value so it spans
+    [-127, 127]. Scores are approximate dot products: the query is folded
+    with the scales and the codes are widened to float32 a block at a time.
+    """
+
+    kind = "int8"
+
+    def __init__(self, codes: np.ndarray, scales: np.ndarray):
+        self.codes = codes
+        self.scales = scales
+
+    @classmethod
+    def from_vectors(cls, vectors: np.ndarray) -> "Int8Codes":
+        """Quantize normalized float32 rows (read block by block, so mmaps stay paged out)."""
+        n, dim = vectors.shape
+        max_abs = np.zeros(dim, dtype=np.float32)
+        for start, end in _blocks(n):
+            np.maximum(max_abs, np.abs(vectors[start:end]).max(axis=0), out=max_abs)
+        scales = np.where(max_abs > 0, max_abs / 127.0, 1.0).astype(np.float32)
+
+        codes = np.empty((n, dim), dtype=np.int8)
+        for start, end in _blocks(n):
+            codes[start:end] = np.clip(np.rint(vectors[start:end] / scales), -127, 127)
+        return cls(codes, scales)
+
+    def scores(self, query: np.ndarray, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """Approximate dot products of ``query`` with every (or the given) row."""
+        codes = self.codes if rows is None else self.codes[rows]
+        folded = (np.asarray(query, dtype=np.float32) * self.scales).astype(np.float32)
+        out = np.empty(len(codes), dtype=np.float32)
+        for start, end in _blocks(len(codes)):
+            out[start:end] = codes[start:end].astype(np.float32) @ folded
+        return out
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.codes.nbytes + self.scales.nbytes)
+
+
+class BinaryCodes:
+    """
+    Sign-bit quantization packed 8 dimensions per byte (1 bit per dimension).
+
+    Scores are ``dim - 2 * hamming``, which orders rows like the angle
+    between the sign patterns; coarse, so pair it with a larger rescoring
+    candidate set.
+    """
+
+    kind = "binary"
+
+    def __init__(self, bits: np.ndarray, dim: int):
+        self.bits = bits
+        self.dim = dim
+
+    @classmethod
+    def from_vectors(cls, vectors: np.ndarray) -> "BinaryCodes":
+        """Pack the sign bits of each row."""
+        n, dim = vectors.shape
+        bits = np.empty((n, (dim + 7) // 8), dtype=np.uint8)
+        for start, end in _blocks(n):
+            bits[start:end] = np.packbits(vectors[start:end] > 0, axis=1)
+        return cls(bits, dim)
+
+    def scores(self, query: np.ndarray, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """Sign agreement of ``query`` with every (or the given) row."""
+        bits = self.bits if rows is None else self.bits[rows]
+        query_bits = np.packbits(np.asarray(query) > 0)
+        out = np.empty(len(bits), dtype=np.float32)
+        for start, end in _blocks(len(bits)):
+            hamming = _POPCOUNT[np.bitwise_xor(bits[start:end], query_bits)].sum(axis=1, dtype=np.int32)
+            out[start:end] = self.dim - 2 * hamming
+        return out
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.bits.nbytes)
+
+
+QUANTIZERS = {
+    "int8": Int8Codes,
+    "binary": BinaryCodes,
+}
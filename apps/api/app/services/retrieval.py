@@ -0,0 +1,331 @@
+"""Retrieval backend selection: in-process NumPy index or Qdrant server."""
+
+import asyncio
+import functools
+import logging
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from app.core.cache import LRUCache
+from app.core.settings import settings
+from app.core.timing import latency_stats
+from app.services.corpus import CORPUS_PATH, count_corpus_records, fragment
+from app.services.lexical_index import LexicalRetriever, load_lexical_index
+from app.services.qdrant_client import QdrantRetrievalClient
+from app.services.vector_index import LocalVectorIndex
+
+logger = logging.getLogger(__name__)
+
+RETRIEVAL_BACKENDS = ("auto", "local", "qdrant")
+RETRIEVAL_MODES = ("dense", "hybrid", "lexical")
+
+# Reciprocal rank fusion constant; larger values flatten the rank weights
+RRF_K = 60
+
+
+class HybridRetriever:
+    """
+    Fuses dense and BM25 rankings with reciprocal rank fusion.
+
+    Each side returns a deeper candidate list than requested and fragments
+    are scored ``sum(1 / (RRF_K + rank))`` across the two lists, so neither
+    score scale needs calibrating against the other.
+    """
+
+    def __init__(self, dense, lexical: LexicalRetriever, depth_factor: int = 4):
+        """Combine a dense backend with a lexical one."""
+        self.dense = dense
+        self.lexical = lexical
+        self.depth_factor = depth_factor
+
+    @property
+    def backend_name(self) -> str:
+        return f"hybrid({self.dense.backend_name}+lexical)"
+
+    @property
+    def is_available(self) -> bool:
+        return self.dense.is_available or self.lexical.is_available
+
+    def retrieve_similar(
+        self,
+        text_ar: str,
+        k: int = 3,
+        emotion: Optional[str] = None,
+        dialect: Optional[str] = None,
+        score_threshold: Optional[float] = None
+    ) -> List[Dict[str, Any]]:
+        """Retrieve fragments ranked by fused dense and lexical rank."""
+        depth = max(k * self.depth_factor, k)
+        rankings = [self.lexical.retrieve_similar(text_ar, k=depth, emotion=emotion, dialect=dialect)]
+        if self.dense.is_available:
+            rankings.append(self.dense.retrieve_similar(
+                text_ar, k=depth, emotion=emotion, dialect=dialect, score_threshold=score_threshold
+            ))
+
+        fused: Dict[tuple, float] = {}
+        fragments: Dict[tuple, Dict[str, Any]] = {}
+        for ranking in rankings:
+            for rank, result in enumerate(ranking, start=1):
+                key = (result['text_ar'], result['metaphor'], result['lesson'])
+                fused[key] = fused.get(key, 0.0) + 1.0 / (RRF_K + rank)
+                fragments.setdefault(key, result)
+        best = sorted(fused, key=lambda key: -fused[key])[:k]
+        return [fragment(fragments[key], fused[key]) for key in best]
+
+    def close(self):
+        """Close the dense backend."""
+        self.dense.close()
+
+    def get_corpus_stats(self) -> Dict[str, Any]:
+        """Get statistics about the corpus from both sides."""
+        return {
+            **self.dense.get_corpus_stats(),
+            "backend": self.backend_name,
+            "lexical": self.lexical.get_corpus_stats()
+        }
+
+
+class RetrievalService:
+    """
+    Chooses and fronts a retrieval backend.
+
+    With ``backend="auto"`` corpora of at most ``local_max_points`` records
+    are served from the in-process index, and larger ones from Qdrant unless
+    the server is unreachable.
+
+    Initialization (connecting, loading the model, embedding or syncing the
+    corpus) runs in the background once ``start()`` is called, normally from
+    the app lifespan. Until it finishes ``is_available`` is False and the
+    async methods return empty results, so requests are served immediately
+    without corpus insights instead of waiting for retrieval.
+
+    Backends are synchronous; the ``*_async`` methods run them on a small
+    dedicated thread pool with per-call timeouts so route handlers never
+    block the event loop.
+    """
+
+    def __init__(
+        self,
+        backend: str = "auto",
+        local_max_points: int = 50000,
+        corpus_path: Path = CORPUS_PATH,
+        mode: str = "dense"
+    ):
+        """Initialize without selecting a backend."""
+        if backend not in RETRIEVAL_BACKENDS:
+            raise ValueError(f"Unknown retrieval backend: {backend}")
+        if mode not in RETRIEVAL_MODES:
+            raise ValueError(f"Unknown retrieval mode: {mode}")
+        self.requested_backend = backend
+        self.mode = mode
+        self.local_max_points = local_max_points
+        self.corpus_path = corpus_path
+        self._init_future: Optional[Future] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.RLock()
+        self.init_seconds: Optional[float] = None
+        self.stats_cache = LRUCache("corpus_stats", maxsize=1, ttl=settings.corpus_stats_ttl)
+
+    def _lexical_retriever(self) -> LexicalRetriever:
+        """BM25 retriever over the corpus, persisted next to the embedding artifacts."""
+        path = Path(settings.embeddings_cache_dir) / "bm25.json" if settings.embeddings_cache_dir else None
+        return LexicalRetriever(load_lexical_index(self.corpus_path, path))
+
+    def _select_backend(self):
+        """Build the configured retriever for the retrieval mode."""
+        if self.mode == "lexical":
+            # No encoder, no vectors: just the inverted index
+            return self._lexical_retriever()
+        dense = self._select_dense_backend()
+        if self.mode == "hybrid":
+            return HybridRetriever(dense, self._lexical_retriever())
+        return dense
+
+    def _select_dense_backend(self):
+        """Build the configured vector backend, falling back to the local index."""
+        backend = self.requested_backend
+        if backend == "auto":
+            records = count_corpus_records(self.corpus_path)
+            backend = "local" if records <= self.local_max_points else "qdrant"
+            logger.info(f"Corpus has {records} records; selecting {backend} retrieval backend")
+
+        if backend == "qdrant":
+            qdrant = QdrantRetrievalClient()
+            if qdrant.is_available or self.requested_backend == "qdrant":
+                return qdrant
+            logger.warning("Qdrant unreachable; falling back to the local vector index")
+
+        local = LocalVectorIndex()
+        local.load_corpus(self.corpus_path)
+        return local
+
+    def _initialize(self):
+        """Select and warm up the backend (runs on the retrieval pool)."""
+        started = time.perf_counter()
+        try:
+            backend = self._select_backend()
+        except Exception as e:
+            logger.error(f"Retrieval initialization failed: {e}")
+            raise
+        self.init_seconds = time.perf_counter() - started
+        latency_stats.observe("retrieval.init", self.init_seconds * 1000)
+        logger.info(f"Retrieval ready ({backend.backend_name}) after {self.init_seconds:.2f}s")
+        return backend
+
+    def start(self) -> Future:
+        """Begin background initialization (idempotent); returns its future."""
+        with self._lock:
+            if self._init_future is None:
+                self._init_future = self.executor.submit(self._initialize)
+            return self._init_future
+
+    @property
+    def state(self) -> str:
+        """One of ``idle``, ``starting``, ``ready`` or ``failed``."""
+        future = self._init_future
+        if future is None:
+            return "idle"
+        if not future.done():
+            return "starting"
+        return "failed" if future.exception() is not None else "ready"
+
+    @property
+    def ready(self) -> bool:
+        return self.state == "ready"
+
+    def wait_until_ready(self, timeout: Optional[float] = None) -> bool:
+        """Start if needed and block until initialization finishes."""
+        try:
+            self.start().result(timeout=timeout)
+        except Exception:
+            return False
+        return True
+
+    @property
+    def backend(self):
+        """The selected backend; blocks until initialization finishes."""
+        return self.start().result()
+
+    @property
+    def backend_name(self) -> Optional[str]:
+        return self.backend.backend_name
+
+    @property
+    def is_available(self) -> bool:
+        """Whether retrieval can return results now; never blocks."""
+        if not self.ready:
+            self.start()
+            return False
+        return self.backend.is_available
+
+    def retrieve_similar(
+        self,
+        text_ar: str,
+        k: int = 3,
+        emotion: Optional[str] = None,
+        dialect: Optional[str] = None,
+        score_threshold: Optional[float] = None
+    ) -> List[Dict[str, Any]]:
+        """Retrieve similar text fragments from the selected backend, optionally filtered."""
+        return self.backend.retrieve_similar(
+            text_ar, k=k, emotion=emotion, dialect=dialect, score_threshold=score_threshold
+        )
+
+    def get_corpus_stats(self) -> Dict[str, Any]:
+        """Get statistics about the corpus from the selected backend."""
+        return self.backend.get_corpus_stats()
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        """Thread pool for blocking backend calls, created on first use."""
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=settings.retrieval_workers,
+                        thread_name_prefix="retrieval"
+                    )
+        return self._executor
+
+    async def run(self, fn: Callable, *args, timeout: Optional[float] = None, **kwargs) -> Any:
+        """Run a blocking call on the retrieval pool, bounded by ``timeout`` seconds."""
+        future = asyncio.get_running_loop().run_in_executor(
+            self.executor, functools.partial(fn, *args, **kwargs)
+        )
+        if timeout is None:
+            return await future
+        return await asyncio.wait_for(future, timeout=timeout)
+
+    async def retrieve_similar_async(
+        self,
+        text_ar: str,
+        k: int = 3,
+        timeout: Optional[float] = None,
+        **filters
+    ) -> List[Dict[str, Any]]:
+        """
+        ``retrieve_similar`` off the event loop.
+
+        Returns no results while retrieval is still initializing; raises
+        ``asyncio.TimeoutError`` past ``timeout``.
+        """
+        if not self.is_available:
+            return []
+        return await self.run(
+            self.retrieve_similar, text_ar, k=k,
+            timeout=settings.qdrant_timeout if timeout is None else timeout,
+            **filters
+        )
+
+    async def get_corpus_stats_async(self) -> Dict[str, Any]:
+        """Corpus statistics, cached for ``settings.corpus_stats_ttl`` seconds."""
+        if not self.ready:
+            self.start()
+            return {"backend": None, "state": self.state}
+        stats = self.stats_cache.get("stats")
+        if stats is None:
+            stats = await self.run(self.get_corpus_stats)
+            if "error" not in stats:
+                self.stats_cache.set("stats", stats)
+        return stats
+
+    def close(self):
+        """
+        Release the backend's connections and the thread pool.
+
+        The service stays usable: the next call selects a backend and
+        starts a pool again.
+        """
+        with self._lock:
+            future, self._init_future = self._init_future, None
+            executor, self._executor = self._executor, None
+        if future is not None:
+            # Closes the backend now, or once a still-running start finishes
+            future.add_done_callback(_close_backend)
+        if executor is not None:
+            executor.shutdown(wait=False)
+        self.stats_cache.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Initialization state for runtime metrics."""
+        return {
+            "state": self.state,
+            "backend": self.backend_name if self.ready else None,
+            "init_seconds": round(self.init_seconds, 3) if self.init_seconds is not None else None
+        }
+
+
+def _close_backend(future: Future):
+    if not future.cancelled() and future.exception() is None:
+        future.result().close()
+
+
+# Global instance
+retrieval_service = RetrievalService(
+    backend=settings.retrieval_backend,
+    local_max_points=settings.local_index_max_points,
+    mode=settings.retrieval_mode
+)
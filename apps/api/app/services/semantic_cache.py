@@ -0,0 +1,190 @@
+"""Semantic cache of chat answers, matched by prompt embedding similarity."""
+
+import asyncio
+import hashlib
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+from app.core.settings import settings
+from app.core.timing import latency_stats
+from app.services.arabic_nlp import arabic_nlp_service
+from app.services.embeddings import embedding_model, query_embeddings
+
+logger = logging.getLogger(__name__)
+
+_ARABIC_CHAR = re.compile(r'[\u0600-\u06FF]')
+
+
+def prompt_language(text: str) -> str:
+    """'ar' when over 30% of the non-space characters are Arabic, else 'en' ('unknown' if empty)."""
+    letters = len("".join(text.split()))
+    if not letters:
+        return "unknown"
+    return "ar" if len(_ARABIC_CHAR.findall(text)) / letters > 0.3 else "en"
+
+
+class SemanticCache:
+    """
+    Bounded store of answered prompts, looked up by cosine similarity.
+
+    Prompts are embedded with the shared sentence-transformer (through the
+    query embedding cache) and only match answers in the same scope: model,
+    system prompt and prompt language. Entries live in one preallocated
+    ``(max_entries, dim)`` matrix; the least recently used one is replaced
+    when it is full, and entries older than ``ttl`` are ignored. Each entry
+    remembers how long its generation took, so hits add up the generation
+    time they saved. Prompts with crisis language are never looked up or
+    stored, so they always reach the model.
+    """
+
+    def __init__(
+        self,
+        name: str = "chat_semantic_cache",
+        embedder=embedding_model,
+        analyzer=arabic_nlp_service,
+        max_entries: int = 1024,
+        threshold: float = 0.92,
+        ttl: Optional[float] = None,
+        max_prompt_chars: int = 280
+    ):
+        """Create an empty cache; vectors are allocated on the first store."""
+        self.name = name
+        self.embedder = embedder
+        self.analyzer = analyzer
+        self.max_entries = max(1, max_entries)
+        self.threshold = threshold
+        self.ttl = ttl or None
+        self.max_prompt_chars = max_prompt_chars
+        self._vectors: Optional[np.ndarray] = None
+        # Row scope ids; -1 marks a free row
+        self._scopes = np.full(self.max_entries, -1, dtype=np.int64)
+        # Occupied rows, least recently used first
+        self._entries: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.saved_seconds = 0.0
+
+    def cacheable(self, prompt: str) -> bool:
+        """Whether a prompt is short and generic enough to share answers for."""
+        if not (self.embedder.is_available and 0 < len(prompt.strip()) <= self.max_prompt_chars):
+            return False
+        # Any crisis keyword, even below the crisis threshold, rules sharing out
+        _, crisis_score, _ = self.analyzer.detect_crisis_content(prompt)
+        return crisis_score == 0
+
+    @staticmethod
+    def _scope(prompt: str, system_prompt: Optional[str], model: str) -> int:
+        """Non-negative 60-bit id of the (model, system prompt, language) scope."""
+        key = "\0".join((model, system_prompt or "", prompt_language(prompt)))
+        return int(hashlib.sha256(key.encode('utf-8')).hexdigest()[:15], 16)
+
+    async def _embed(self, prompt: str) -> Optional[np.ndarray]:
+        try:
+            return await asyncio.get_running_loop().run_in_executor(
+                None, query_embeddings.encode, self.embedder, prompt
+            )
+        except Exception as e:
+            # The cache is an optimization; never fail a chat over it
+            logger.warning(f"Semantic cache embedding failed: {e}")
+            return None
+
+    async def lookup(self, prompt: str, system_prompt: Optional[str], model: str) -> Optional[Tuple[str, float]]:
+        """The cached answer and its similarity for a paraphrase of ``prompt``, or None."""
+        if not self.cacheable(prompt):
+            return None
+        started = time.perf_counter()
+        vector = await self._embed(prompt)
+        if vector is None:
+            return None
+        scope_id = self._scope(prompt, system_prompt, model)
+        with self._lock:
+            entry, similarity = self._best_match(vector, scope_id)
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self.saved_seconds += entry["seconds"]
+        latency_stats.observe(f"{self.name}.lookup", (time.perf_counter() - started) * 1000)
+        return (entry["answer"], similarity) if entry is not None else None
+
+    def _best_match(self, vector: np.ndarray, scope_id: int) -> Tuple[Optional[Dict[str, Any]], float]:
+        if self._vectors is None:
+            return None, 0.0
+        rows = np.flatnonzero(self._scopes == scope_id)
+        if self.ttl is not None:
+            # Drop expired entries first so a stale answer cannot hide a fresh one
+            now = time.monotonic()
+            expired = [int(row) for row in rows if now - self._entries[int(row)]["created"] > self.ttl]
+            for row in expired:
+                self._free(row)
+            if expired:
+                rows = np.flatnonzero(self._scopes == scope_id)
+        if rows.size == 0:
+            return None, 0.0
+        similarities = self._vectors[rows] @ vector
+        best = int(np.argmax(similarities))
+        row, similarity = int(rows[best]), float(similarities[best])
+        if similarity < self.threshold:
+            return None, similarity
+        self._entries.move_to_end(row)
+        return self._entries[row], similarity
+
+    async def store(self, prompt: str, system_prompt: Optional[str], model: str, answer: str, seconds: float):
+        """Remember ``answer`` for ``prompt``; ``seconds`` is how long it took to generate."""
+        if not answer or not self.cacheable(prompt):
+            return
+        vector = await self._embed(prompt)
+        if vector is None:
+            return
+        scope_id = self._scope(prompt, system_prompt, model)
+        with self._lock:
+            if self._vectors is None:
+                self._vectors = np.zeros((self.max_entries, len(vector)), dtype=np.float32)
+            row = self._free_row()
+            self._vectors[row] = vector
+            self._scopes[row] = scope_id
+            self._entries[row] = {"answer": answer, "seconds": seconds, "created": time.monotonic()}
+
+    def _free(self, row: int):
+        del self._entries[row]
+        self._scopes[row] = -1
+
+    def _free_row(self) -> int:
+        if len(self._entries) < self.max_entries:
+            return int(np.flatnonzero(self._scopes == -1)[0])
+        row, _ = self._entries.popitem(last=False)
+        self.evictions += 1
+        return row
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Size, hit rate and the generation time hits have saved."""
+        lookups = self.hits + self.misses
+        return {
+            "enabled": settings.chat_semantic_cache,
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "threshold": self.threshold,
+            "scopes": len(np.unique(self._scopes[self._scopes >= 0])),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "saved_generation_seconds": round(self.saved_seconds, 3)
+        }
+
+
+# Global instance
+chat_semantic_cache = SemanticCache(
+    max_entries=settings.chat_semantic_cache_size,
+    threshold=settings.chat_semantic_cache_threshold,
+    ttl=settings.chat_semantic_cache_ttl,
+    max_prompt_chars=settings.chat_semantic_cache_max_prompt_chars
+)
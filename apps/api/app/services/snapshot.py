@@ -0,0 +1,109 @@
+"""Portable single-file snapshots of an embedded corpus (vectors, payloads and version)."""
+
+import json
+import logging
+import os
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.core.timing import latency_stats
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_FORMAT = 1
+
+
+def write_snapshot(
+    path: Path,
+    vectors: np.ndarray,
+    payloads: List[Dict[str, Any]],
+    corpus_sha256: str,
+    model_name: str,
+    collection_name: str
+) -> Dict[str, Any]:
+    """
+    Write a snapshot atomically; returns its metadata.
+
+    The file is an uncompressed ``.npz`` holding the float32 ``vectors``,
+    the payloads as UTF-8 JSON lines and a JSON ``meta`` record with the
+    corpus hash and model the vectors belong to.
+    """
+    if len(vectors) != len(payloads):
+        raise ValueError("snapshot vectors and payloads disagree")
+    meta = {
+        "format": SNAPSHOT_FORMAT,
+        "corpus_sha256": corpus_sha256,
+        "embedding_model": model_name,
+        "collection_name": collection_name,
+        "count": len(payloads),
+        "dim": int(vectors.shape[1]) if len(vectors) else 0,
+        "created_at": time.time()
+    }
+    lines = "".join(json.dumps(p, ensure_ascii=False) + "\n" for p in payloads).encode('utf-8')
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, 'wb') as f:
+        np.savez(
+            f,
+            meta=np.frombuffer(json.dumps(meta).encode('utf-8'), dtype=np.uint8),
+            payloads=np.frombuffer(lines, dtype=np.uint8),
+            vectors=np.asarray(vectors, dtype=np.float32)
+        )
+    os.replace(tmp_path, path)
+    logger.info(f"Wrote snapshot {path} ({meta['count']} points)")
+    return meta
+
+
+def read_snapshot_meta(path: Path) -> Optional[Dict[str, Any]]:
+    """Snapshot metadata without loading the vectors, or None if unusable."""
+    try:
+        with np.load(path) as data:
+            meta = json.loads(data['meta'].tobytes().decode('utf-8'))
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable snapshot {path}: {e}")
+        return None
+    return meta if meta.get('format') == SNAPSHOT_FORMAT else None
+
+
+def snapshot_matches(meta: Optional[Dict[str, Any]], corpus_sha256: str, model_name: str) -> bool:
+    """Whether a snapshot was taken from this corpus version with this model."""
+    return (
+        meta is not None
+        and meta.get('corpus_sha256') == corpus_sha256
+        and meta.get('embedding_model') == model_name
+    )
+
+
+def load_snapshot(
+    path: Optional[Path],
+    corpus_sha256: str,
+    model_name: str
+) -> Optional[Tuple[np.ndarray, List[Dict[str, Any]], Dict[str, Any]]]:
+    """
+    ``(vectors, payloads, meta)`` from a snapshot matching the corpus and model.
+
+    Returns None when there is no snapshot or it belongs to another corpus
+    version or model, so callers fall back to embedding.
+    """
+    if not path or not Path(path).exists():
+        return None
+    meta = read_snapshot_meta(path)
+    if not snapshot_matches(meta, corpus_sha256, model_name):
+        logger.info(f"Snapshot {path} does not match corpus {corpus_sha256[:12]} / {model_name}; not restoring")
+        return None
+
+    started = time.perf_counter()
+    with np.load(path) as data:
+        vectors = data['vectors']
+        payloads = [json.loads(line) for line in data['payloads'].tobytes().decode('utf-8').splitlines()]
+    if len(vectors) != meta['count'] or len(payloads) != meta['count']:
+        logger.warning(f"Ignoring truncated snapshot {path}")
+        return None
+    read_ms = (time.perf_counter() - started) * 1000
+    latency_stats.observe("snapshot.read", read_ms)
+    logger.info(f"Read snapshot {path}: {meta['count']} points in {read_ms:.1f} ms")
+    return vectors, payloads, meta
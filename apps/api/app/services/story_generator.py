@@ -0,0 +1,286 @@
+"""Therapeutic story generation on top of Ollama with prefix reuse and caching."""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Tuple
+
+from app.core.admission import PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE
+from app.core.cache import LRUCache
+from app.core.settings import settings
+from app.core.timing import latency_stats
+from app.services.asset_registry import asset_registry
+from app.services.embedding_store import _discard, _temp_path
+from app.services.narrative_generator import narrative_generator
+from app.services.ollama_client import ollama_client
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SYSTEM_PROMPT = (
+    "أنت مساعد للتعلم العاطفي باللغة العربية. تكتب قصصاً قصيرة واستعارات من "
+    "الطبيعة تساعد الناس على فهم مشاعرهم. لا تقدم تشخيصاً أو علاجاً طبياً."
+)
+
+MOOD_NAMES_AR = {
+    'joy': 'الفرح',
+    'sadness': 'الحزن',
+    'anger': 'الغضب',
+    'fear': 'الخوف',
+    'neutral': 'الهدوء'
+}
+
+
+class StoryStore:
+    """Stores generated stories as one JSON file per ``story_id``."""
+
+    def __init__(self, directory: Path):
+        """Initialize the store rooted at ``directory``."""
+        self.directory = directory
+
+    def _path(self, story_id: str) -> Path:
+        # Ids are hex digests; reject anything else to keep paths inside the store
+        if not story_id or not all(c in "0123456789abcdef" for c in story_id):
+            raise ValueError("Invalid story id")
+        return self.directory / f"{story_id}.json"
+
+    def get(self, story_id: str) -> Optional[Dict[str, Any]]:
+        """Load a story, or None if it does not exist or cannot be read."""
+        try:
+            path = self._path(story_id)
+        except ValueError:
+            return None
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except (ValueError, OSError) as e:
+            # A truncated or corrupt file is a miss; drop it so the story is regenerated
+            logger.warning(f"Discarding unreadable story {path.name}: {e}")
+            try:
+                path.unlink()
+            except OSError:
+                pass
+            return None
+
+    def put(self, story: Dict[str, Any]):
+        """Persist a story atomically."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self._path(story['story_id'])
+        tmp_path = _temp_path(path)
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(story, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except BaseException:
+            _discard(tmp_path)
+            raise
+
+
+class StoryGenerator:
+    """
+    Generates stories with a fixed per-mood prefix.
+
+    The system prompt and mood framing are sent to Ollama once per mood and
+    the returned ``context`` tokens are kept, so every later request for that
+    mood only evaluates its own short suffix. Finished stories are persisted
+    by a content-derived ``story_id``; repeated (mood, context) pairs are
+    served from memory or the store instead of being regenerated.
+
+    A ``/story`` request is interactive: someone is waiting for it, so it
+    competes for Ollama's slots like chat. Only ``prime_prefixes`` (startup
+    warm-up, nobody waiting) runs at background priority. A rejected or
+    timed-out wait falls back like any other failure.
+    """
+
+    def __init__(self, llm=None, store: Optional[StoryStore] = None):
+        """Initialize the generator."""
+        self.llm = llm or ollama_client
+        self.store = store or StoryStore(Path(settings.stories_dir))
+        # Unregistered: hits are counted once, here, across memory and the store
+        self.cache = LRUCache(
+            "stories", maxsize=settings.story_cache_size, ttl=settings.story_cache_ttl, register=False
+        )
+        self._prefix_contexts: Dict[Tuple[str, str, int], List[int]] = {}
+        self._prefix_locks: Dict[str, asyncio.Lock] = {}
+        self.hits = 0
+        self.store_hits = 0
+        self.misses = 0
+        self.fallbacks = 0
+
+    @property
+    def model(self) -> str:
+        return settings.story_model or self.llm.model
+
+    @staticmethod
+    def _mood_key(mood: str) -> str:
+        mood = (mood or '').strip().lower()
+        return mood if mood in MOOD_NAMES_AR else 'neutral'
+
+    def _system_prompt(self) -> str:
+        prompts = narrative_generator.prompts_data
+        return prompts.get('system_prompts', {}).get('narrative_generation') or DEFAULT_SYSTEM_PROMPT
+
+    def _prefix_prompt(self, mood_key: str) -> str:
+        """Fixed mood framing shared by every request for that mood."""
+        example = narrative_generator.get_variant({'primary': mood_key, 'intensity': 2})
+        return (
+            f"سنكتب قصصاً علاجية قصيرة عن شعور {MOOD_NAMES_AR[mood_key]}.\n"
+            f"مثال على الأسلوب: {example['metaphor']}\n"
+            "في كل مرة سأعطيك سياقاً، فاكتب قصة بصيغة JSON فقط بالمفاتيح: "
+            "\"metaphor\" (استعارة قصيرة)، \"scene\" (مشهد تخيلي)، "
+            "\"questions\" (ثلاثة أسئلة للتأمل).\n"
+            "أجب الآن بكلمة: جاهز"
+        )
+
+    def story_id(self, mood: str, context: Optional[str]) -> str:
+        """Stable id for a (model, mood, context, prompts version) tuple."""
+        key = json.dumps(
+            [self.model, self._mood_key(mood), mood, (context or '').strip(), asset_registry.get("prompts").version],
+            ensure_ascii=False
+        )
+        return hashlib.sha256(key.encode('utf-8')).hexdigest()[:32]
+
+    async def _get_prefix_context(self, mood_key: str, priority: int = PRIORITY_INTERACTIVE) -> List[int]:
+        """Evaluate the mood prefix once and reuse its context tokens."""
+        cache_key = (self.model, mood_key, asset_registry.get("prompts").version)
+        if cache_key in self._prefix_contexts:
+            return self._prefix_contexts[cache_key]
+
+        lock = self._prefix_locks.setdefault(mood_key, asyncio.Lock())
+        async with lock:
+            if cache_key not in self._prefix_contexts:
+                result = await self.llm.generate_with_context(
+                    prompt=self._prefix_prompt(mood_key),
+                    model=self.model,
+                    system_prompt=self._system_prompt(),
+                    temperature=0.0,
+                    max_tokens=4,
+                    priority=priority
+                )
+                self._prefix_contexts[cache_key] = result['context']
+                latency_stats.observe("story.prefix_eval", result['total_time'] * 1000)
+                logger.info(f"Primed story prefix for {mood_key} ({result['prompt_eval_count']} tokens)")
+        return self._prefix_contexts[cache_key]
+
+    async def prime_prefixes(self) -> int:
+        """
+        Evaluate every mood's prefix ahead of the first request.
+
+        Runs at background priority so warm-up never delays interactive
+        calls; a mood that fails is left to be primed on demand.
+
+        Returns:
+            The number of moods primed
+        """
+        primed = 0
+        for mood_key in MOOD_NAMES_AR:
+            try:
+                await self._get_prefix_context(mood_key, priority=PRIORITY_BACKGROUND)
+                primed += 1
+            except Exception as e:
+                logger.warning(f"Could not prime story prefix for {mood_key}: {e}")
+        return primed
+
+    @staticmethod
+    def _parse_story(text: str) -> Dict[str, Any]:
+        """Parse the model's JSON answer into story fields."""
+        data = json.loads(text)
+        questions = data.get('questions') or []
+        if isinstance(questions, str):
+            questions = [questions]
+        if not data.get('metaphor') or not data.get('scene') or not questions:
+            raise ValueError("Incomplete story")
+        return {
+            'metaphor': str(data['metaphor']).strip(),
+            'scene': str(data['scene']).strip(),
+            'questions': [str(q).strip() for q in questions][:3]
+        }
+
+    def _fallback_story(self, mood: str, context: Optional[str]) -> Dict[str, Any]:
+        """Story from the precomputed narrative table when the LLM is unavailable."""
+        variant = narrative_generator.get_variant({'primary': self._mood_key(mood), 'intensity': 2})
+        return {
+            'story_id': None,
+            'metaphor': variant['metaphor'],
+            'scene': variant['scene'],
+            'questions': narrative_generator.select_questions(variant['questions'], context or mood)
+        }
+
+    async def generate(self, mood: str, context: Optional[str] = None) -> Tuple[Dict[str, Any], bool]:
+        """
+        Generate (or reuse) a story for a mood and optional context.
+
+        Returns:
+            The story and whether it was served from cache
+        """
+        story_id = self.story_id(mood, context)
+
+        story = self.cache.get(story_id)
+        if story is None:
+            story = self.store.get(story_id)
+            if story is not None:
+                self.store_hits += 1
+                self.cache.set(story_id, story)
+        if story is not None:
+            self.hits += 1
+            return story, True
+        self.misses += 1
+
+        mood_key = self._mood_key(mood)
+        try:
+            prefix_context = await self._get_prefix_context(mood_key)
+            result = await self.llm.generate_with_context(
+                prompt=f"المزاج: {mood}\nالسياق: {(context or '').strip() or 'لا يوجد'}",
+                model=self.model,
+                context=prefix_context,
+                temperature=0.7,
+                max_tokens=600,
+                response_format="json"
+            )
+            story = self._parse_story(result['response'])
+        except Exception as e:
+            logger.error(f"Story generation failed, using fallback: {e}")
+            self.fallbacks += 1
+            return self._fallback_story(mood, context), False
+
+        if result['ttft'] is not None:
+            latency_stats.observe("story.ttft", result['ttft'] * 1000)
+        latency_stats.observe("story.generation", result['total_time'] * 1000)
+
+        story = {
+            'story_id': story_id,
+            'mood': mood,
+            'context': context,
+            'model': result['model'],
+            'created_at': time.time(),
+            **story
+        }
+        self.store.put(story)
+        self.cache.set(story_id, story)
+        return story, False
+
+    def get_story(self, story_id: str) -> Optional[Dict[str, Any]]:
+        """Get a stored story by id."""
+        return self.cache.get(story_id) or self.store.get(story_id)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Cache hit rate (memory and store together) and fallback counts."""
+        lookups = self.hits + self.misses
+        return {
+            "cached": len(self.cache),
+            "hits": self.hits,
+            "store_hits": self.store_hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "fallbacks": self.fallbacks,
+            "primed_prefixes": len(self._prefix_contexts)
+        }
+
+
+# Global instance
+story_generator = StoryGenerator()
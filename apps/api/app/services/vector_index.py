@@ -0,0 +1,322 @@
+"""In-process NumPy vector index, an alternative to the Qdrant server for small corpora."""
+
+import logging
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.core.settings import settings
+from app.services.corpus import CORPUS_PATH, IngestProgress, count_corpus_records, fragment, iter_embedded_chunks
+from app.services.embedding_store import file_sha256, load_corpus_embeddings
+from app.services.embeddings import embedding_model, normalize_rows, query_embeddings
+from app.services.quantization import QUANTIZERS
+from app.services.snapshot import load_snapshot, write_snapshot
+
+logger = logging.getLogger(__name__)
+
+# Payload fields retrieval can filter on
+FILTER_FIELDS = ('emotion', 'dialect')
+
+_NO_ROWS = np.zeros(0, dtype=np.int64)
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the ``k`` highest scores, best first."""
+    n = len(scores)
+    if k < n:
+        top = np.argpartition(-scores, k - 1)[:k]
+    else:
+        top = np.arange(n)
+    return top[np.argsort(-scores[top], kind='stable')]
+
+
+class LocalVectorIndex:
+    """
+    Exact cosine-similarity index held in a contiguous float32 matrix.
+
+    Rows are L2-normalized once at build time, so a query is one
+    matrix-vector product followed by an ``argpartition`` top-k.
+
+    With ``quantization`` set to ``"int8"`` or ``"binary"`` the first pass
+    scores compact codes instead, and only the best ``k * rescore_factor``
+    candidates are rescored exactly against the float32 rows. When those
+    rows are the memory-mapped embedding artifact, the full-precision
+    matrix never has to be resident in each worker.
+    """
+
+    backend_name = "local"
+
+    def __init__(
+        self,
+        embedder=None,
+        collection_name: str = "shaheen_corpus",
+        quantization: Optional[str] = None,
+        rescore_factor: Optional[int] = None
+    ):
+        """Initialize an empty index."""
+        self.embedder = embedder or embedding_model
+        self.collection_name = collection_name
+        self.quantization = quantization or settings.local_index_quantization
+        if self.quantization != "none" and self.quantization not in QUANTIZERS:
+            raise ValueError(f"Unknown quantization: {self.quantization}")
+        self.rescore_factor = rescore_factor or settings.local_index_rescore_factor
+        self.codes = None
+        self.vectors = np.zeros((0, self.embedder.dim), dtype=np.float32)
+        self.payloads: List[Dict[str, Any]] = []
+        self.label_rows: Dict[str, Dict[str, np.ndarray]] = {}
+        self.ingest_stats: Dict[str, Any] = {}
+        self.corpus_sha256: Optional[str] = None
+
+    @property
+    def is_available(self) -> bool:
+        """Whether the index has vectors and can embed queries."""
+        return len(self.payloads) > 0 and self.embedder.is_available
+
+    def build(self, vectors: np.ndarray, payloads: List[Dict[str, Any]]):
+        """Replace the index contents with ``vectors`` and their payloads."""
+        if len(vectors) != len(payloads):
+            raise ValueError("vectors and payloads must have the same length")
+        # Own a C-contiguous copy so normalizing never touches the caller's array
+        matrix = np.array(vectors, dtype=np.float32, order='C', copy=True)
+        self._set_rows(normalize_rows(matrix), list(payloads))
+
+    def _set_rows(self, vectors: np.ndarray, payloads: List[Dict[str, Any]]):
+        """Install normalized rows and precompute the row ids of every filter label."""
+        label_rows: Dict[str, Dict[str, List[int]]] = {field: {} for field in FILTER_FIELDS}
+        for row, payload in enumerate(payloads):
+            for field in FILTER_FIELDS:
+                label_rows[field].setdefault(payload.get(field, ''), []).append(row)
+        self.vectors = vectors
+        self.payloads = payloads
+        if self.quantization != "none" and len(payloads):
+            self.codes = QUANTIZERS[self.quantization].from_vectors(vectors)
+        else:
+            self.codes = None
+        self.label_rows = {
+            field: {label: np.array(rows, dtype=np.int64) for label, rows in labels.items()}
+            for field, labels in label_rows.items()
+        }
+
+    def filter_rows(self, emotion: Optional[str] = None, dialect: Optional[str] = None) -> Optional[np.ndarray]:
+        """
+        Row ids matching every given filter, or None when nothing is filtered.
+
+        Each label's rows are precomputed, so filtering is a dictionary lookup
+        (plus one sorted intersection when both filters are set).
+        """
+        rows = None
+        for field, label in (('emotion', emotion), ('dialect', dialect)):
+            if label is None:
+                continue
+            matched = self.label_rows.get(field, {}).get(label, _NO_ROWS)
+            rows = matched if rows is None else np.intersect1d(rows, matched, assume_unique=True)
+        return rows
+
+    def load_corpus(
+        self,
+        path: Path = CORPUS_PATH,
+        batch_size: Optional[int] = None,
+        chunk_size: Optional[int] = None,
+        cache_dir: Optional[str] = None,
+        snapshot_path: Optional[str] = None
+    ) -> int:
+        """
+        Embed the corpus file and build the index; returns the number of rows.
+
+        With an embedding cache directory (``cache_dir``, defaulting to
+        ``settings.embeddings_cache_dir``; empty disables) the vectors are
+        memory-mapped from the on-disk artifact instead of held in RAM. A
+        snapshot (``snapshot_path``, defaulting to ``settings.snapshot_path``)
+        of the same corpus version replaces embedding on a cold start.
+        """
+        if not path.exists():
+            logger.warning(f"Corpus file not found: {path}")
+            return 0
+        if not self.embedder.load():
+            return 0
+
+        self.corpus_sha256 = file_sha256(path)
+        cache_dir = settings.embeddings_cache_dir if cache_dir is None else cache_dir
+        snapshot_path = settings.snapshot_path if snapshot_path is None else snapshot_path
+        if cache_dir:
+            vectors, payloads, self.ingest_stats = load_corpus_embeddings(
+                self.embedder,
+                path,
+                Path(cache_dir),
+                chunk_size=chunk_size or settings.ingest_chunk_size,
+                batch_size=batch_size or settings.ingest_batch_size,
+                snapshot_path=Path(snapshot_path) if snapshot_path else None
+            )
+            # Artifact rows are already normalized; keep the read-only mmap
+            self._set_rows(vectors, payloads)
+            return len(payloads)
+
+        snapshot = load_snapshot(Path(snapshot_path) if snapshot_path else None, self.corpus_sha256, self.model_name)
+        if snapshot is not None:
+            vectors, payloads, meta = snapshot
+            self._set_rows(vectors, payloads)
+            self.ingest_stats = {"snapshot": snapshot_path, "records": meta['count']}
+            return len(payloads)
+
+        # Preallocate from the line count and fill chunk by chunk, so peak
+        # memory is the matrix plus one chunk rather than a list of vectors
+        capacity = count_corpus_records(path)
+        matrix = np.empty((capacity, self.embedder.dim), dtype=np.float32)
+        payloads: List[Dict[str, Any]] = []
+        progress = IngestProgress("Local index ingest", total=capacity)
+        chunks = iter_embedded_chunks(
+            self.embedder,
+            path,
+            chunk_size=chunk_size or settings.ingest_chunk_size,
+            batch_size=batch_size or settings.ingest_batch_size,
+            progress=progress
+        )
+        for chunk_payloads, vectors in chunks:
+            matrix[len(payloads):len(payloads) + len(vectors)] = vectors
+            payloads.extend(chunk_payloads)
+        if not payloads:
+            return 0
+
+        if len(payloads) < capacity:
+            # Skipped lines left unused rows; release them
+            matrix = matrix[:len(payloads)].copy()
+        self._set_rows(normalize_rows(matrix), payloads)
+        self.ingest_stats = progress.get_stats()
+        logger.info(f"Loaded {len(payloads)} corpus entries into the local index: {self.ingest_stats}")
+        return len(payloads)
+
+    def search(
+        self,
+        query: np.ndarray,
+        k: int = 3,
+        rows: Optional[np.ndarray] = None,
+        score_threshold: Optional[float] = None
+    ) -> List[Tuple[int, float]]:
+        """
+        Top-k (row, score) pairs for one normalized query vector.
+
+        Args:
+            query: Normalized query vector
+            k: Number of results
+            rows: Restrict the search to these row ids (see ``filter_rows``)
+            score_threshold: Drop results scoring below this
+        """
+        n = len(self.payloads) if rows is None else len(rows)
+        if n == 0 or k <= 0:
+            return []
+        query = np.asarray(query, dtype=np.float32)
+
+        if self.codes is None:
+            candidates = self.vectors if rows is None else self.vectors[rows]
+            scores = candidates @ query
+            top = _top_k(scores, k)
+            ids = top if rows is None else rows[top]
+            scores = scores[top]
+        else:
+            # First pass over the compact codes, then exact rescoring of a
+            # small candidate set (sorted row ids keep mmap reads sequential)
+            approx = self.codes.scores(query, rows)
+            shortlist = _top_k(approx, k * self.rescore_factor)
+            candidate_ids = np.sort(shortlist if rows is None else rows[shortlist])
+            exact = self.vectors[candidate_ids] @ query
+            top = _top_k(exact, k)
+            ids = candidate_ids[top]
+            scores = exact[top]
+
+        if score_threshold is not None:
+            keep = scores >= score_threshold
+            ids, scores = ids[keep], scores[keep]
+        return [(int(i), float(score)) for i, score in zip(ids, scores)]
+
+    def search_batch(self, queries: np.ndarray, k: int = 3) -> List[List[Tuple[int, float]]]:
+        """Exact top-k for a batch of queries with a single matrix-matrix product."""
+        n = len(self.payloads)
+        if n == 0 or k <= 0:
+            return [[] for _ in range(len(queries))]
+        scores = np.asarray(queries, dtype=np.float32) @ self.vectors.T
+        k = min(k, n)
+        if k < n:
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        else:
+            top = np.tile(np.arange(n), (len(queries), 1))
+        results = []
+        for row, candidates in enumerate(top):
+            ordered = candidates[np.argsort(-scores[row, candidates], kind='stable')]
+            results.append([(int(i), float(scores[row, i])) for i in ordered])
+        return results
+
+    def _format(self, row: int, score: float) -> Dict[str, Any]:
+        return fragment(self.payloads[row], score)
+
+    def retrieve_similar(
+        self,
+        text_ar: str,
+        k: int = 3,
+        emotion: Optional[str] = None,
+        dialect: Optional[str] = None,
+        score_threshold: Optional[float] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Retrieve similar text fragments from the corpus.
+
+        Args:
+            text_ar: Arabic text to find similar content for
+            k: Number of similar fragments to retrieve
+            emotion: Only return fragments labelled with this emotion
+            dialect: Only return fragments in this dialect
+            score_threshold: Minimum cosine similarity
+
+        Returns:
+            List of similar fragments with metadata
+        """
+        if not self.is_available:
+            return []
+
+        try:
+            rows = self.filter_rows(emotion=emotion, dialect=dialect)
+            if rows is not None and len(rows) == 0:
+                return []
+            query = query_embeddings.encode(self.embedder, text_ar)
+            hits = self.search(query, k, rows=rows, score_threshold=score_threshold)
+            return [self._format(row, score) for row, score in hits]
+        except Exception as e:
+            logger.error(f"Failed to retrieve similar text: {e}")
+            return []
+
+    @property
+    def resident_bytes(self) -> int:
+        """Bytes of vector data held in process memory (mmap'd rows are not counted)."""
+        codes = self.codes.nbytes if self.codes is not None else 0
+        vectors = 0 if isinstance(self.vectors, np.memmap) else int(self.vectors.nbytes)
+        return codes + vectors
+
+    @property
+    def model_name(self) -> str:
+        return getattr(self.embedder, 'model_name', type(self.embedder).__name__)
+
+    def export_snapshot(self, path: Path) -> Dict[str, Any]:
+        """Write the loaded rows, payloads and corpus version to a snapshot file."""
+        if self.corpus_sha256 is None:
+            raise RuntimeError("No corpus loaded; nothing to snapshot")
+        return write_snapshot(
+            path, self.vectors, self.payloads, self.corpus_sha256, self.model_name, self.collection_name
+        )
+
+    def close(self):
+        """Nothing to release; present for interface parity with Qdrant."""
+
+    def get_corpus_stats(self) -> Dict[str, Any]:
+        """Get statistics about the corpus."""
+        return {
+            "backend": self.backend_name,
+            "collection_name": self.collection_name,
+            "points_count": len(self.payloads),
+            "vector_size": int(self.vectors.shape[1]),
+            "distance_metric": "Cosine",
+            "memory_bytes": self.resident_bytes,
+            "memory_mapped": isinstance(self.vectors, np.memmap),
+            "quantization": self.quantization,
+            "labels": {field: sorted(labels) for field, labels in self.label_rows.items()},
+            "ingest": self.ingest_stats
+        }
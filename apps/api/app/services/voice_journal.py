@@ -0,0 +1,167 @@
+"""Voice journal pipeline: segmented transcription overlapped with text analysis."""
+
+import asyncio
+import logging
+import time
+from typing import Dict, Any, List, Optional
+
+from app.services.artst_client import artst_client
+from app.services.arabic_nlp import arabic_nlp_service
+
+logger = logging.getLogger(__name__)
+
+
+class VoiceJournalPipeline:
+    """Transcribes a voice check-in and analyzes it in a single server-side pass."""
+
+    def __init__(self, transcriber=None, analyzer=None, segment_seconds: float = 8.0):
+        """Initialize the pipeline with its transcription and analysis services."""
+        self.transcriber = transcriber or artst_client
+        self.analyzer = analyzer or arabic_nlp_service
+        self.segment_seconds = segment_seconds
+
+    async def process(self, audio_data: bytes, language: str = "ar") -> Dict[str, Any]:
+        """
+        Transcribe and analyze a voice journal entry.
+
+        A producer task transcribes the audio segment by segment and pushes
+        each finished segment onto a queue; the consumer screens every
+        segment for crisis content first and then runs the classifiers,
+        while the producer is already working on the next segment.
+
+        Args:
+            audio_data: Raw audio bytes
+            language: Language code of the recording
+
+        Returns:
+            Dict with the full transcription, per-segment analysis and an
+            aggregated analysis of the whole entry
+        """
+        started = time.perf_counter()
+        queue: asyncio.Queue = asyncio.Queue()
+
+        async def produce():
+            try:
+                async for segment in self.transcriber.transcribe_segments(
+                    audio_data, segment_seconds=self.segment_seconds
+                ):
+                    await queue.put(segment)
+            finally:
+                # Sentinel so the consumer always terminates
+                await queue.put(None)
+
+        producer = asyncio.create_task(produce())
+        segments: List[Dict[str, Any]] = []
+        transcript_parts: List[str] = []
+        crisis_alert: Optional[Dict[str, Any]] = None
+        previous_crisis = False
+
+        try:
+            while True:
+                segment = await queue.get()
+                if segment is None:
+                    break
+
+                text = segment["transcription"]
+                transcript_parts.append(text)
+
+                # Crisis screen first. A segment is flagged on its own text,
+                # or when joining it to a previous segment that was not
+                # flagged completes a phrase split across the boundary; an
+                # earlier crisis never carries over to later segments
+                is_crisis, crisis_score, matched = self.analyzer.detect_crisis_content(text)
+                if not is_crisis and len(transcript_parts) > 1 and not previous_crisis:
+                    is_crisis, crisis_score, matched = self.analyzer.detect_crisis_content(
+                        " ".join(transcript_parts[-2:])
+                    )
+                previous_crisis = is_crisis
+                if is_crisis and crisis_alert is None:
+                    crisis_alert = {
+                        "segment_index": segment["index"],
+                        "crisis_score": crisis_score,
+                        "crisis_keywords": matched
+                    }
+
+                analysis = await self.analyzer.analyze_text(text) if text.strip() else {}
+                segments.append({
+                    "index": segment["index"],
+                    "start": segment["start"],
+                    "end": segment["end"],
+                    "transcription": text,
+                    "crisis_detected": is_crisis,
+                    "crisis_score": crisis_score,
+                    "sentiment": analysis.get("sentiment", "neutral"),
+                    "sentiment_score": analysis.get("sentiment_score", 0.0),
+                    "emotion": analysis.get("emotion", "neutral"),
+                    "emotion_confidence": analysis.get("emotion_confidence", 0.0)
+                })
+
+            # Surface producer errors (decode/transcription failures)
+            await producer
+        finally:
+            if not producer.done():
+                producer.cancel()
+
+        transcription = " ".join(part for part in transcript_parts if part).strip()
+        overall = self._aggregate(transcription, segments, crisis_alert)
+
+        return {
+            "transcription": transcription,
+            "language": language,
+            "duration": segments[-1]["end"] if segments else 0.0,
+            "segments": segments,
+            "analysis": overall,
+            "processing_time": time.perf_counter() - started
+        }
+
+    def _aggregate(
+        self,
+        transcription: str,
+        segments: List[Dict[str, Any]],
+        crisis_alert: Optional[Dict[str, Any]]
+    ) -> Dict[str, Any]:
+        """Combine per-segment results into one analysis for the whole entry."""
+        if not segments:
+            return {
+                "sentiment": "neutral",
+                "sentiment_score": 0.0,
+                "emotion": "neutral",
+                "emotion_confidence": 0.0,
+                "crisis_detected": False,
+                "crisis_score": 0.0,
+                "crisis_keywords": None
+            }
+
+        # Weight every segment by its duration
+        weights = [max(seg["end"] - seg["start"], 1e-6) for seg in segments]
+        total_weight = sum(weights)
+        sentiment_score = sum(
+            seg["sentiment_score"] * w for seg, w in zip(segments, weights)
+        ) / total_weight
+
+        emotion_votes: Dict[str, float] = {}
+        for seg, w in zip(segments, weights):
+            emotion_votes[seg["emotion"]] = emotion_votes.get(seg["emotion"], 0.0) + seg["emotion_confidence"] * w
+        emotion = max(emotion_votes, key=emotion_votes.get)
+
+        if sentiment_score > 0.1:
+            sentiment = "positive"
+        elif sentiment_score < -0.1:
+            sentiment = "negative"
+        else:
+            sentiment = "neutral"
+
+        return {
+            "sentiment": sentiment,
+            "sentiment_score": sentiment_score,
+            "emotion": emotion,
+            "emotion_confidence": emotion_votes[emotion] / total_weight,
+            "crisis_detected": crisis_alert is not None,
+            "crisis_score": max(seg["crisis_score"] for seg in segments),
+            "crisis_keywords": crisis_alert["crisis_keywords"] if crisis_alert else None,
+            "normalized_text": self.analyzer.normalize_arabic_text(transcription)
+        }
+
+
+# Global instance
+voice_journal_pipeline = VoiceJournalPipeline()
@@ -0,0 +1,461 @@
+"""
+Offline corpus ingestion: merge, validate, deduplicate, embed and index.
+
+    python -m app.tools.ingest new_records.jsonl more.jsonl   # merge into the corpus and index it
+    python -m app.tools.ingest --workers 8                    # re-embed the current corpus
+    python -m app.tools.ingest --no-index                     # write the embedding artifact only
+    python -m app.tools.ingest --duplicates-report dups.jsonl # list the near duplicates removed
+
+Embedding runs on a pool of worker processes, each loading the model once.
+Finished batches are checkpointed, so rerunning after an interruption only
+embeds what the previous run had not reached.
+"""
+
+import argparse
+import functools
+import hashlib
+import json
+import logging
+import os
+import shutil
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.core.settings import settings
+from app.services.corpus import CORPUS_PATH, PAYLOAD_FIELDS, content_hash, count_corpus_records, iter_chunks
+from app.services.embedding_store import _discard, _temp_path, file_sha256, load_corpus_embeddings
+from app.services.embeddings import EmbeddingModel, embedding_model
+from app.services.lexical_index import INDEXED_FIELDS, load_lexical_index
+from app.services.near_duplicates import NearDuplicateIndex
+from app.services.qdrant_client import QdrantRetrievalClient
+from app.services.retrieval import RETRIEVAL_BACKENDS
+
+logger = logging.getLogger(__name__)
+
+
+def validate_record(data: Any) -> Optional[str]:
+    """Why a parsed corpus line cannot be ingested, or None if it is valid."""
+    if not isinstance(data, dict):
+        return "not an object"
+    text = data.get('text_ar')
+    if not isinstance(text, str) or not text.strip():
+        return "missing text_ar"
+    for field in PAYLOAD_FIELDS:
+        if not isinstance(data.get(field, ''), str):
+            return f"{field} is not a string"
+    return None
+
+
+def iter_valid_records(paths: Sequence[Path], stats: Dict[str, Any]) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """
+    Stream ``(line, record)`` for valid records across files, one line at a time.
+
+    Rejected lines are counted in ``stats['invalid']`` by reason.
+    """
+    for path in paths:
+        with open(path, 'r', encoding='utf-8') as f:
+            for i, line in enumerate(f):
+                line = line.strip()
+                if not line:
+                    continue
+                stats['read'] += 1
+                try:
+                    data = json.loads(line)
+                except json.JSONDecodeError:
+                    stats['invalid']['malformed json'] += 1
+                    continue
+                reason = validate_record(data)
+                if reason is not None:
+                    logger.debug(f"{path}:{i + 1}: {reason}")
+                    stats['invalid'][reason] += 1
+                    continue
+                yield line, data
+
+
+# Removed near duplicates quoted in the ingest report (all of them go to the report file)
+NEAR_DUPLICATE_EXAMPLES = 5
+
+
+def merge_corpora(
+    inputs: Sequence[Path],
+    output: Path,
+    near_duplicate_threshold: float = 0.0,
+    duplicates_report: Optional[Path] = None
+) -> Dict[str, Any]:
+    """
+    Write the valid, distinct records of ``inputs`` to ``output``.
+
+    Duplicates are records with the same content hash; the first occurrence
+    wins. With ``near_duplicate_threshold`` above 0, records whose text,
+    metaphor and lesson are estimated at least that similar (Jaccard over
+    character 5-grams) to an earlier record are dropped as well, and each
+    removal is written to ``duplicates_report`` as a JSON line.
+
+    Lines are copied verbatim, so re-merging a clean corpus leaves the file
+    (and its embedding artifact key) unchanged.
+    """
+    stats: Dict[str, Any] = {"inputs": [str(p) for p in inputs], "read": 0, "invalid": Counter()}
+    seen = set()
+    written = 0
+    near = NearDuplicateIndex(threshold=near_duplicate_threshold) if near_duplicate_threshold > 0 else None
+    near_removed = 0
+    examples: List[Dict[str, Any]] = []
+    report_file = None
+    if near is not None and duplicates_report is not None:
+        duplicates_report.parent.mkdir(parents=True, exist_ok=True)
+        report_file = open(duplicates_report, 'w', encoding='utf-8')
+    output.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = output.with_suffix(output.suffix + ".tmp")
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as out:
+            for line, data in iter_valid_records(inputs, stats):
+                record_hash = content_hash(data)
+                if record_hash in seen:
+                    continue
+                seen.add(record_hash)
+                if near is not None:
+                    text = ' '.join(data.get(field, '') for field in INDEXED_FIELDS)
+                    match = near.add((written, data['text_ar']), text)
+                    if match is not None:
+                        (canonical_row, canonical_text), similarity = match
+                        entry = {
+                            "text_ar": data['text_ar'],
+                            "duplicate_of": canonical_text,
+                            "canonical_row": canonical_row,
+                            "similarity": round(similarity, 3)
+                        }
+                        near_removed += 1
+                        if len(examples) < NEAR_DUPLICATE_EXAMPLES:
+                            examples.append(entry)
+                        if report_file is not None:
+                            report_file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+                        continue
+                out.write(line + "\n")
+                written += 1
+    finally:
+        if report_file is not None:
+            report_file.close()
+
+    if output.exists() and file_sha256(tmp_path) == file_sha256(output):
+        os.remove(tmp_path)
+        changed = False
+    else:
+        os.replace(tmp_path, output)
+        changed = True
+    report = {
+        **stats,
+        "invalid": dict(stats['invalid']),
+        "duplicates": stats['read'] - sum(stats['invalid'].values()) - near_removed - written,
+        "written": written,
+        "changed": changed
+    }
+    if near is not None:
+        report["near_duplicates"] = {
+            **near.get_stats(),
+            "removed": near_removed,
+            "examples": examples,
+            "report": str(duplicates_report) if duplicates_report else None
+        }
+    return report
+
+
+# Per-process model, set by _init_worker in each pool worker
+_worker_model = None
+
+
+def _init_worker(factory: Callable):
+    global _worker_model
+    _worker_model = factory()
+
+
+def _describe_worker() -> Tuple[bool, str, int]:
+    ready = _worker_model.load()
+    return ready, getattr(_worker_model, 'model_name', type(_worker_model).__name__), int(_worker_model.dim)
+
+
+def _encode(texts: List[str], batch_size: int) -> np.ndarray:
+    return np.asarray(_worker_model.encode_batch(texts, batch_size=batch_size), dtype=np.float32)
+
+
+def text_key(text: str) -> str:
+    """Checkpoint key of a text; vectors depend on ``text_ar`` alone."""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+class ProcessPoolEmbedder:
+    """
+    Embedder spreading ``encode_batch`` over worker processes.
+
+    Every worker builds its own model with ``factory`` and encodes whole
+    batches of ``batch_size`` texts, so the model is loaded once per process
+    and batches run in parallel. With ``workers=1`` the model runs in this
+    process. With a ``checkpoint`` directory each finished batch is saved
+    keyed by text hash, tagged with the model name, and reused by the next
+    run of the same model.
+    """
+
+    def __init__(self, factory: Callable, workers: int = 1, checkpoint: Optional[Path] = None):
+        """Describe the pool; nothing starts until ``load()``."""
+        self.factory = factory
+        self.workers = max(1, workers)
+        self.checkpoint = Path(checkpoint) if checkpoint else None
+        self.model_name: Optional[str] = None
+        self.dim: Optional[int] = None
+        self.encoded = 0
+        self.resumed = 0
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._ready = False
+        self._resume: Dict[str, np.ndarray] = {}
+        self._batches_saved = 0
+
+    @property
+    def is_available(self) -> bool:
+        return self.load()
+
+    def load(self) -> bool:
+        """Start the workers and load the model; returns whether it is ready."""
+        if self._ready:
+            return True
+        if self.workers > 1:
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers, initializer=_init_worker, initargs=(self.factory,)
+            )
+            ready, self.model_name, self.dim = self._pool.submit(_describe_worker).result()
+        else:
+            _init_worker(self.factory)
+            ready, self.model_name, self.dim = _describe_worker()
+        if ready:
+            self._load_checkpoint()
+        self._ready = ready
+        return ready
+
+    def _load_checkpoint(self):
+        if self.checkpoint is None or not self.checkpoint.exists():
+            return
+        for path in sorted(self.checkpoint.glob("*.npz")):
+            try:
+                with np.load(path) as data:
+                    # Vectors of another model (or an unversioned batch) cannot be mixed in
+                    if 'model' not in data.files or str(data['model']) != self.model_name:
+                        logger.info(f"Skipping checkpoint {path.name} from another embedding model")
+                        continue
+                    self._resume.update(zip(data['keys'].tolist(), data['vectors']))
+            except Exception as e:
+                logger.warning(f"Skipping unreadable checkpoint {path.name}: {e}")
+        self._batches_saved = len(list(self.checkpoint.glob("*.npz")))
+        if self._resume:
+            logger.info(f"Resuming ingest: {len(self._resume)} vectors from checkpoint")
+
+    def _save_batch(self, keys: List[str], vectors: np.ndarray):
+        if self.checkpoint is None:
+            return
+        self.checkpoint.mkdir(parents=True, exist_ok=True)
+        path = self.checkpoint / f"{self._batches_saved:08d}.npz"
+        tmp_path = _temp_path(path)
+        try:
+            with open(tmp_path, 'wb') as f:
+                np.savez(f, keys=np.array(keys), vectors=vectors, model=np.array(self.model_name))
+            os.replace(tmp_path, path)
+        except BaseException:
+            _discard(tmp_path)
+            raise
+        self._batches_saved += 1
+
+    def encode_batch(self, texts: List[str], batch_size: int = 64) -> np.ndarray:
+        """Encode texts into a ``(len(texts), dim)`` float32 matrix."""
+        if not self.load():
+            raise RuntimeError("Embedding model not available")
+        keys = [text_key(text) for text in texts]
+        vectors: Dict[str, np.ndarray] = {}
+        pending: Dict[str, str] = {}
+        for key, text in zip(keys, texts):
+            if key in self._resume:
+                vectors[key] = self._resume.pop(key)
+                self.resumed += 1
+            elif key not in vectors:
+                pending[key] = text
+
+        batches = list(iter_chunks(list(pending.items()), batch_size))
+        jobs = [[text for _, text in batch] for batch in batches]
+        if self._pool is not None:
+            results = self._pool.map(_encode, jobs, [batch_size] * len(jobs))
+        else:
+            results = (_encode(job, batch_size) for job in jobs)
+        # Results arrive in order; checkpoint each batch as soon as it is done
+        for batch, encoded in zip(batches, results):
+            batch_keys = [key for key, _ in batch]
+            self._save_batch(batch_keys, encoded)
+            vectors.update(zip(batch_keys, encoded))
+            self.encoded += len(batch)
+
+        matrix = np.empty((len(texts), self.dim), dtype=np.float32)
+        for row, key in enumerate(keys):
+            matrix[row] = vectors[key]
+        return matrix
+
+    def encode(self, text: str) -> np.ndarray:
+        """Encode a single text into a float32 vector."""
+        return self.encode_batch([text], batch_size=1)[0]
+
+    def clear_checkpoint(self):
+        """Forget checkpointed batches once their vectors are safely in the artifact."""
+        self._resume.clear()
+        if self.checkpoint is not None:
+            shutil.rmtree(self.checkpoint, ignore_errors=True)
+        self._batches_saved = 0
+
+    def close(self):
+        """Stop the worker processes."""
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+        self._ready = False
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {"workers": self.workers, "encoded": self.encoded, "resumed": self.resumed}
+
+
+def resolve_backend(backend: str, corpus_path: Path) -> str:
+    """The concrete backend ``auto`` selects for this corpus (as ``RetrievalService`` does)."""
+    if backend != "auto":
+        return backend
+    return "local" if count_corpus_records(corpus_path) <= settings.local_index_max_points else "qdrant"
+
+
+def ingest(
+    inputs: Sequence[Path],
+    output: Path = CORPUS_PATH,
+    embedder_factory: Callable = None,
+    workers: int = 1,
+    chunk_size: int = 512,
+    batch_size: int = 64,
+    backend: str = "auto",
+    url: Optional[str] = None,
+    index: bool = True,
+    resume: bool = True,
+    near_duplicate_threshold: float = 0.0,
+    duplicates_report: Optional[Path] = None
+) -> Dict[str, Any]:
+    """
+    Merge ``inputs`` into the corpus at ``output``, embed it into the artifact and index it.
+
+    Records already in ``output`` are kept ahead of the new ones.
+
+    Returns a report with per-stage statistics and overall records/second.
+    Raises ``RuntimeError`` when the model or the backend is unavailable.
+    """
+    if not settings.embeddings_cache_dir:
+        raise RuntimeError("EMBEDDINGS_CACHE_DIR is empty; ingest needs the embedding artifact")
+    started = time.perf_counter()
+    cache_dir = Path(settings.embeddings_cache_dir)
+    report: Dict[str, Any] = {"corpus": str(output)}
+
+    # The existing corpus goes first, so its records win duplicate and near-duplicate ties
+    sources = ([output] if output.exists() else []) + [Path(p) for p in inputs if Path(p) != output]
+    report["merge"] = merge_corpora(
+        sources or [output], output,
+        near_duplicate_threshold=near_duplicate_threshold,
+        duplicates_report=duplicates_report
+    )
+    logger.info(
+        f"Merged {report['merge']['written']} records "
+        f"({report['merge']['duplicates']} duplicates, {sum(report['merge']['invalid'].values())} invalid)"
+    )
+
+    factory = embedder_factory or functools.partial(EmbeddingModel, embedding_model.model_name)
+    checkpoint = cache_dir / "ingest-checkpoint"
+    embedder = ProcessPoolEmbedder(factory, workers=workers, checkpoint=checkpoint)
+    if not resume:
+        embedder.clear_checkpoint()
+    try:
+        if not embedder.load():
+            raise RuntimeError("Embedding model not available")
+        _, _, embed_report = load_corpus_embeddings(
+            embedder, output, cache_dir, chunk_size=chunk_size, batch_size=batch_size
+        )
+        report["embed"] = {**embed_report, **embedder.get_stats()}
+
+        if index:
+            target = resolve_backend(backend, output)
+            if target == "qdrant":
+                client = QdrantRetrievalClient(embedder=embedder, url=url, sync_on_start=False)
+                if not client.is_available:
+                    raise RuntimeError(f"Qdrant not reachable at {client.url}")
+                try:
+                    report["index"] = {"backend": target, **client.sync_corpus(output)}
+                finally:
+                    client.close()
+            else:
+                # The local index memory-maps the artifact at startup; only the
+                # lexical index needs refreshing
+                lexical = load_lexical_index(output, cache_dir / "bm25.json")
+                report["index"] = {"backend": target, "artifact": embed_report["key"], "lexical_documents": len(lexical)}
+        embedder.clear_checkpoint()
+    finally:
+        embedder.close()
+
+    seconds = time.perf_counter() - started
+    records = report["merge"]["written"]
+    report.update({
+        "records": records,
+        "seconds": round(seconds, 3),
+        "records_per_sec": round(records / seconds, 1) if seconds > 0 else 0.0
+    })
+    return report
+
+
+def main(argv=None) -> int:
+    """Run the ingest and print its report as JSON."""
+    parser = argparse.ArgumentParser(description="Merge, embed and index corpus JSONL files.")
+    parser.add_argument("inputs", nargs="*", type=Path, help="JSONL files to merge (default: the corpus itself)")
+    parser.add_argument("--output", type=Path, default=CORPUS_PATH, help="corpus JSONL file to write")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="embedding processes")
+    parser.add_argument("--batch-size", type=int, default=settings.ingest_batch_size, help="texts per worker batch")
+    parser.add_argument("--chunk-size", type=int, default=settings.ingest_chunk_size, help="records held in memory")
+    parser.add_argument("--backend", choices=RETRIEVAL_BACKENDS, default=settings.retrieval_backend)
+    parser.add_argument("--url", default=None, help="Qdrant URL (default: QDRANT_URL)")
+    parser.add_argument("--no-index", action="store_true", help="only write the embedding artifact")
+    parser.add_argument("--no-resume", action="store_true", help="discard checkpoints of an interrupted run")
+    parser.add_argument(
+        "--near-duplicates", type=float, default=settings.ingest_near_duplicate_threshold, metavar="THRESHOLD",
+        help="drop records at least this similar to an earlier one (0 disables)"
+    )
+    parser.add_argument("--duplicates-report", type=Path, default=None, help="JSONL file listing removed near duplicates")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    missing = [str(p) for p in (args.inputs or [args.output]) if not p.exists()]
+    if missing:
+        print(f"Input file not found: {', '.join(missing)}", file=sys.stderr)
+        return 1
+    try:
+        report = ingest(
+            args.inputs,
+            output=args.output,
+            workers=args.workers,
+            chunk_size=args.chunk_size,
+            batch_size=args.batch_size,
+            backend=args.backend,
+            url=args.url,
+            index=not args.no_index,
+            resume=not args.no_resume,
+            near_duplicate_threshold=args.near_duplicates,
+            duplicates_report=args.duplicates_report
+        )
+    except RuntimeError as e:
+        print(str(e), file=sys.stderr)
+        return 1
+
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
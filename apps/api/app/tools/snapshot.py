@@ -0,0 +1,71 @@
+"""
+Export or restore a corpus snapshot (vectors, payloads and corpus version in one file).
+
+    python -m app.tools.snapshot export snapshots/corpus.npz                  # from Qdrant
+    python -m app.tools.snapshot export snapshots/corpus.npz --backend local  # from the in-process index
+    python -m app.tools.snapshot restore snapshots/corpus.npz                 # bulk-load into Qdrant
+
+Set SNAPSHOT_PATH to restore automatically when a node starts cold.
+"""
+
+import argparse
+import json
+import logging
+import sys
+from pathlib import Path
+
+from app.services.corpus import CORPUS_PATH
+from app.services.embeddings import embedding_model
+from app.services.qdrant_client import QdrantRetrievalClient
+from app.services.vector_index import LocalVectorIndex
+
+
+def main(argv=None) -> int:
+    """Run the export or restore and print its report as JSON."""
+    parser = argparse.ArgumentParser(description="Export or restore a corpus snapshot.")
+    parser.add_argument("action", choices=("export", "restore"))
+    parser.add_argument("path", type=Path, help="snapshot file")
+    parser.add_argument("--backend", choices=("qdrant", "local"), default="qdrant")
+    parser.add_argument("--corpus", type=Path, default=CORPUS_PATH, help="corpus JSONL file")
+    parser.add_argument("--url", default=None, help="Qdrant URL (default: QDRANT_URL)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    if args.action == "restore" and args.backend == "local":
+        print("The local index restores from SNAPSHOT_PATH when it loads; nothing to do offline", file=sys.stderr)
+        return 1
+    if not args.corpus.exists():
+        print(f"Corpus file not found: {args.corpus}", file=sys.stderr)
+        return 1
+    if not embedding_model.load():
+        print("Embedding model not available", file=sys.stderr)
+        return 1
+
+    try:
+        if args.backend == "local":
+            index = LocalVectorIndex()
+            index.load_corpus(args.corpus, snapshot_path="")
+            report = index.export_snapshot(args.path)
+        else:
+            client = QdrantRetrievalClient(url=args.url, sync_on_start=False)
+            if not client.is_available:
+                print(f"Qdrant not reachable at {client.url}", file=sys.stderr)
+                return 1
+            try:
+                if args.action == "export":
+                    report = client.export_snapshot(args.path)
+                else:
+                    report = client.restore_snapshot(args.path, args.corpus)
+            finally:
+                client.close()
+    except RuntimeError as e:
+        print(str(e), file=sys.stderr)
+        return 1
+
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,63 @@
+"""
+Synchronize the retrieval index with the corpus file.
+
+    python -m app.tools.sync_corpus                 # sync the Qdrant collection
+    python -m app.tools.sync_corpus --dry-run       # show what would change
+    python -m app.tools.sync_corpus --artifact      # refresh the embedding artifact only
+"""
+
+import argparse
+import json
+import logging
+import sys
+from pathlib import Path
+
+from app.core.settings import settings
+from app.services.corpus import CORPUS_PATH
+from app.services.embedding_store import load_corpus_embeddings
+from app.services.embeddings import embedding_model
+from app.services.qdrant_client import QdrantRetrievalClient
+
+
+def main(argv=None) -> int:
+    """Run the sync and print its report as JSON."""
+    parser = argparse.ArgumentParser(description="Synchronize the retrieval index with the corpus file.")
+    parser.add_argument("--corpus", type=Path, default=CORPUS_PATH, help="corpus JSONL file")
+    parser.add_argument("--url", default=None, help="Qdrant URL (default: QDRANT_URL)")
+    parser.add_argument("--dry-run", action="store_true", help="report changes without writing")
+    parser.add_argument("--artifact", action="store_true", help="only refresh the embedding artifact")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    if not args.corpus.exists():
+        print(f"Corpus file not found: {args.corpus}", file=sys.stderr)
+        return 1
+    if not embedding_model.load():
+        print("Embedding model not available", file=sys.stderr)
+        return 1
+
+    if args.artifact:
+        if not settings.embeddings_cache_dir:
+            print("EMBEDDINGS_CACHE_DIR is empty; nothing to refresh", file=sys.stderr)
+            return 1
+        _, _, report = load_corpus_embeddings(
+            embedding_model,
+            args.corpus,
+            Path(settings.embeddings_cache_dir),
+            chunk_size=settings.ingest_chunk_size,
+            batch_size=settings.ingest_batch_size
+        )
+    else:
+        client = QdrantRetrievalClient(url=args.url, sync_on_start=False)
+        if not client.is_available:
+            print(f"Qdrant not reachable at {client.url}", file=sys.stderr)
+            return 1
+        report = client.sync_corpus(args.corpus, dry_run=args.dry_run)
+
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,93 @@
+"""
+Recall@k and memory of the quantized local index versus exact float32.
+
+The float32 rows are written to a temporary .npy and memory-mapped, as the
+embedding artifact is in production, so quantized modes only keep their
+codes resident. Vectors are synthetic: clustered, normalized, 384-dim.
+
+    python benchmarks/quantization_recall.py --points 100000 --queries 200 --k 3
+"""
+
+import argparse
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.services.embeddings import EMBEDDING_DIM, normalize_rows  # noqa: E402
+from app.services.vector_index import LocalVectorIndex  # noqa: E402
+
+
+class _NoEmbedder:
+    dim = EMBEDDING_DIM
+    is_available = True
+
+
+def _clustered_vectors(rng, n, clusters=256, spread=0.35):
+    centers = rng.standard_normal((clusters, EMBEDDING_DIM), dtype=np.float32)
+    assignment = rng.integers(0, clusters, size=n)
+    vectors = centers[assignment] + spread * rng.standard_normal((n, EMBEDDING_DIM), dtype=np.float32)
+    return normalize_rows(vectors)
+
+
+def _index(vectors, payloads, quantization, rescore_factor):
+    index = LocalVectorIndex(embedder=_NoEmbedder(), quantization=quantization, rescore_factor=rescore_factor)
+    index._set_rows(vectors, payloads)
+    return index
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--points", type=int, default=100000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--rescore-factors", type=int, nargs="+", default=[4, 8, 16])
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    vectors = _clustered_vectors(rng, args.points)
+    # Queries are perturbed corpus rows, like a check-in close to a fragment
+    picks = rng.integers(0, args.points, size=args.queries)
+    queries = normalize_rows(vectors[picks] + 0.05 * rng.standard_normal((args.queries, EMBEDDING_DIM), dtype=np.float32))
+    payloads = [{} for _ in range(args.points)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "vectors.npy"
+        np.save(path, vectors)
+        mapped = np.load(path, mmap_mode='r')
+
+        exact = _index(vectors, payloads, "none", 1)
+        truth = [{row for row, _ in exact.search(q, args.k)} for q in queries]
+
+        configs = [("float32 (in RAM)", exact)]
+        for quantization in ("int8", "binary"):
+            for factor in args.rescore_factors:
+                configs.append((f"{quantization} x{factor}", _index(mapped, payloads, quantization, factor)))
+
+        print(f"{args.points} points, {args.queries} queries, k={args.k}")
+        print(f"{'mode':<18}{'recall@k':>10}{'p50 ms':>10}{'MB resident':>13}{'MB per 1M':>11}")
+        for name, index in configs:
+            hits = 0
+            samples = []
+            for q, expected in zip(queries, truth):
+                started = time.perf_counter()
+                found = index.search(q, args.k)
+                samples.append((time.perf_counter() - started) * 1000)
+                hits += len(expected & {row for row, _ in found})
+            recall = hits / (len(truth) * args.k)
+            resident = index.resident_bytes
+            per_million = resident / args.points * 1_000_000
+            print(
+                f"{name:<18}{recall:>10.3f}{statistics.median(samples):>10.3f}"
+                f"{resident / 2**20:>13.1f}{per_million / 2**20:>11.1f}"
+            )
+        del mapped
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Per-query latency of the in-process NumPy index versus Qdrant.
+
+Uses synthetic normalized vectors so no embedding model is needed. Qdrant is
+benchmarked against ``QDRANT_URL`` when reachable, otherwise against the
+client's in-memory mode.
+
+    python benchmarks/retrieval_latency.py --points 1000 10000 --queries 200
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.services.embeddings import EMBEDDING_DIM, normalize_rows  # noqa: E402
+from app.services.vector_index import LocalVectorIndex  # noqa: E402
+
+
+class _NoEmbedder:
+    dim = EMBEDDING_DIM
+    is_available = True
+
+
+def _percentiles(samples_ms):
+    ordered = sorted(samples_ms)
+    return {
+        "p50": statistics.median(ordered),
+        "p95": ordered[int(0.95 * (len(ordered) - 1))],
+        "mean": statistics.fmean(ordered)
+    }
+
+
+def _time_queries(search, queries):
+    samples = []
+    for query in queries:
+        started = time.perf_counter()
+        search(query)
+        samples.append((time.perf_counter() - started) * 1000)
+    return _percentiles(samples)
+
+
+def bench_local(vectors, queries, k):
+    index = LocalVectorIndex(embedder=_NoEmbedder())
+    index.build(vectors, [{} for _ in range(len(vectors))])
+    return _time_queries(lambda q: index.search(q, k), queries)
+
+
+def _qdrant_client():
+    from qdrant_client import QdrantClient
+
+    url = os.getenv("QDRANT_URL", "http://localhost:6333")
+    try:
+        client = QdrantClient(url=url, timeout=2, check_compatibility=False)
+        client.get_collections()
+        return client, url
+    except Exception:
+        return QdrantClient(":memory:"), ":memory:"
+
+
+def bench_qdrant(vectors, queries, k):
+    from qdrant_client.models import Distance, PointStruct, VectorParams
+
+    client, location = _qdrant_client()
+    collection = "retrieval_latency_bench"
+    if client.collection_exists(collection):
+        client.delete_collection(collection)
+    client.create_collection(
+        collection_name=collection,
+        vectors_config=VectorParams(size=vectors.shape[1], distance=Distance.COSINE)
+    )
+    for start in range(0, len(vectors), 1000):
+        client.upsert(
+            collection_name=collection,
+            points=[
+                PointStruct(id=start + i, vector=v.tolist(), payload={})
+                for i, v in enumerate(vectors[start:start + 1000])
+            ]
+        )
+    try:
+        stats = _time_queries(
+            lambda q: client.query_points(collection_name=collection, query=q.tolist(), limit=k),
+            queries
+        )
+    finally:
+        client.delete_collection(collection)
+    return stats, location
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--points", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--skip-qdrant", action="store_true")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'backend':<22}{'points':>8}{'p50 ms':>10}{'p95 ms':>10}{'mean ms':>10}")
+    for n in args.points:
+        vectors = normalize_rows(rng.standard_normal((n, EMBEDDING_DIM), dtype=np.float32))
+        queries = normalize_rows(rng.standard_normal((args.queries, EMBEDDING_DIM), dtype=np.float32))
+
+        results = [("local", bench_local(vectors, queries, args.k))]
+        if not args.skip_qdrant:
+            try:
+                stats, location = bench_qdrant(vectors, queries, args.k)
+                results.append((f"qdrant {location}", stats))
+            except ImportError:
+                print("qdrant-client not installed; skipping Qdrant")
+        for name, stats in results:
+            print(f"{name[:21]:<22}{n:>8}{stats['p50']:>10.3f}{stats['p95']:>10.3f}{stats['mean']:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""Tests for hot-reloadable assets."""
+
+import json
+import os
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.services.asset_registry import AssetRegistry
+
+client = TestClient(app)
+
+
+def _build(raw):
+    """Parse JSON asset bytes, defaulting to an empty word list."""
+    if raw is None:
+        return {"words": []}
+    return json.loads(raw.decode("utf-8"))
+
+
+def _write(path, data, mtime):
+    path.write_text(json.dumps(data), encoding="utf-8")
+    os.utime(path, (mtime, mtime))
+
+
+def test_reload_swaps_snapshot(tmp_path):
+    """A changed file produces a new version while old snapshots stay intact."""
+    path = tmp_path / "lexicon.json"
+    _write(path, {"words": ["فرح"]}, 1000)
+
+    registry = AssetRegistry(poll_interval=0)
+    first = registry.register("lexicon", path, _build)
+    assert first.version == 1
+
+    _write(path, {"words": ["فرح", "حزن"]}, 2000)
+    assert registry.reload_changed() == {"lexicon": 2}
+
+    current = registry.get("lexicon")
+    assert current.value["words"] == ["فرح", "حزن"]
+    assert first.value["words"] == ["فرح"]
+    assert registry.get_stats()["lexicon"]["reload_count"] == 1
+
+
+def test_reload_skips_unchanged_content(tmp_path):
+    """Touching a file without changing it does not bump the version."""
+    path = tmp_path / "lexicon.json"
+    _write(path, {"words": ["فرح"]}, 1000)
+
+    registry = AssetRegistry(poll_interval=0)
+    registry.register("lexicon", path, _build)
+    _write(path, {"words": ["فرح"]}, 2000)
+
+    assert registry.reload_changed() == {}
+    assert registry.get("lexicon").version == 1
+
+
+def test_reload_keeps_previous_snapshot_on_error(tmp_path):
+    """Invalid content is reported and the last good snapshot keeps serving."""
+    path = tmp_path / "lexicon.json"
+    _write(path, {"words": ["فرح"]}, 1000)
+
+    registry = AssetRegistry(poll_interval=0)
+    registry.register("lexicon", path, _build)
+    path.write_text("{not json", encoding="utf-8")
+    os.utime(path, (2000, 2000))
+
+    assert registry.reload_changed() == {}
+    assert registry.get("lexicon").value["words"] == ["فرح"]
+    assert registry.get_stats()["lexicon"]["error_count"] == 1
+
+
+def test_missing_asset_uses_fallback(tmp_path):
+    """Missing files build from the fallback and are picked up once created."""
+    path = tmp_path / "missing.json"
+    registry = AssetRegistry(poll_interval=0)
+
+    assert registry.register("lexicon", path, _build).value == {"words": []}
+
+    _write(path, {"words": ["خوف"]}, 1000)
+    registry.reload_changed()
+    assert registry.get("lexicon").value["words"] == ["خوف"]
+
+
+def test_runtime_metrics_reports_asset_versions():
+    """Asset versions are exposed through the runtime metrics endpoint."""
+    response = client.get("/api/v1/metrics/runtime")
+
+    assert response.status_code == 200
+    assets = response.json()["assets"]
+    assert "plutchik" in assets
+    assert "prompts" in assets
+    assert assets["plutchik"]["version"] >= 1
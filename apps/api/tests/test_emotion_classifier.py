@@ -0,0 +1,59 @@
+"""Tests for the Plutchik emotion lexicon and classifier."""
+
+from app.services.emotion_classifier import emotion_classifier
+from app.services.emotion_lexicon import EmotionLexicon
+
+
+def test_classify_with_clitic_prefixes():
+    """Keywords attached to "بال" / "و" prefixes are matched."""
+    result = emotion_classifier.classify_emotion("أشعر بالغضب والانفعال")
+
+    assert result["primary"] == "anger"
+    assert "غضب" in result["keywords"]
+    assert "انفعال" in result["keywords"]
+
+
+def test_classify_returns_full_distribution():
+    """Every emotion appears in the distribution and scores sum to one."""
+    result = emotion_classifier.classify_emotion("أشعر بالفرح لكن عندي قلق")
+    distribution = result["distribution"]
+
+    assert set(distribution) == set(emotion_classifier.lexicon.emotion_ids)
+    assert distribution["joy"]["score"] > 0
+    assert distribution["fear"]["score"] > 0
+    assert abs(sum(slot["score"] for slot in distribution.values()) - 1.0) < 1e-9
+
+
+def test_classify_ignores_substrings_inside_words():
+    """"ألم" must not match inside "العالم"."""
+    result = emotion_classifier.classify_emotion("العالم جميل")
+
+    assert result["primary"] == "neutral"
+    assert result["keywords"] == []
+
+
+def test_classify_prefers_longest_match():
+    """Multi-word lexemes win over their single-word prefix."""
+    result = emotion_classifier.classify_emotion("غضب شديد")
+
+    assert result["keywords"] == ["غضب شديد"]
+    assert result["intensity"] == 3
+
+
+def test_classify_empty_text():
+    """Empty input is neutral."""
+    result = emotion_classifier.classify_emotion("   ")
+
+    assert result["primary"] == "neutral"
+    assert result["confidence"] == 0.0
+
+
+def test_lexicon_lookup_and_construct_form():
+    """Emotion lookup is keyed by id and teh marbuta takes possessive suffixes."""
+    lexicon = EmotionLexicon([
+        {"id": "joy", "name_ar": "فرح", "synonyms_ar": ["سعادة"]}
+    ])
+
+    assert lexicon.get_emotion("joy")["name_ar"] == "فرح"
+    assert lexicon.get_emotion("missing") is None
+    assert [hit["keyword"] for hit in lexicon.scan("سعادتي كبيرة")] == ["سعادة"]
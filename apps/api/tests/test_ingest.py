@@ -0,0 +1,164 @@
+"""Tests for the offline ingest tool."""
+
+import json
+
+import numpy as np
+import pytest
+
+from app.core.settings import settings
+from app.services.embedding_store import EmbeddingArtifact
+from app.tools import ingest as ingest_tool
+from app.tools.ingest import ProcessPoolEmbedder, ingest, merge_corpora
+
+
+class FakeEmbedder:
+    """Deterministic embedder: a text's vector is seeded by its characters."""
+
+    model_name = "fake-model"
+    dim = 16
+
+    def load(self):
+        return True
+
+    def encode_batch(self, texts, batch_size=64):
+        vectors = np.stack([
+            np.random.default_rng(sum(map(ord, text))).standard_normal(self.dim) for text in texts
+        ]).astype(np.float32)
+        return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+class FailingEmbedder(FakeEmbedder):
+    """Dies on the text "crash", like an ingest interrupted midway."""
+
+    def encode_batch(self, texts, batch_size=64):
+        if "crash" in texts:
+            raise RuntimeError("interrupted")
+        return super().encode_batch(texts, batch_size)
+
+
+@pytest.fixture(autouse=True)
+def embeddings_cache(tmp_path, monkeypatch):
+    """Keep embedding artifacts out of the working directory."""
+    directory = tmp_path / "embeddings_cache"
+    monkeypatch.setattr(settings, "embeddings_cache_dir", str(directory))
+    return directory
+
+
+def _write_lines(path, lines):
+    path.write_text("".join(line + "\n" for line in lines), encoding='utf-8')
+
+
+def _record(text, **fields):
+    return json.dumps({"text_ar": text, "emotion": "joy", **fields}, ensure_ascii=False)
+
+
+def test_merge_validates_and_deduplicates(tmp_path):
+    """Invalid lines are counted by reason and duplicates across files are dropped."""
+    first = tmp_path / "a.jsonl"
+    second = tmp_path / "b.jsonl"
+    output = tmp_path / "corpus.jsonl"
+    _write_lines(first, [_record("الشمس تشرق"), "{broken", json.dumps({"emotion": "joy"}), ""])
+    _write_lines(second, [_record("الشمس تشرق"), _record("المطر يهطل"), _record("نص", lesson=3)])
+
+    report = merge_corpora([first, second], output)
+    assert report["read"] == 6
+    assert report["written"] == 2
+    assert report["duplicates"] == 1
+    assert report["invalid"] == {"malformed json": 1, "missing text_ar": 1, "lesson is not a string": 1}
+    assert [json.loads(line)["text_ar"] for line in output.read_text(encoding='utf-8').splitlines()] == [
+        "الشمس تشرق", "المطر يهطل"
+    ]
+
+    # A clean corpus merged onto itself is left byte-for-byte unchanged
+    assert merge_corpora([output], output)["changed"] is False
+
+
+def test_ingest_embeds_with_worker_processes(tmp_path, embeddings_cache):
+    """Worker processes produce the same artifact as in-process encoding."""
+    source = tmp_path / "new.jsonl"
+    output = tmp_path / "corpus.jsonl"
+    _write_lines(source, [_record(f"نص رقم {i}") for i in range(40)])
+
+    report = ingest(
+        [source], output=output, embedder_factory=FakeEmbedder,
+        workers=2, chunk_size=16, batch_size=4, backend="local"
+    )
+    assert report["records"] == 40
+    assert report["records_per_sec"] > 0
+    assert report["embed"]["artifact"] == "built"
+    assert report["embed"]["encoded"] == 40
+    assert report["index"]["lexical_documents"] == 40
+
+    vectors, payloads = EmbeddingArtifact(embeddings_cache, output, "fake-model").load()
+    expected = FakeEmbedder().encode_batch([p["text_ar"] for p in payloads])
+    np.testing.assert_allclose(vectors, expected, rtol=1e-5, atol=1e-6)
+    assert not (embeddings_cache / "ingest-checkpoint").exists()
+
+
+def test_interrupted_ingest_resumes_from_checkpoint(tmp_path, embeddings_cache):
+    """Batches finished before a failure are not embedded again."""
+    source = tmp_path / "new.jsonl"
+    output = tmp_path / "corpus.jsonl"
+    _write_lines(source, [_record(f"نص {i}") for i in range(8)] + [_record("crash")])
+
+    with pytest.raises(RuntimeError):
+        ingest([source], output=output, embedder_factory=FailingEmbedder, chunk_size=4, batch_size=2, index=False)
+    assert len(list((embeddings_cache / "ingest-checkpoint").glob("*.npz"))) == 4
+
+    report = ingest([source], output=output, embedder_factory=FakeEmbedder, chunk_size=4, batch_size=2, index=False)
+    assert report["embed"]["resumed"] == 8
+    assert report["embed"]["encoded"] == 1
+    assert not (embeddings_cache / "ingest-checkpoint").exists()
+
+
+def test_checkpoint_from_another_model_is_not_resumed(tmp_path, embeddings_cache):
+    """Vectors checkpointed by a different embedding model are embedded again."""
+    source = tmp_path / "new.jsonl"
+    output = tmp_path / "corpus.jsonl"
+    _write_lines(source, [_record(f"نص {i}") for i in range(8)] + [_record("crash")])
+
+    with pytest.raises(RuntimeError):
+        ingest([source], output=output, embedder_factory=FailingEmbedder, chunk_size=4, batch_size=2, index=False)
+
+    class OtherModel(FakeEmbedder):
+        model_name = "other-model"
+        dim = 8
+
+    report = ingest([source], output=output, embedder_factory=OtherModel, chunk_size=4, batch_size=2, index=False)
+    assert report["embed"]["resumed"] == 0
+    assert report["embed"]["encoded"] == 9
+
+
+def test_ingest_merges_into_an_existing_corpus(tmp_path, embeddings_cache):
+    """New records are added to the corpus; existing ones are kept and win duplicate ties."""
+    source = tmp_path / "new.jsonl"
+    output = tmp_path / "corpus.jsonl"
+    _write_lines(output, [_record("الشمس تشرق", lesson="الأمل"), _record("المطر يهطل")])
+    _write_lines(source, [_record("الشمس تشرق", lesson="الأمل"), _record("البحر هادئ")])
+
+    report = ingest([source], output=output, embedder_factory=FakeEmbedder, index=False)
+    assert report["merge"]["duplicates"] == 1
+    assert [json.loads(line)["text_ar"] for line in output.read_text(encoding='utf-8').splitlines()] == [
+        "الشمس تشرق", "المطر يهطل", "البحر هادئ"
+    ]
+
+
+def test_ingest_cli_reports_json(tmp_path, capsys, monkeypatch):
+    """The entry point prints the report and fails cleanly on missing input."""
+    source = tmp_path / "new.jsonl"
+    output = tmp_path / "corpus.jsonl"
+    _write_lines(source, [_record("الشمس تشرق")])
+    monkeypatch.setattr(ingest_tool, "EmbeddingModel", lambda name: FakeEmbedder())
+
+    assert ingest_tool.main([str(source), "--output", str(output), "--workers", "1", "--no-index"]) == 0
+    assert json.loads(capsys.readouterr().out)["records"] == 1
+    assert ingest_tool.main([str(tmp_path / "missing.jsonl")]) == 1
+
+
+def test_pool_embedder_deduplicates_texts_within_a_call():
+    """Repeated texts are encoded once."""
+    embedder = ProcessPoolEmbedder(FakeEmbedder)
+    vectors = embedder.encode_batch(["a", "b", "a"], batch_size=2)
+    assert embedder.encoded == 2
+    np.testing.assert_array_equal(vectors[0], vectors[2])
+    embedder.close()
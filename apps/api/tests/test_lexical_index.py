@@ -0,0 +1,137 @@
+"""Tests for the BM25 lexical index and the lexical and hybrid retrieval modes."""
+
+import hashlib
+import json
+
+import numpy as np
+import pytest
+
+from app.core.settings import settings
+from app.services import retrieval
+from app.services.lexical_index import BM25Index, LexicalRetriever, load_lexical_index
+from app.services.retrieval import RetrievalService
+from app.services.vector_index import LocalVectorIndex
+
+
+class FakeEmbedder:
+    """Deterministic bag-of-words embedder: each word hashes to one dimension."""
+
+    dim = 64
+    is_available = True
+
+    def __init__(self):
+        self.batches = []
+
+    def load(self):
+        return True
+
+    def encode_batch(self, texts, batch_size=64):
+        self.batches.append(len(texts))
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for word in text.split():
+                vectors[row, int(hashlib.md5(word.encode('utf-8')).hexdigest(), 16) % self.dim] += 1.0
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    def encode(self, text):
+        return self.encode_batch([text])[0]
+
+
+@pytest.fixture(autouse=True)
+def embeddings_cache(tmp_path, monkeypatch):
+    """Keep embedding artifacts out of the working directory."""
+    directory = tmp_path / "embeddings_cache"
+    monkeypatch.setattr(settings, "embeddings_cache_dir", str(directory))
+    return directory
+
+
+def _write_corpus(path, records):
+    with open(path, 'w', encoding='utf-8') as f:
+        for record in records:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+CORPUS = [
+    {"text_ar": "الشجرة تفقد أوراقها في الخريف", "emotion": "sadness", "lesson": "التغيير طبيعي"},
+    {"text_ar": "الشمس تشرق بعد المطر", "emotion": "joy", "lesson": "الأمل يعود"},
+    {"text_ar": "العاصفة تمر والسماء تصفو", "emotion": "fear", "lesson": "كل شيء يمر"},
+]
+
+
+def test_bm25_index_ranks_filters_and_updates_incrementally(tmp_path):
+    """BM25 matches normalized stems, honours filters and persists incremental syncs."""
+    corpus = tmp_path / "corpus.jsonl"
+    index_path = tmp_path / "bm25.json"
+    _write_corpus(corpus, CORPUS)
+
+    index = load_lexical_index(corpus, index_path)
+    assert len(index) == 3 and index_path.exists()
+    retriever = LexicalRetriever(index)
+    # "والشمس" reduces to the same stem as "الشمس"; stopwords add nothing
+    hits = retriever.retrieve_similar("والشمس في", k=3)
+    assert [hit["emotion"] for hit in hits] == ["joy"]
+    assert retriever.retrieve_similar("الشمس", k=3, emotion="fear") == []
+
+    _write_corpus(corpus, CORPUS[1:] + [{"text_ar": "البحر هادئ والشمس دافئة", "emotion": "calm", "lesson": "السكينة"}])
+    mtime = index_path.stat().st_mtime_ns
+    index = load_lexical_index(corpus, index_path)
+    assert len(index) == 3
+    assert index_path.stat().st_mtime_ns != mtime
+    assert {hit["emotion"] for hit in LexicalRetriever(index).retrieve_similar("الشمس", k=3)} == {"joy", "calm"}
+    assert LexicalRetriever(index).retrieve_similar("الخريف", k=3) == []
+
+    mtime = index_path.stat().st_mtime_ns
+    load_lexical_index(corpus, index_path)
+    assert index_path.stat().st_mtime_ns == mtime
+
+
+def test_concurrent_index_saves_do_not_share_temp_files(tmp_path):
+    """Workers saving the index together each use their own temp file."""
+    from concurrent.futures import ThreadPoolExecutor
+
+    corpus = tmp_path / "corpus.jsonl"
+    _write_corpus(corpus, CORPUS * 50)
+    index = load_lexical_index(corpus, tmp_path / "source.json")
+    directory = tmp_path / "cache"
+    index_path = directory / "bm25.json"
+
+    with ThreadPoolExecutor(4) as pool:
+        list(pool.map(lambda _: index.save(index_path), range(8)))
+
+    assert len(BM25Index.load(index_path)) == 3
+    assert [p.name for p in directory.iterdir()] == ["bm25.json"]
+
+
+def test_lexical_mode_needs_no_encoder(tmp_path, monkeypatch):
+    """Lexical mode never builds a vector backend."""
+    path = tmp_path / "corpus.jsonl"
+    _write_corpus(path, CORPUS)
+
+    def unexpected_dense():
+        raise AssertionError("Lexical mode should not load vectors")
+    monkeypatch.setattr(retrieval, "LocalVectorIndex", unexpected_dense)
+    monkeypatch.setattr(retrieval, "QdrantRetrievalClient", unexpected_dense)
+
+    service = RetrievalService(backend="auto", corpus_path=path, mode="lexical")
+    assert service.backend_name == "lexical"
+    assert service.retrieve_similar("العاصفة", k=1)[0]["emotion"] == "fear"
+
+
+def test_hybrid_mode_fuses_dense_and_lexical_ranks(tmp_path, monkeypatch):
+    """Fragments ranked well by both sides come first; either side alone still contributes."""
+    path = tmp_path / "corpus.jsonl"
+    _write_corpus(path, CORPUS)
+    monkeypatch.setattr(retrieval, "LocalVectorIndex", lambda: LocalVectorIndex(embedder=FakeEmbedder()))
+
+    service = RetrievalService(backend="local", corpus_path=path, mode="hybrid")
+    assert service.backend_name == "hybrid(local+lexical)"
+    hits = service.retrieve_similar("العاصفة تمر", k=3)
+    assert hits[0]["emotion"] == "fear"
+    assert hits[0]["score"] == pytest.approx(2 / (retrieval.RRF_K + 1))
+    assert service.retrieve_similar("العاصفة تمر", k=3, emotion="joy")[0]["emotion"] == "joy"
+
+    # Without an encoder the lexical ranking is used on its own
+    service.backend.dense.embedder.is_available = False
+    assert service.retrieve_similar("الشمس", k=1)[0]["emotion"] == "joy"
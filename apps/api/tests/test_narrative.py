@@ -159,3 +159,138 @@ def test_narrative_endpoint_emotion_keywords():
         assert data["metaphor"]
         assert data["scene"]
         assert len(data["questions_ar"]) == 3
+
+
+class SlowRetrievalClient:
+    """Retrieval stub that is slower than the narrative deadline."""
+
+    def retrieve_similar(self, text_ar, k=3, **filters):
+        import time
+        time.sleep(0.5)
+        return [{"lesson": "قبول التغيير", "metaphor": "شجرة في الخريف"}]
+
+
+def test_narrative_endpoint_retrieval_deadline(monkeypatch):
+    """Slow retrieval is dropped instead of delaying the response."""
+    import time
+
+    from app.core.settings import settings
+    from app.routers import narrative
+
+    monkeypatch.setattr(narrative, "retrieval_service", SlowRetrievalClient())
+    monkeypatch.setattr(settings, "narrative_retrieval_timeout", 0.05)
+    narrative.narrative_cache.clear()
+
+    # Keep one event loop alive so the abandoned retrieval thread is not
+    # joined when the request's loop shuts down
+    with TestClient(app) as live_client:
+        started = time.perf_counter()
+        response = live_client.post(
+            "/api/v1/narrative",
+            json={"text_ar": "أشعر بالحزن اليوم"}
+        )
+        elapsed = time.perf_counter() - started
+
+    assert response.status_code == 200
+    assert elapsed < 0.4
+    data = response.json()
+    assert len(data["questions_ar"]) == 3
+    assert not any(q.startswith("💡") for q in data["questions_ar"])
+
+
+
+class WarmingRetrievalClient:
+    """Retrieval stub that reports ``starting`` until ``ready`` is set."""
+
+    def __init__(self):
+        self.ready = False
+
+    @property
+    def state(self):
+        return "ready" if self.ready else "starting"
+
+    @property
+    def is_available(self):
+        return self.ready
+
+    def retrieve_similar(self, text_ar, k=3, **filters):
+        return [{"lesson": "قبول التغيير", "metaphor": "شجرة في الخريف"}]
+
+
+def test_narrative_not_cached_while_retrieval_warms_up(monkeypatch):
+    """A response served before retrieval is ready is not reused once it is."""
+    from app.routers import narrative
+
+    retrieval = WarmingRetrievalClient()
+    monkeypatch.setattr(narrative, "retrieval_service", retrieval)
+    narrative.narrative_cache.clear()
+    body = {"text_ar": "أشعر بالحزن اليوم", "seed": 11}
+
+    warming = client.post("/api/v1/narrative", json=body)
+    assert warming.headers["x-cache"] == "MISS"
+
+    retrieval.ready = True
+    ready = client.post("/api/v1/narrative", json=body)
+    assert ready.headers["x-cache"] == "MISS"
+    assert client.post("/api/v1/narrative", json=body).headers["x-cache"] == "HIT"
+
+
+def test_narrative_endpoint_includes_fast_insights(monkeypatch):
+    """Insights retrieved within the deadline take the last question slots."""
+    from app.core.settings import settings
+    from app.routers import narrative
+
+    retrieval = WarmingRetrievalClient()
+    retrieval.ready = True
+    monkeypatch.setattr(narrative, "retrieval_service", retrieval)
+    monkeypatch.setattr(settings, "narrative_retrieval_timeout", 1.0)
+    narrative.narrative_cache.clear()
+
+    response = client.post("/api/v1/narrative", json={"text_ar": "أشعر بالحزن اليوم", "seed": 3})
+
+    assert response.status_code == 200
+    questions = response.json()["questions_ar"]
+    assert len(questions) == 3
+    assert questions[1:] == ["💡 قبول التغيير", "🌱 شجرة في الخريف"]
+
+def test_narrative_endpoint_stage_timings():
+    """Per-request stage timings are reported in the Server-Timing header."""
+    response = client.post(
+        "/api/v1/narrative",
+        json={"text_ar": "أشعر بالحزن اليوم", "seed": 101}
+    )
+
+    assert response.status_code == 200
+    timing = response.headers["server-timing"]
+    for stage in ("classify", "clinical_check", "compose", "retrieval", "total"):
+        assert f"{stage};dur=" in timing
+
+
+def test_narrative_endpoint_response_cache():
+    """Identical bodies are served from the response cache."""
+    body = {"text_ar": "أشعر بالقلق من الامتحان", "seed": 7}
+
+    first = client.post("/api/v1/narrative", json=body)
+    second = client.post("/api/v1/narrative", json=body)
+
+    assert first.status_code == 200
+    assert first.headers["x-cache"] == "MISS"
+    assert second.headers["x-cache"] == "HIT"
+    assert first.json() == second.json()
+
+
+def test_narrative_questions_deterministic():
+    """Question selection depends only on (text, seed)."""
+    from app.services.narrative_generator import narrative_generator
+
+    classification = {"primary": "sadness", "intensity": 2}
+    first = narrative_generator.generate_reflection_questions(classification, "نص", seed=1)
+    again = narrative_generator.generate_reflection_questions(classification, "نص", seed=1)
+    seeds = {
+        tuple(narrative_generator.generate_reflection_questions(classification, "نص", seed=seed))
+        for seed in range(20)
+    }
+
+    assert first == again
+    assert len(first) == 3
+    assert len(seeds) > 1
@@ -0,0 +1,58 @@
+"""Tests for MinHash near-duplicate detection."""
+
+import json
+
+import pytest
+
+from app.services.near_duplicates import MinHasher, NearDuplicateIndex, estimated_similarity, shingles
+from app.tools.ingest import merge_corpora
+
+
+def _write_lines(path, lines):
+    path.write_text("".join(line + "\n" for line in lines), encoding='utf-8')
+
+
+def _record(text, **fields):
+    return json.dumps({"text_ar": text, "emotion": "joy", **fields}, ensure_ascii=False)
+
+
+def test_near_duplicates_are_dropped_with_a_report(tmp_path):
+    """Copy-edited variants keep only their first fragment; distinct ones survive."""
+    source = tmp_path / "new.jsonl"
+    output = tmp_path / "corpus.jsonl"
+    report_path = tmp_path / "dups.jsonl"
+    lesson = "كل عاصفة تمر مهما طالت، وتعود السماء صافية من جديد"
+    _write_lines(source, [
+        _record("العاصفة تمر والسماء تصفو بعدها دائما", lesson=lesson),
+        _record("العاصفة تمرّ والسماء تصفو بعدها دائماً", lesson=lesson + "."),
+        _record("الشمس تشرق بعد المطر وتدفئ الأرض", lesson="الأمل يعود دائما بعد الحزن"),
+    ])
+
+    report = merge_corpora([source], output, near_duplicate_threshold=0.85, duplicates_report=report_path)
+    assert report["written"] == 2
+    assert report["duplicates"] == 0
+    assert report["near_duplicates"]["removed"] == 1
+    removed = [json.loads(line) for line in report_path.read_text(encoding='utf-8').splitlines()]
+    assert removed[0]["duplicate_of"] == "العاصفة تمر والسماء تصفو بعدها دائما"
+    assert removed[0]["canonical_row"] == 0
+    assert removed[0]["similarity"] >= 0.85
+
+    # Disabled, every distinct record is kept
+    assert merge_corpora([source], output)["written"] == 3
+
+
+def test_minhash_estimates_jaccard_and_clusters_variants():
+    """Signature agreement tracks shingle overlap; LSH finds the variant's canonical record."""
+    text = "الشجرة تفقد أوراقها في الخريف لكنها تزهر من جديد في الربيع"
+    variant = text.replace("لكنها", "ولكنها")
+    left, right = shingles(text), shingles(variant)
+    jaccard = len(left & right) / len(left | right)
+    hasher = MinHasher(num_perm=256)
+    assert estimated_similarity(hasher.signature(text), hasher.signature(variant)) == pytest.approx(jaccard, abs=0.1)
+
+    index = NearDuplicateIndex(threshold=0.7)
+    assert index.add("a", text) is None
+    assert index.add("b", "الشمس تشرق بعد المطر") is None
+    canonical, similarity = index.add("c", variant)
+    assert canonical == "a" and similarity >= 0.7
+    assert len(index) == 2
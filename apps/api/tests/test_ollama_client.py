@@ -0,0 +1,476 @@
+"""Tests for the pooled Ollama client."""
+
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from app.core.admission import (
+    PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE, AdmissionController, AdmissionRejected
+)
+from app.core import disconnect
+from app.core.disconnect import ClientDisconnected, run_until_disconnect, stream_until_disconnect
+from app.core.settings import settings
+from app.core.sse import HEARTBEAT, ReplayRegistry, ReplayStream, ReplayUnavailable
+from app.core.timing import latency_stats
+from app.services.ollama_client import CONTROL_CONNECTIONS, OllamaClient, ollama_client, ollama_streams
+
+
+def _run(coro):
+    return asyncio.run(coro)
+
+
+def _ndjson(*records):
+    return "".join(json.dumps(r) + "\n" for r in records).encode()
+
+
+@pytest.fixture(autouse=True)
+def fast_retries(monkeypatch):
+    monkeypatch.setattr(settings, "ollama_retry_backoff", 0.001)
+
+
+def test_connection_errors_are_retried():
+    """A refused connection is retried; the request succeeds on a later attempt."""
+    attempts = []
+
+    def handler(request):
+        attempts.append(request.url.path)
+        if len(attempts) < 3:
+            raise httpx.ConnectError("refused", request=request)
+        return httpx.Response(200, json={"response": "مرحبا"})
+
+    client = OllamaClient(transport=httpx.MockTransport(handler))
+
+    async def scenario():
+        try:
+            return await client.generate_response("hello")
+        finally:
+            await client.close()
+
+    assert _run(scenario()) == "مرحبا"
+    assert attempts == ["/api/generate"] * 3
+    assert client.get_stats()["retries"] == 2
+    assert client.get_stats()["open"] is False
+
+
+def test_other_errors_are_not_retried(monkeypatch):
+    """Read timeouts and HTTP errors may have reached Ollama; they fail immediately."""
+    attempts = []
+
+    def handler(request):
+        attempts.append(1)
+        raise httpx.ReadTimeout("slow", request=request)
+
+    client = OllamaClient(transport=httpx.MockTransport(handler))
+    with pytest.raises(Exception, match="Ollama request failed"):
+        _run(client.generate_response("hello"))
+    assert len(attempts) == 1
+
+    monkeypatch.setattr(settings, "ollama_max_retries", 1)
+    refused = OllamaClient(transport=httpx.MockTransport(
+        lambda request: (_ for _ in ()).throw(httpx.ConnectError("refused", request=request))
+    ))
+    with pytest.raises(Exception, match="Ollama request failed"):
+        _run(refused.generate_response("hello"))
+    assert refused.retries == 1
+
+
+def test_first_token_and_inter_token_timeouts(monkeypatch):
+    """A stream stalling before its first token, or between tokens, raises a read timeout."""
+    monkeypatch.setattr(settings, "ollama_first_token_timeout", 0.05)
+    monkeypatch.setattr(settings, "ollama_read_timeout", 0.05)
+
+    class SlowStream(httpx.AsyncByteStream):
+        def __init__(self, stall_after):
+            self.stall_after = stall_after
+
+        async def __aiter__(self):
+            for i in range(3):
+                if i == self.stall_after:
+                    await asyncio.sleep(1)
+                yield _ndjson({"response": f"t{i}", "done": i == 2})
+
+    def client_for(stall_after):
+        return OllamaClient(transport=httpx.MockTransport(
+            lambda request: httpx.Response(200, stream=SlowStream(stall_after))
+        ))
+
+    async def collect(client):
+        return [chunk async for chunk in client.generate_streaming_response("hello")]
+
+    assert _run(collect(client_for(None))) == ["t0", "t1", "t2"]
+    for stall_after in (0, 1):
+        client = client_for(stall_after)
+        with pytest.raises(Exception, match="Timed out waiting for the (first|next) token"):
+            _run(collect(client))
+        assert client.timeouts == 1
+
+
+def test_pool_limits_follow_parallel_slots(monkeypatch):
+    """The pool is sized to Ollama's parallel slots plus control calls and reopened after close."""
+    monkeypatch.setattr(settings, "ollama_num_parallel", 2)
+    client = OllamaClient(transport=httpx.MockTransport(lambda request: httpx.Response(200, json={"models": []})))
+
+    async def scenario():
+        pool = client.start()
+        assert client.start() is pool
+        await client.list_models()
+        await client.close()
+        assert client.get_stats()["open"] is False
+        await client.list_models()
+        assert client.get_stats()["open"] is True
+        await client.close()
+
+    _run(scenario())
+    # Generations are bounded by admission; the extra connections serve control calls
+    assert client.limits.max_connections == 2 + CONTROL_CONNECTIONS
+    assert client.limits.max_keepalive_connections == 2 + CONTROL_CONNECTIONS
+
+
+def test_admission_prefers_interactive_and_hands_slots_over():
+    """Queued interactive requests overtake background ones; a freed slot goes straight to a waiter."""
+    admission = AdmissionController("test_admission", slots=1, max_queue=4)
+    order = []
+
+    async def job(name, priority):
+        async with admission.slot(priority):
+            order.append(name)
+            await asyncio.sleep(0.01)
+
+    async def scenario():
+        await admission.acquire()
+        waiters = [
+            asyncio.create_task(job("story", PRIORITY_BACKGROUND)),
+            asyncio.create_task(job("chat-1", PRIORITY_INTERACTIVE)),
+            asyncio.create_task(job("chat-2", PRIORITY_INTERACTIVE)),
+        ]
+        await asyncio.sleep(0.01)
+        assert admission.queued == 3
+        admission.release(0.5)
+        await asyncio.gather(*waiters)
+
+    _run(scenario())
+    assert order == ["chat-1", "chat-2", "story"]
+    stats = admission.get_stats()
+    assert (stats["in_flight"], stats["queued"], stats["admitted"]) == (0, 0, 4)
+    assert "test_admission.queue_wait.background" in latency_stats.get_stats()["latency"]
+
+
+def test_admission_rejects_when_full_or_waiting_too_long():
+    """A full queue fails fast with Retry-After; an expired wait leaves the queue."""
+    admission = AdmissionController("test_rejections", slots=1, max_queue=1, queue_timeout=0.02)
+
+    async def scenario():
+        await admission.acquire()
+        admission.release(4.0)
+        await admission.acquire()
+        waiting = asyncio.create_task(admission.acquire())
+        await asyncio.sleep(0)
+        with pytest.raises(AdmissionRejected) as full:
+            await admission.acquire()
+        assert full.value.retry_after == 8
+        with pytest.raises(AdmissionRejected, match="timed out"):
+            await waiting
+        assert admission.queued == 0
+        admission.release()
+
+    _run(scenario())
+    stats = admission.get_stats()
+    assert (stats["rejected"], stats["timed_out"], stats["in_flight"]) == (1, 1, 0)
+
+
+def test_generate_returns_429_with_retry_after(monkeypatch):
+    """The Ollama routes answer 429 instead of queueing past the limit."""
+    from fastapi.testclient import TestClient
+
+    from app.main import app
+
+    admission = AdmissionController("test_routes", slots=1, max_queue=0)
+    admission.in_flight = 1
+    monkeypatch.setattr(ollama_client, "admission", admission)
+    client = TestClient(app)
+
+    for path in ("/api/v1/ollama/generate", "/api/v1/ollama/chat", "/api/v1/ollama/generate/stream"):
+        response = client.post(path, json={"prompt": "مرحبا"})
+        assert response.status_code == 429
+        assert response.headers["Retry-After"] == "1"
+
+
+class FakeHTTPRequest:
+    """Stands in for the incoming request; flip ``disconnected`` to hang up."""
+
+    def __init__(self):
+        self.disconnected = False
+
+    async def is_disconnected(self):
+        return self.disconnected
+
+
+class StallingStream(httpx.AsyncByteStream):
+    """Three tokens, then a long wait: a generation still in progress."""
+
+    def __init__(self):
+        self.closed = False
+
+    async def __aiter__(self):
+        for i in range(3):
+            yield _ndjson({"response": f"t{i}", "done": False})
+        await asyncio.sleep(10)
+        yield _ndjson({"response": "late", "done": True})
+
+    async def aclose(self):
+        self.closed = True
+
+
+def test_disconnect_stops_streamed_generation(monkeypatch):
+    """The relay stops when the client hangs up and the upstream stream is closed."""
+    monkeypatch.setattr(disconnect, "DISCONNECT_POLL_SECONDS", 0.01)
+    upstream = StallingStream()
+    client = OllamaClient(transport=httpx.MockTransport(lambda request: httpx.Response(200, stream=upstream)))
+    http_request = FakeHTTPRequest()
+
+    async def scenario():
+        received = []
+        chunks = client.generate_streaming_response("hello", max_tokens=50)
+        async for chunk in stream_until_disconnect(http_request, chunks):
+            received.append(chunk)
+            if len(received) == 3:
+                http_request.disconnected = True
+        return received
+
+    assert _run(asyncio.wait_for(scenario(), timeout=5)) == ["t0", "t1", "t2"]
+    assert upstream.closed
+    assert client.cancelled == 1
+    assert client.cancelled_tokens_saved == 47
+    assert client.admission.in_flight == 0
+
+
+def test_disconnect_cancels_non_streamed_generation(monkeypatch):
+    """A blocking generate call is cancelled mid-generation and the saved tokens counted."""
+    monkeypatch.setattr(disconnect, "DISCONNECT_POLL_SECONDS", 0.01)
+    upstream = StallingStream()
+    client = OllamaClient(transport=httpx.MockTransport(lambda request: httpx.Response(200, stream=upstream)))
+    http_request = FakeHTTPRequest()
+    before = latency_stats.get_stats()["counters"].get("ollama.cancelled_tokens_saved", 0)
+
+    async def scenario():
+        asyncio.get_running_loop().call_later(0.1, setattr, http_request, "disconnected", True)
+        await run_until_disconnect(http_request, client.generate_response("hello", max_tokens=50))
+
+    with pytest.raises(ClientDisconnected):
+        _run(asyncio.wait_for(scenario(), timeout=5))
+    assert upstream.closed
+    assert client.get_stats()["cancelled"] == 1
+    assert client.get_stats()["cancelled_tokens_saved"] == 47
+    assert latency_stats.get_stats()["counters"]["ollama.cancelled_tokens_saved"] - before == 47
+
+
+def _registry(**overrides):
+    options = {"max_streams": 4, "max_events": 100, "ttl": 60.0, "grace": 60.0, **overrides}
+    return ReplayRegistry("test_streams", **options)
+
+
+async def _tokens(*chunks, stall=0.0):
+    for chunk in chunks:
+        yield chunk
+    await asyncio.sleep(stall)
+
+
+def test_replay_resumes_after_last_event_id_with_heartbeats():
+    """A resumed subscriber gets only the events after its id; idle gaps carry heartbeats."""
+    registry = _registry()
+
+    async def scenario():
+        stream = registry.start(_tokens("a", "b", "c", stall=0.1))
+        first = [event async for event in registry.subscribe(stream, -1, heartbeat=0.03)]
+        second_id = first[1].split("\n")[0][len("id: "):]
+        resumed, after = registry.resume(second_id)
+        rest = [event async for event in registry.subscribe(resumed, after, heartbeat=0.03)]
+        return first, rest
+
+    first, rest = _run(scenario())
+    assert HEARTBEAT in first
+    payloads = [json.loads(e.split("data: ")[1]) for e in first if e != HEARTBEAT]
+    assert payloads == [{"chunk": "a"}, {"chunk": "b"}, {"chunk": "c"}, {"done": True}]
+    assert [json.loads(e.split("data: ")[1]) for e in rest] == [{"chunk": "c"}, {"done": True}]
+    assert registry.get_stats()["resumed"] == 1
+
+    with pytest.raises(ReplayUnavailable):
+        registry.resume("unknown:0")
+
+
+def test_interleaved_subscriber_gets_contiguous_ids_after_the_buffer_wraps():
+    """A subscriber suspended between events still sees every id once, in order."""
+    stream = ReplayStream("s", max_events=4)
+
+    async def produce():
+        for i in range(20):
+            stream.append({"chunk": str(i)}, final=i == 19)
+            await asyncio.sleep(0)
+
+    async def consume():
+        ids = []
+        async for event in stream.events(-1, heartbeat=1):
+            ids.append(int(event.split("\n")[0].rpartition(":")[2]))
+            await asyncio.sleep(0)
+        return ids
+
+    async def scenario():
+        stream.append({"chunk": "first"})
+        _, ids = await asyncio.gather(produce(), consume())
+        return ids
+
+    assert _run(scenario()) == list(range(21))
+
+
+def test_replay_buffers_are_bounded_and_expire():
+    """Old events fall out of the buffer, running streams cap admission and finished ones expire."""
+    registry = _registry(max_streams=1, max_events=2, ttl=0.05)
+
+    async def scenario():
+        stream = registry.start(_tokens("a", "b", "c", stall=0.1))
+        with pytest.raises(AdmissionRejected):
+            registry.start(_tokens("x"))
+        await stream.task
+        assert len(stream) == 2
+        with pytest.raises(ReplayUnavailable):
+            registry.resume(f"{stream.stream_id}:0")
+        registry.resume(f"{stream.stream_id}:2")
+        await asyncio.sleep(0.1)
+        return stream
+
+    stream = _run(scenario())
+    assert registry.get_stats()["streams"] == 0
+    assert registry.get_stats()["expired"] == 1
+    with pytest.raises(ReplayUnavailable):
+        registry.resume(f"{stream.stream_id}:2")
+
+
+def test_unwatched_generation_is_cancelled_after_grace():
+    """A generation whose subscriber left and never came back is cancelled."""
+    registry = _registry(grace=0.05)
+
+    async def scenario():
+        stream = registry.start(_tokens("a", stall=10))
+        events = registry.subscribe(stream, -1, heartbeat=1)
+        await events.__anext__()
+        await events.aclose()
+        await asyncio.wait_for(stream.task, timeout=1)
+        return stream
+
+    stream = _run(scenario())
+    assert stream.finished
+    assert registry.get_stats()["abandoned"] == 1
+
+
+def test_reconnect_restarts_the_grace_period():
+    """Dropping again after a reconnect waits a full grace period, not the first drop's timer."""
+    registry = _registry(grace=0.3)
+
+    async def scenario():
+        stream = registry.start(_tokens("a", stall=10))
+        events = registry.subscribe(stream, -1, heartbeat=1)
+        await events.__anext__()
+        await events.aclose()
+        await asyncio.sleep(0.2)
+        events = registry.subscribe(stream, -1, heartbeat=1)
+        await events.__anext__()
+        await events.aclose()
+        # The first drop's timer would have fired here
+        await asyncio.sleep(0.2)
+        assert not stream.task.done()
+        await asyncio.wait_for(stream.task, timeout=1)
+        return stream
+
+    stream = _run(scenario())
+    assert stream.finished
+    assert registry.get_stats()["abandoned"] == 1
+
+
+def test_stream_route_serves_event_stream_and_resumes(monkeypatch):
+    """The route speaks text/event-stream and resumes from Last-Event-ID without a new generation."""
+    from fastapi.testclient import TestClient
+
+    from app.main import app
+
+    calls = []
+
+    async def fake_stream(**kwargs):
+        calls.append(kwargs)
+        for chunk in ("مرحبا", " بك"):
+            yield chunk
+
+    monkeypatch.setattr(ollama_client, "generate_streaming_response", fake_stream)
+    path = "/api/v1/ollama/generate/stream"
+    with TestClient(app) as client:
+        response = client.post(path, json={"prompt": "مرحبا"})
+        assert response.headers["content-type"].startswith("text/event-stream")
+        ids = [line[len("id: "):] for line in response.text.splitlines() if line.startswith("id: ")]
+        assert len(ids) == 3
+        assert ids[0].startswith(response.headers["X-Stream-Id"])
+
+        resumed = client.post(path, json={"prompt": "مرحبا"}, headers={"Last-Event-ID": ids[0]})
+        assert [line for line in resumed.text.splitlines() if line.startswith("data: ")] == [
+            'data: {"chunk": " \\u0628\\u0643"}', 'data: {"done": true}'
+        ]
+        assert len(calls) == 1
+
+        gone = client.post(path, json={"prompt": "مرحبا"}, headers={"Last-Event-ID": "expired:4"})
+        assert gone.status_code == 410
+    assert ollama_streams.get_stats()["resumed"] >= 1
+
+
+def test_deterministic_generations_are_cached():
+    """Temperature 0 (or opted-in) calls are served from cache, keyed by every option."""
+    prompts = []
+
+    def handler(request):
+        prompts.append(json.loads(request.content)["prompt"])
+        return httpx.Response(200, content=_ndjson({"response": "هدوء", "done": True}))
+
+    client = OllamaClient(transport=httpx.MockTransport(handler))
+
+    async def scenario():
+        for _ in range(2):
+            await client.generate_response("calm", temperature=0)
+            await client.generate_response("calm", temperature=0.7)
+        await client.generate_response("calm", temperature=0, system_prompt="other")
+        await client.generate_response("calm", temperature=0.7, cache=True)
+        return await client.generate_response("calm", temperature=0.7, cache=True)
+
+    assert _run(scenario()) == "هدوء"
+    assert len(prompts) == 5
+    stats = client.response_cache.get_stats()
+    assert (stats["hits"], stats["size"]) == (2, 3)
+    assert client.get_stats()["generations"] == 5
+
+
+def test_identical_concurrent_generations_share_one_call():
+    """Concurrent identical requests wait on one upstream generation, which outlives a cancelled caller."""
+    calls = []
+
+    class SlowStream(httpx.AsyncByteStream):
+        async def __aiter__(self):
+            await asyncio.sleep(0.1)
+            yield _ndjson({"response": "نفس عميق", "done": True})
+
+    def handler(request):
+        calls.append(1)
+        return httpx.Response(200, stream=SlowStream())
+
+    client = OllamaClient(transport=httpx.MockTransport(handler))
+
+    async def scenario():
+        callers = [asyncio.ensure_future(client.generate_response("breathe", temperature=0)) for _ in range(4)]
+        await asyncio.sleep(0.02)
+        callers[0].cancel()
+        results = await asyncio.gather(*callers[1:])
+        return results, callers[0].cancelled()
+
+    results, first_cancelled = _run(scenario())
+    assert results == ["نفس عميق"] * 3
+    assert first_cancelled
+    assert len(calls) == 1
+    assert client.get_stats()["coalesced"] == 3
+    assert client.get_stats()["cancelled"] == 0
@@ -0,0 +1,64 @@
+"""Tests for quantized first-pass search with exact rescoring."""
+
+import hashlib
+
+import numpy as np
+import pytest
+
+from app.services.vector_index import LocalVectorIndex
+
+
+class FakeEmbedder:
+    """Deterministic bag-of-words embedder: each word hashes to one dimension."""
+
+    dim = 64
+    is_available = True
+
+    def __init__(self):
+        self.batches = []
+
+    def load(self):
+        return True
+
+    def encode_batch(self, texts, batch_size=64):
+        self.batches.append(len(texts))
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for word in text.split():
+                vectors[row, int(hashlib.md5(word.encode('utf-8')).hexdigest(), 16) % self.dim] += 1.0
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    def encode(self, text):
+        return self.encode_batch([text])[0]
+
+
+def test_quantized_search_rescores_exactly(tmp_path):
+    """int8/binary first passes return exact float32 scores for their top-k."""
+    rng = np.random.default_rng(1)
+    vectors = rng.standard_normal((2000, FakeEmbedder.dim)).astype(np.float32)
+    payloads = [{"text_ar": str(i), "emotion": "joy" if i % 2 else "fear"} for i in range(2000)]
+    exact = LocalVectorIndex(embedder=FakeEmbedder(), quantization="none")
+    exact.build(vectors, payloads)
+
+    # Rescoring reads the float32 rows from a memory-mapped file
+    path = tmp_path / "vectors.npy"
+    np.save(path, exact.vectors)
+    mapped = np.load(path, mmap_mode='r')
+
+    for quantization, factor in (("int8", 4), ("binary", 64)):
+        index = LocalVectorIndex(embedder=FakeEmbedder(), quantization=quantization, rescore_factor=factor)
+        index._set_rows(mapped, payloads)
+        assert index.resident_bytes < exact.resident_bytes / 3
+        for row in (3, 500, 1999):
+            query = exact.vectors[row]
+            expected = exact.search(query, k=5)
+            found = index.search(query, k=5)
+            assert found[0] == (row, pytest.approx(1.0, abs=1e-5))
+            # Returned scores are exact float32 similarities, not code scores
+            assert [s for _, s in found] == pytest.approx([float(exact.vectors[r] @ query) for r, _ in found], abs=1e-5)
+            if quantization == "int8":
+                assert [r for r, _ in found] == [r for r, _ in expected]
+        rows = index.filter_rows(emotion="joy")
+        assert all(r % 2 for r, _ in index.search(exact.vectors[7], k=5, rows=rows))
@@ -0,0 +1,150 @@
+"""Tests for the semantic chat cache."""
+
+import asyncio
+import zlib
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core.settings import settings
+from app.main import app
+from app.routers import ollama as ollama_router
+from app.services.ollama_client import ollama_client
+from app.services.semantic_cache import SemanticCache, prompt_language
+
+client = TestClient(app)
+
+
+class BagOfWordsEmbedder:
+    """Hashes words into a small normalized vector; shared words mean similar prompts."""
+
+    model_name = "bag-of-words"
+    is_available = True
+
+    def encode(self, text):
+        vector = np.zeros(64, dtype=np.float32)
+        for word in text.lower().split():
+            vector[zlib.crc32(word.encode('utf-8')) % 64] += 1.0
+        return vector / np.linalg.norm(vector)
+
+
+def _cache(**overrides):
+    options = {"embedder": BagOfWordsEmbedder(), "max_entries": 8, "threshold": 0.75, **overrides}
+    return SemanticCache("test_semantic_cache", **options)
+
+
+def _run(coro):
+    return asyncio.run(coro)
+
+
+def test_paraphrases_hit_within_their_scope():
+    """A paraphrase gets the stored answer; other system prompts, languages and long prompts miss."""
+    cache = _cache(max_prompt_chars=40)
+
+    async def scenario():
+        await cache.store("how do I calm down", "system", "llama2", "Breathe slowly.", seconds=2.5)
+        await cache.store("كيف أتعامل مع القلق", "system", "llama2", "تنفس ببطء.", seconds=1.5)
+        return [
+            await cache.lookup("how can I calm down", "system", "llama2"),
+            await cache.lookup("how can I calm down", "other system", "llama2"),
+            await cache.lookup("how can I calm down", "system", "mistral"),
+            await cache.lookup("كيف أتعامل مع القلق اليوم", "system", "llama2"),
+            await cache.lookup("what should I eat for dinner", "system", "llama2"),
+        ]
+
+    paraphrase, other_system, other_model, arabic, unrelated = _run(scenario())
+    assert paraphrase[0] == "Breathe slowly." and paraphrase[1] >= 0.75
+    assert other_system is None and other_model is None and unrelated is None
+    assert arabic[0] == "تنفس ببطء."
+
+    stats = cache.get_stats()
+    assert (stats["hits"], stats["misses"], stats["scopes"]) == (2, 3, 2)
+    assert stats["saved_generation_seconds"] == pytest.approx(4.0)
+
+    # Long, more personal prompts are neither stored nor looked up
+    assert not cache.cacheable("how do I calm down " * 5)
+    assert prompt_language("كيف أهدأ") == "ar" and prompt_language("calm down") == "en"
+
+
+def test_crisis_prompts_always_reach_the_model():
+    """Prompts with crisis language never get a cached answer and are never stored."""
+    cache = _cache()
+
+    async def scenario():
+        await cache.store("how do I feel better today", None, "m", "Take a walk.", 1.0)
+        await cache.store("I want to die today", None, "m", "Reach out for help.", 1.0)
+        return [
+            await cache.lookup("I want to die how do I feel better today", None, "m"),
+            await cache.lookup("أريد الموت كيف أشعر بتحسن", None, "m"),
+        ]
+
+    assert _run(scenario()) == [None, None]
+    assert not cache.cacheable("أشعر باليأس")
+    stats = cache.get_stats()
+    assert (stats["size"], stats["hits"], stats["misses"]) == (1, 0, 0)
+
+
+def test_least_recently_used_answers_are_evicted_and_old_ones_expire():
+    """The store is bounded; hits refresh recency and entries past their TTL stop matching."""
+    cache = _cache(max_entries=2)
+
+    async def scenario():
+        await cache.store("how do I calm down", None, "m", "calm", 1.0)
+        await cache.store("how do I sleep better", None, "m", "sleep", 1.0)
+        await cache.lookup("how do I calm down", None, "m")
+        await cache.store("how do I stop worrying", None, "m", "worry", 1.0)
+        return [await cache.lookup(p, None, "m") for p in (
+            "how do I calm down", "how do I sleep better", "how do I stop worrying"
+        )]
+
+    calm, sleep, worry = _run(scenario())
+    assert calm[0] == "calm" and sleep is None and worry[0] == "worry"
+    assert cache.get_stats()["evictions"] == 1
+    assert cache.get_stats()["size"] == 2
+
+    expiring = _cache(ttl=0.01)
+
+    async def expired():
+        await expiring.store("how do I calm down", None, "m", "calm", 1.0)
+        await asyncio.sleep(0.05)
+        return await expiring.lookup("how do I calm down", None, "m")
+
+    assert _run(expired()) is None
+    assert expiring.get_stats()["size"] == 0
+
+    # A fresh paraphrase still hits when the closest entry has expired
+    mixed = _cache(ttl=0.05)
+
+    async def stale_and_fresh():
+        await mixed.store("how do I calm down", None, "m", "stale", 1.0)
+        await asyncio.sleep(0.1)
+        await mixed.store("how can I calm down", None, "m", "fresh", 1.0)
+        return await mixed.lookup("how do I calm down", None, "m")
+
+    assert _run(stale_and_fresh())[0] == "fresh"
+
+
+def test_chat_route_reuses_answers_when_enabled(monkeypatch):
+    """With the cache on, a paraphrased chat prompt is answered without generating."""
+    prompts = []
+
+    async def fake_generate(**kwargs):
+        prompts.append(kwargs["prompt"])
+        return f"answer {len(prompts)}"
+
+    monkeypatch.setattr(ollama_client, "generate_response", fake_generate)
+    monkeypatch.setattr(ollama_router, "chat_semantic_cache", _cache())
+    path = "/api/v1/ollama/chat"
+
+    monkeypatch.setattr(settings, "chat_semantic_cache", False)
+    client.post(path, json={"prompt": "how do I calm down"})
+    assert len(prompts) == 1
+
+    monkeypatch.setattr(settings, "chat_semantic_cache", True)
+    first = client.post(path, json={"prompt": "how do I calm down"}).json()["response"]
+    again = client.post(path, json={"prompt": "how can I calm down"}).json()["response"]
+    opted_out = client.post(path, json={"prompt": "how can I calm down", "cache": False}).json()["response"]
+    assert first == again == "answer 2"
+    assert opted_out == "answer 3"
+    assert ollama_router.chat_semantic_cache.get_stats()["hits"] == 1
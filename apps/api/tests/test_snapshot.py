@@ -0,0 +1,112 @@
+"""Tests for restoring vector backends from corpus snapshots."""
+
+import hashlib
+import json
+
+import numpy as np
+import pytest
+
+from app.core.settings import settings
+from app.services.vector_index import LocalVectorIndex
+
+
+class FakeEmbedder:
+    """Deterministic bag-of-words embedder: each word hashes to one dimension."""
+
+    dim = 64
+    is_available = True
+
+    def __init__(self):
+        self.batches = []
+
+    def load(self):
+        return True
+
+    def encode_batch(self, texts, batch_size=64):
+        self.batches.append(len(texts))
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for word in text.split():
+                vectors[row, int(hashlib.md5(word.encode('utf-8')).hexdigest(), 16) % self.dim] += 1.0
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    def encode(self, text):
+        return self.encode_batch([text])[0]
+
+
+@pytest.fixture(autouse=True)
+def embeddings_cache(tmp_path, monkeypatch):
+    """Keep embedding artifacts out of the working directory."""
+    directory = tmp_path / "embeddings_cache"
+    monkeypatch.setattr(settings, "embeddings_cache_dir", str(directory))
+    return directory
+
+
+def _write_corpus(path, records):
+    with open(path, 'w', encoding='utf-8') as f:
+        for record in records:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+CORPUS = [
+    {"text_ar": "الشجرة تفقد أوراقها في الخريف", "emotion": "sadness", "lesson": "التغيير طبيعي"},
+    {"text_ar": "الشمس تشرق بعد المطر", "emotion": "joy", "lesson": "الأمل يعود"},
+    {"text_ar": "العاصفة تمر والسماء تصفو", "emotion": "fear", "lesson": "كل شيء يمر"},
+]
+
+
+def test_local_index_restores_from_snapshot(tmp_path, monkeypatch):
+    """A cold node unpacks a matching snapshot instead of embedding; a stale one is ignored."""
+    path = tmp_path / "corpus.jsonl"
+    snapshot = tmp_path / "snapshots" / "corpus.npz"
+    _write_corpus(path, CORPUS)
+    source = LocalVectorIndex(embedder=FakeEmbedder())
+    source.load_corpus(path)
+    assert source.export_snapshot(snapshot)["count"] == 3
+
+    monkeypatch.setattr(settings, "embeddings_cache_dir", str(tmp_path / "fresh_node"))
+    embedder = FakeEmbedder()
+    restored = LocalVectorIndex(embedder=embedder)
+    assert restored.load_corpus(path, snapshot_path=str(snapshot)) == 3
+    assert embedder.batches == []
+    assert restored.ingest_stats["artifact"] == "restored"
+    assert restored.retrieve_similar("العاصفة تمر", k=1) == source.retrieve_similar("العاصفة تمر", k=1)
+
+    # Without an artifact cache the rows are taken straight from the snapshot
+    in_memory = LocalVectorIndex(embedder=embedder)
+    assert in_memory.load_corpus(path, cache_dir="", snapshot_path=str(snapshot)) == 3
+    assert embedder.batches == []
+
+    _write_corpus(path, CORPUS[:2])
+    stale = LocalVectorIndex(embedder=embedder)
+    assert stale.load_corpus(path, snapshot_path=str(snapshot)) == 2
+    assert stale.ingest_stats["artifact"] == "built"
+
+
+def test_qdrant_restores_from_snapshot(tmp_path, monkeypatch):
+    """An empty collection is bulk-loaded from a snapshot and then counts as synced."""
+    from app.core.timing import latency_stats
+    from app.services import qdrant_client
+
+    monkeypatch.setattr(qdrant_client, "QDRANT_AVAILABLE", True)
+    path = tmp_path / "corpus.jsonl"
+    snapshot = tmp_path / "corpus.npz"
+    _write_corpus(path, CORPUS)
+    source = qdrant_client.QdrantRetrievalClient(embedder=FakeEmbedder(), url=":memory:", sync_on_start=False)
+    source.sync_corpus(path)
+    assert source.export_snapshot(snapshot)["count"] == 3
+
+    embedder = FakeEmbedder()
+    node = qdrant_client.QdrantRetrievalClient(embedder=embedder, url=":memory:", sync_on_start=False)
+    report = node.restore_snapshot(snapshot, path)
+    assert (report["status"], report["points"]) == ("restored", 3)
+    assert "snapshot.restore" in latency_stats.get_stats()["latency"]
+    assert node.sync_corpus(path)["status"] == "up_to_date"
+    assert node.restore_snapshot(snapshot, path)["status"] == "up_to_date"
+    assert embedder.batches == []
+    assert node.retrieve_similar("العاصفة تمر", k=1)[0]["emotion"] == "fear"
+
+    _write_corpus(path, CORPUS[:2])
+    assert node.restore_snapshot(snapshot, path)["status"] == "skipped"
@@ -0,0 +1,152 @@
+"""Tests for LLM-backed story generation."""
+
+import asyncio
+import json
+
+from fastapi.testclient import TestClient
+
+from app.core.admission import PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE
+from app.main import app
+from app.routers import narrative
+from app.services.story_generator import StoryGenerator, StoryStore
+
+client = TestClient(app)
+
+
+class FakeLLM:
+    """Records calls and answers like Ollama's generate endpoint."""
+
+    model = "fake-model"
+
+    def __init__(self, fail=False):
+        self.calls = []
+        self.fail = fail
+
+    async def generate_with_context(self, prompt, model=None, system_prompt=None, context=None,
+                                    temperature=0.7, max_tokens=1000, response_format=None, priority=0):
+        self.calls.append({"prompt": prompt, "context": context, "system_prompt": system_prompt,
+                           "priority": priority})
+        if self.fail:
+            raise Exception("Ollama request failed")
+        if context is None:
+            # Prefix priming call
+            return {"response": "جاهز", "context": [1, 2, 3], "ttft": 0.01,
+                    "total_time": 0.02, "prompt_eval_count": 3, "model": model}
+        story = {
+            "metaphor": "مثل نهر يجد طريقه",
+            "scene": "تخيل نفسك على ضفة نهر هادئ",
+            "questions": ["ما الذي يهدئك؟", "ما الذي تحتاجه الآن؟", "من يدعمك؟"]
+        }
+        return {"response": json.dumps(story, ensure_ascii=False), "context": context + [4],
+                "ttft": 0.05, "total_time": 0.2, "prompt_eval_count": 1, "model": model}
+
+
+def test_prefix_is_primed_once_and_reused(tmp_path):
+    """Each mood's prefix is evaluated once and its context reused."""
+    llm = FakeLLM()
+    generator = StoryGenerator(llm=llm, store=StoryStore(tmp_path))
+
+    asyncio.run(generator.generate("sadness", "فقدت وظيفتي"))
+    asyncio.run(generator.generate("sadness", "انتقلت إلى مدينة جديدة"))
+
+    priming = [call for call in llm.calls if call["context"] is None]
+    stories = [call for call in llm.calls if call["context"] is not None]
+    assert len(priming) == 1
+    assert priming[0]["system_prompt"]
+    assert len(stories) == 2
+    assert all(call["context"] == [1, 2, 3] for call in stories)
+    # Someone is waiting for a /story response; it is not background work
+    assert all(call["priority"] == PRIORITY_INTERACTIVE for call in llm.calls)
+
+
+def test_startup_priming_runs_at_background_priority(tmp_path):
+    """Warm-up primes every mood once, behind interactive work, and requests reuse it."""
+    llm = FakeLLM()
+    generator = StoryGenerator(llm=llm, store=StoryStore(tmp_path))
+
+    assert asyncio.run(generator.prime_prefixes()) == 5
+    asyncio.run(generator.generate("joy", "نجحت في الامتحان"))
+
+    priming = [call for call in llm.calls if call["context"] is None]
+    assert len(priming) == 5
+    assert all(call["priority"] == PRIORITY_BACKGROUND for call in priming)
+    assert llm.calls[-1]["priority"] == PRIORITY_INTERACTIVE
+
+
+def test_repeated_requests_are_cached_and_persisted(tmp_path):
+    """The same (mood, context) is served from cache and from the store."""
+    llm = FakeLLM()
+    generator = StoryGenerator(llm=llm, store=StoryStore(tmp_path))
+
+    story, cached = asyncio.run(generator.generate("fear", "امتحان غداً"))
+    again, cached_again = asyncio.run(generator.generate("fear", "امتحان غداً"))
+
+    assert cached is False
+    assert cached_again is True
+    assert again["story_id"] == story["story_id"]
+    assert len(llm.calls) == 2
+    assert generator.get_stats()["hit_rate"] == 0.5
+
+    # A fresh generator (e.g. after a restart) finds the persisted story
+    restarted = StoryGenerator(llm=FakeLLM(), store=StoryStore(tmp_path))
+    assert restarted.get_story(story["story_id"])["scene"] == story["scene"]
+
+
+def test_unavailable_llm_falls_back(tmp_path):
+    """Without Ollama the story comes from the precomputed narrative table."""
+    generator = StoryGenerator(llm=FakeLLM(fail=True), store=StoryStore(tmp_path))
+
+    story, cached = asyncio.run(generator.generate("joy"))
+
+    assert story["story_id"] is None
+    assert story["metaphor"]
+    assert len(story["questions"]) == 3
+    assert generator.get_stats()["fallbacks"] == 1
+
+
+def test_story_endpoints(tmp_path, monkeypatch):
+    """POST /story returns an id that GET /story/{id} resolves."""
+    generator = StoryGenerator(llm=FakeLLM(), store=StoryStore(tmp_path))
+    monkeypatch.setattr(narrative, "story_generator", generator)
+
+    response = client.post("/api/v1/story", json={"mood": "anger", "context": "زحمة السير"})
+    assert response.status_code == 200
+    story_id = response.json()["story_id"]
+
+    fetched = client.get(f"/api/v1/story/{story_id}")
+    assert fetched.status_code == 200
+    assert fetched.json()["metaphor"] == response.json()["metaphor"]
+
+    assert client.get("/api/v1/story/0123abcd").status_code == 404
+    assert client.get("/api/v1/story/..%2Fsecrets").status_code == 404
+
+
+def test_corrupt_stored_story_is_regenerated(tmp_path):
+    """An unreadable story file counts as a miss and is replaced by a fresh story."""
+    generator = StoryGenerator(llm=FakeLLM(), store=StoryStore(tmp_path))
+    story, _ = asyncio.run(generator.generate("fear", "امتحان غداً"))
+    path = tmp_path / f"{story['story_id']}.json"
+    path.write_text('{"story_id": "trunc', encoding='utf-8')
+
+    restarted = StoryGenerator(llm=FakeLLM(), store=StoryStore(tmp_path))
+    again, cached = asyncio.run(restarted.generate("fear", "امتحان غداً"))
+
+    assert cached is False
+    assert again["scene"] == story["scene"]
+    assert json.loads(path.read_text(encoding='utf-8'))["story_id"] == story["story_id"]
+    stats = restarted.get_stats()
+    assert (stats["hits"], stats["misses"]) == (0, 1)
+
+
+def test_concurrent_story_writes_do_not_share_temp_files(tmp_path):
+    """Workers persisting the same story each write their own temp file."""
+    from concurrent.futures import ThreadPoolExecutor
+
+    store = StoryStore(tmp_path)
+    story = {"story_id": "abc123", "story": "الشمس تشرق " * 2000}
+
+    with ThreadPoolExecutor(4) as pool:
+        list(pool.map(lambda _: store.put(story), range(16)))
+
+    assert store.get("abc123") == story
+    assert [p.name for p in tmp_path.iterdir()] == ["abc123.json"]
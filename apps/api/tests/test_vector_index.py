@@ -0,0 +1,392 @@
+"""Tests for the in-process vector index and backend selection."""
+
+import hashlib
+import json
+
+import numpy as np
+import pytest
+
+from app.core.settings import settings
+from app.services import retrieval
+from app.services.embedding_store import EmbeddingArtifact, load_corpus_embeddings
+from app.services.retrieval import RetrievalService
+from app.services.vector_index import LocalVectorIndex
+
+
+class FakeEmbedder:
+    """Deterministic bag-of-words embedder: each word hashes to one dimension."""
+
+    dim = 64
+    is_available = True
+
+    def __init__(self):
+        self.batches = []
+
+    def load(self):
+        return True
+
+    def encode_batch(self, texts, batch_size=64):
+        self.batches.append(len(texts))
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for word in text.split():
+                vectors[row, int(hashlib.md5(word.encode('utf-8')).hexdigest(), 16) % self.dim] += 1.0
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    def encode(self, text):
+        return self.encode_batch([text])[0]
+
+
+@pytest.fixture(autouse=True)
+def embeddings_cache(tmp_path, monkeypatch):
+    """Keep embedding artifacts out of the working directory."""
+    directory = tmp_path / "embeddings_cache"
+    monkeypatch.setattr(settings, "embeddings_cache_dir", str(directory))
+    return directory
+
+
+def _write_corpus(path, records):
+    with open(path, 'w', encoding='utf-8') as f:
+        for record in records:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+CORPUS = [
+    {"text_ar": "الشجرة تفقد أوراقها في الخريف", "emotion": "sadness", "lesson": "التغيير طبيعي"},
+    {"text_ar": "الشمس تشرق بعد المطر", "emotion": "joy", "lesson": "الأمل يعود"},
+    {"text_ar": "العاصفة تمر والسماء تصفو", "emotion": "fear", "lesson": "كل شيء يمر"},
+]
+
+
+def test_search_matches_brute_force():
+    """argpartition top-k returns the same ranking as a full sort."""
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((500, FakeEmbedder.dim)).astype(np.float32)
+    index = LocalVectorIndex(embedder=FakeEmbedder())
+    index.build(vectors, [{"text_ar": str(i)} for i in range(500)])
+
+    query = index.vectors[42]
+    expected = np.argsort(-(index.vectors @ query), kind='stable')[:5]
+    assert [row for row, _ in index.search(query, k=5)] == list(expected)
+    assert index.search(query, k=5)[0][0] == 42
+    batch = index.search_batch(index.vectors[[42, 7]], k=5)
+    for hits, row in zip(batch, (42, 7)):
+        assert [r for r, _ in hits] == [r for r, _ in index.search(index.vectors[row], k=5)]
+
+
+def test_retrieve_similar_from_corpus(tmp_path):
+    """Corpus records are embedded once and queried by text."""
+    path = tmp_path / "corpus.jsonl"
+    _write_corpus(path, CORPUS)
+    index = LocalVectorIndex(embedder=FakeEmbedder())
+
+    assert index.load_corpus(path) == 3
+    results = index.retrieve_similar("الشمس تشرق", k=2)
+
+    assert len(results) == 2
+    assert results[0]["lesson"] == "الأمل يعود"
+    assert results[0]["score"] >= results[1]["score"]
+    stats = index.get_corpus_stats()
+    assert stats["backend"] == "local"
+    assert stats["points_count"] == 3
+
+
+def test_ingest_streams_in_bounded_chunks(tmp_path):
+    """The corpus is embedded one chunk at a time, skipping invalid lines."""
+    path = tmp_path / "corpus.jsonl"
+    records = [{"text_ar": f"جملة رقم {i}", "emotion": "joy"} for i in range(7)]
+    _write_corpus(path, records)
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write("{not json\n")
+    embedder = FakeEmbedder()
+    index = LocalVectorIndex(embedder=embedder)
+
+    assert index.load_corpus(path, chunk_size=3, cache_dir="") == 7
+    assert embedder.batches == [3, 3, 1]
+    assert index.vectors.shape == (7, FakeEmbedder.dim)
+    assert index.ingest_stats["records"] == 7
+    assert index.ingest_stats["chunks"] == 3
+    assert index.ingest_stats["records_per_sec"] > 0
+
+
+def test_embedding_artifact_is_reused_via_mmap(tmp_path, embeddings_cache):
+    """A second start memory-maps the stored vectors without re-encoding."""
+    path = tmp_path / "corpus.jsonl"
+    _write_corpus(path, CORPUS)
+    embedder = FakeEmbedder()
+
+    vectors, payloads, stats = load_corpus_embeddings(embedder, path, embeddings_cache)
+    assert stats["artifact"] == "built"
+    assert embedder.batches == [3]
+
+    restarted = FakeEmbedder()
+    index = LocalVectorIndex(embedder=restarted)
+    assert index.load_corpus(path) == 3
+    assert restarted.batches == []
+    assert index.ingest_stats["artifact"] == "hit"
+    assert isinstance(index.vectors, np.memmap)
+    assert np.allclose(index.vectors, vectors)
+    assert index.retrieve_similar("الشمس تشرق", k=1)[0]["lesson"] == "الأمل يعود"
+
+
+def test_embedding_artifact_tracks_corpus_changes(tmp_path, embeddings_cache):
+    """Editing the corpus builds a new artifact and removes the stale one."""
+    path = tmp_path / "corpus.jsonl"
+    _write_corpus(path, CORPUS)
+    embedder = FakeEmbedder()
+    load_corpus_embeddings(embedder, path, embeddings_cache)
+    old_key = EmbeddingArtifact(embeddings_cache, path, "FakeEmbedder").key
+
+    _write_corpus(path, CORPUS[:2])
+    _, payloads, stats = load_corpus_embeddings(embedder, path, embeddings_cache)
+
+    assert stats["artifact"] == "built"
+    assert stats["key"] != old_key
+    assert len(payloads) == 2
+    assert sorted(p.name for p in embeddings_cache.iterdir()) == [f"{stats['key']}.jsonl", f"{stats['key']}.npy"]
+
+
+
+def test_concurrent_artifact_builds_do_not_share_temp_files(tmp_path, embeddings_cache):
+    """Workers cold-starting together each write their own temp files and publish a valid artifact."""
+    from concurrent.futures import ThreadPoolExecutor
+
+    path = tmp_path / "corpus.jsonl"
+    _write_corpus(path, CORPUS * 50)
+    embeddings_cache.mkdir()
+    # Another worker's build in progress must survive this one's cleanup
+    foreign = embeddings_cache / ".in-progress.tmp"
+    foreign.write_bytes(b"")
+
+    def build(_):
+        return EmbeddingArtifact(embeddings_cache, path, "FakeEmbedder").build(FakeEmbedder(), chunk_size=16)
+
+    with ThreadPoolExecutor(4) as pool:
+        list(pool.map(build, range(4)))
+
+    artifact = EmbeddingArtifact(embeddings_cache, path, "FakeEmbedder")
+    vectors, payloads = artifact.load()
+    assert len(payloads) == len(vectors) == 150
+    assert foreign.exists()
+    assert sorted(p.name for p in embeddings_cache.iterdir()) == sorted(
+        [foreign.name, artifact.vectors_path.name, artifact.payloads_path.name]
+    )
+
+
+def test_auto_selects_local_for_small_corpus(tmp_path, monkeypatch):
+    """Small corpora never touch the Qdrant server."""
+    path = tmp_path / "corpus.jsonl"
+    _write_corpus(path, CORPUS)
+    monkeypatch.setattr(retrieval, "LocalVectorIndex", lambda: LocalVectorIndex(embedder=FakeEmbedder()))
+
+    def unexpected_qdrant():
+        raise AssertionError("Qdrant should not be used for a small corpus")
+    monkeypatch.setattr(retrieval, "QdrantRetrievalClient", unexpected_qdrant)
+
+    service = RetrievalService(backend="auto", local_max_points=10, corpus_path=path)
+    assert service.backend_name == "local"
+    assert service.retrieve_similar("العاصفة تمر", k=1)[0]["emotion"] == "fear"
+
+
+def test_auto_falls_back_when_qdrant_unreachable(tmp_path, monkeypatch):
+    """Large corpora use the local index when Qdrant cannot be reached."""
+    path = tmp_path / "corpus.jsonl"
+    _write_corpus(path, CORPUS)
+
+    class UnreachableQdrant:
+        backend_name = "qdrant"
+        is_available = False
+
+    monkeypatch.setattr(retrieval, "QdrantRetrievalClient", UnreachableQdrant)
+    monkeypatch.setattr(retrieval, "LocalVectorIndex", lambda: LocalVectorIndex(embedder=FakeEmbedder()))
+
+    service = RetrievalService(backend="auto", local_max_points=1, corpus_path=path)
+    assert service.backend_name == "local"
+    assert service.get_corpus_stats()["points_count"] == 3
+
+
+def test_qdrant_ingest_upserts_in_chunks(monkeypatch):
+    """Qdrant ingestion embeds and upserts one bounded chunk at a time."""
+    from app.core.settings import settings
+    from app.services import qdrant_client
+
+    monkeypatch.setattr(qdrant_client, "QDRANT_AVAILABLE", True)
+    monkeypatch.setattr(settings, "ingest_chunk_size", 10)
+    embedder = FakeEmbedder()
+    client = qdrant_client.QdrantRetrievalClient(embedder=embedder, url=":memory:")
+
+    stats = client.get_corpus_stats()
+    assert stats["points_count"] == stats["ingest"]["records"]
+    assert max(embedder.batches) == 10
+    assert stats["ingest"]["chunks"] == len(embedder.batches)
+    assert len(client.retrieve_similar("الأمل", k=2)) == 2
+
+
+def test_qdrant_sync_is_incremental(tmp_path, monkeypatch):
+    """Only new or edited lines are embedded; removed lines are deleted."""
+    from app.services import qdrant_client
+
+    monkeypatch.setattr(qdrant_client, "QDRANT_AVAILABLE", True)
+    path = tmp_path / "corpus.jsonl"
+    _write_corpus(path, CORPUS)
+    embedder = FakeEmbedder()
+    client = qdrant_client.QdrantRetrievalClient(embedder=embedder, url=":memory:", sync_on_start=False)
+
+    first = client.sync_corpus(path)
+    assert (first["added"], first["deleted"]) == (3, 0)
+    assert client.sync_corpus(path)["status"] == "up_to_date"
+
+    edited = dict(CORPUS[1], lesson="الأمل يعود دائماً")
+    added = {"text_ar": "النهر يجد طريقه", "emotion": "trust", "lesson": "الصبر"}
+    _write_corpus(path, [CORPUS[0], edited, added])
+    assert client.sync_corpus(path, dry_run=True)["status"] == "planned"
+    embedder.batches.clear()
+
+    report = client.sync_corpus(path)
+    assert (report["added"], report["deleted"], report["unchanged"]) == (2, 2, 1)
+    assert embedder.batches == [2]
+    stats = client.get_corpus_stats()
+    assert stats["points_count"] == 3
+    assert stats["corpus_version"] == report["corpus_version"]
+    lessons = {r["lesson"] for r in client.retrieve_similar("النهر يجد طريقه", k=3)}
+    assert lessons == {"التغيير طبيعي", "الأمل يعود دائماً", "الصبر"}
+
+
+def test_query_embeddings_are_cached_and_coalesced():
+    """Repeated and concurrent identical queries share one encode."""
+    import threading
+    import time
+    from concurrent.futures import ThreadPoolExecutor
+
+    from app.services.embeddings import QueryEmbeddingCache
+
+    class SlowEmbedder(FakeEmbedder):
+        model_name = "slow-fake"
+
+        def __init__(self):
+            super().__init__()
+            self.calls = 0
+            self.lock = threading.Lock()
+
+        def encode(self, text):
+            with self.lock:
+                self.calls += 1
+            time.sleep(0.05)
+            return super().encode(text)
+
+    cache = QueryEmbeddingCache("test_query_embeddings", maxsize=8)
+    embedder = SlowEmbedder()
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        vectors = list(pool.map(lambda _: cache.encode(embedder, "أشعر  بالقلق "), range(4)))
+
+    assert embedder.calls == 1
+    assert all(np.array_equal(v, vectors[0]) for v in vectors)
+    assert cache.get_stats()["coalesced"] == 3
+
+    # Whitespace variants hit the cache without another encode
+    cache.encode(embedder, "أشعر بالقلق")
+    assert embedder.calls == 1
+    assert cache.get_stats()["hits"] == 1
+
+
+def test_filtered_retrieval_by_emotion_and_dialect(tmp_path, monkeypatch):
+    """Both backends restrict results to the requested labels."""
+    from app.services import qdrant_client
+
+    path = tmp_path / "corpus.jsonl"
+    records = CORPUS + [
+        {"text_ar": "الشمس تشرق في الصباح", "emotion": "joy", "dialect": "Gulf", "lesson": "بداية جديدة"},
+        {"text_ar": "الشمس تشرق على البحر", "emotion": "sadness", "dialect": "MSA", "lesson": "الوداع"},
+    ]
+    _write_corpus(path, records)
+    monkeypatch.setattr(qdrant_client, "QDRANT_AVAILABLE", True)
+    monkeypatch.setattr(qdrant_client, "CORPUS_PATH", path)
+
+    local = LocalVectorIndex(embedder=FakeEmbedder())
+    local.load_corpus(path)
+    remote = qdrant_client.QdrantRetrievalClient(embedder=FakeEmbedder(), url=":memory:")
+
+    for backend in (local, remote):
+        joy = backend.retrieve_similar("الشمس تشرق", k=5, emotion="joy")
+        assert {r["lesson"] for r in joy} == {"الأمل يعود", "بداية جديدة"}
+        gulf = backend.retrieve_similar("الشمس تشرق", k=5, emotion="joy", dialect="Gulf")
+        assert [r["lesson"] for r in gulf] == ["بداية جديدة"]
+        assert backend.retrieve_similar("الشمس تشرق", k=5, emotion="surprise") == []
+        strong = backend.retrieve_similar("الشمس تشرق", k=5, score_threshold=0.5)
+        assert strong and all(r["score"] >= 0.5 for r in strong)
+
+
+def test_retrieval_service_async_calls_and_shutdown():
+    """Stats are cached briefly, slow calls time out, and close releases the backend."""
+    import asyncio
+    import time
+
+    class CountingBackend:
+        backend_name = "fake"
+        is_available = True
+
+        def __init__(self):
+            self.stats_calls = 0
+            self.closed = False
+
+        def retrieve_similar(self, text_ar, k=3, **filters):
+            time.sleep(0.2)
+            return []
+
+        def get_corpus_stats(self):
+            self.stats_calls += 1
+            return {"backend": "fake", "points_count": 1}
+
+        def close(self):
+            self.closed = True
+
+    backend = CountingBackend()
+    service = RetrievalService(backend="local")
+    service._select_backend = lambda: backend
+    assert service.wait_until_ready(timeout=1)
+
+    async def scenario():
+        await service.get_corpus_stats_async()
+        await service.get_corpus_stats_async()
+        with pytest.raises(asyncio.TimeoutError):
+            await service.retrieve_similar_async("نص", timeout=0.01)
+
+    asyncio.run(scenario())
+    assert backend.stats_calls == 1
+    assert service.executor._thread_name_prefix == "retrieval"
+
+    service.close()
+    assert backend.closed
+    assert service.state == "idle" and service._executor is None
+
+
+def test_retrieval_initializes_in_background():
+    """Requests see no retrieval (instead of blocking) until startup finishes."""
+    import asyncio
+    import threading
+
+    release = threading.Event()
+    backend = LocalVectorIndex(embedder=FakeEmbedder())
+    backend.build(FakeEmbedder().encode_batch(["الشمس تشرق"]), [{"text_ar": "الشمس تشرق", "lesson": "الأمل"}])
+
+    def slow_select():
+        release.wait(timeout=5)
+        return backend
+
+    service = RetrievalService(backend="local")
+    service._select_backend = slow_select
+    assert service.state == "idle"
+
+    assert service.is_available is False
+    assert service.state == "starting"
+    assert asyncio.run(service.retrieve_similar_async("الشمس تشرق")) == []
+    assert asyncio.run(service.get_corpus_stats_async()) == {"backend": None, "state": "starting"}
+
+    release.set()
+    assert service.wait_until_ready(timeout=5)
+    assert service.is_available is True
+    assert asyncio.run(service.retrieve_similar_async("الشمس تشرق"))[0]["lesson"] == "الأمل"
+    assert service.get_stats()["backend"] == "local"
+    service.close()
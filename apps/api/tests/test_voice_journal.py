@@ -0,0 +1,103 @@
+"""Tests for the voice journal pipeline."""
+
+import asyncio
+
+import numpy as np
+
+from app.services.arabic_nlp import ArabicNLPService
+from app.services.artst_client import ArTSTClient
+from app.services.voice_journal import VoiceJournalPipeline
+
+
+class FakeTranscriber:
+    """Yields pre-baked segments instead of running ArTST."""
+
+    def __init__(self, texts):
+        self.texts = texts
+
+    async def transcribe_segments(self, audio_data, segment_seconds=8.0):
+        for i, text in enumerate(self.texts):
+            await asyncio.sleep(0)
+            yield {
+                "index": i,
+                "start": float(i),
+                "end": float(i + 1),
+                "transcription": text,
+                "is_last": i == len(self.texts) - 1
+            }
+
+
+class FakeAnalyzer(ArabicNLPService):
+    """Keyword crisis screen from the real service, canned classifier output."""
+
+    def __init__(self):
+        super().__init__()
+        self.analyzed = []
+
+    async def analyze_text(self, text):
+        self.analyzed.append(text)
+        return {
+            "sentiment": "negative",
+            "sentiment_score": -0.5,
+            "emotion": "sadness",
+            "emotion_confidence": 0.8
+        }
+
+
+def test_pipeline_combines_segments():
+    """Every segment is analyzed and the transcript is joined in order."""
+    analyzer = FakeAnalyzer()
+    pipeline = VoiceJournalPipeline(
+        transcriber=FakeTranscriber(["أشعر بالحزن", "اليوم"]),
+        analyzer=analyzer
+    )
+
+    result = asyncio.run(pipeline.process(b"audio"))
+
+    assert result["transcription"] == "أشعر بالحزن اليوم"
+    assert [seg["index"] for seg in result["segments"]] == [0, 1]
+    assert analyzer.analyzed == ["أشعر بالحزن", "اليوم"]
+    assert result["analysis"]["emotion"] == "sadness"
+    assert result["analysis"]["sentiment"] == "negative"
+    assert result["analysis"]["crisis_detected"] is False
+    assert result["duration"] == 2.0
+
+
+def test_pipeline_detects_crisis_across_segments():
+    """Crisis phrases split over two segments are still flagged."""
+    pipeline = VoiceJournalPipeline(
+        transcriber=FakeTranscriber(["أشعر باليأس ولا أريد", "العيش"]),
+        analyzer=FakeAnalyzer()
+    )
+
+    result = asyncio.run(pipeline.process(b"audio"))
+
+    assert result["segments"][0]["crisis_detected"] is False
+    assert result["segments"][1]["crisis_detected"] is True
+    assert result["analysis"]["crisis_detected"] is True
+
+
+def test_crisis_does_not_carry_over_to_later_segments():
+    """Segments after a crisis segment are flagged on their own text."""
+    pipeline = VoiceJournalPipeline(
+        transcriber=FakeTranscriber(["أشعر باليأس ولا أريد العيش", "ذهبت إلى الحديقة", "وشربت الشاي"]),
+        analyzer=FakeAnalyzer()
+    )
+
+    result = asyncio.run(pipeline.process(b"audio"))
+
+    assert [seg["crisis_detected"] for seg in result["segments"]] == [True, False, False]
+    assert result["analysis"]["crisis_detected"] is True
+
+
+def test_split_segments_bounds_length():
+    """Silence-based segmentation never exceeds the segment length."""
+    client = ArTSTClient()
+    rng = np.random.default_rng(0)
+    waveform = rng.uniform(-0.5, 0.5, client.sample_rate * 20).astype(np.float32)
+
+    segments = client._split_segments(waveform, segment_seconds=5.0)
+
+    assert segments[0][0] == 0
+    assert segments[-1][1] == len(waveform)
+    assert all(end - start <= 5 * client.sample_rate for start, end in segments)